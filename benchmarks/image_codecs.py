@@ -0,0 +1,116 @@
+"""
+Image codec benchmark: encodes the same images with each given codec in the shared encode pool and reports
+the encode throughput and the resulting file sizes as JSON, to choose the CPU-versus-disk trade-off
+of a deployment (see '--rgb-codec' and '--lossless-codec' of main.py).
+
+By default, synthetic frames (smooth shading with noise, a depth ramp and blocky index masks) are used;
+pass the folder of a generated episode to measure on real frames instead.
+
+Run from the repository root, e.g.:
+    python benchmarks/image_codecs.py --codecs jpeg:95 jpeg:80 png:1 png:6 webp:80 qoi raw --threads 8
+    python benchmarks/image_codecs.py --episode out/<timestamp>/000000_bowl_cam_00 --out codecs.json
+"""
+import sys
+sys.path.append(".")
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from sl_cutscenes import image_codecs
+from sl_cutscenes.image_codecs import ImageSink, get_codec
+
+KINDS = {
+    "rgb": ["jpeg:95", "jpeg:80", "png:1", "png:6", "webp:80", "webp:lossless", "qoi", "raw"],
+    "depth": ["png:0", "png:1", "png:6", "png:9", "raw"],
+    "index": ["png:0", "png:1", "png:6", "png:9", "raw"],
+}  #: default codecs per image kind
+
+
+def synthetic_frames(kind, num_frames, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    frames = []
+    for i in range(num_frames):
+        if kind == "rgb":
+            shade = 0.5 + 0.5 * np.sin((x + 3 * i) / 40.0)[..., None] * np.cos(y / 60.0)[..., None]
+            image = shade * np.array([200, 170, 140]) + rng.normal(0, 4, (height, width, 3))
+            frames.append(np.clip(image, 0, 255).astype(np.uint8))
+        elif kind == "depth":  # 0.1 mm units, 1 m to 6 m
+            depth = 10000 + 50000 * y / height + 200 * np.sin((x + i) / 25.0)
+            frames.append(depth.astype(np.uint16))
+        else:
+            blocks = (x // 64 + (y // 48) * 16 + i // 10) % 40
+            frames.append(np.where((x + y + i) % 7 < 5, blocks, 0).astype(np.uint16))
+    return frames
+
+
+def episode_frames(episode_path, kind, num_frames):
+    from PIL import Image
+    folder = {"rgb": "rgb", "depth": "depth", "index": "instance_index_masks"}[kind]
+    files = sorted((Path(episode_path) / folder).iterdir())[:num_frames]
+    return [np.asarray(Image.open(fp)) for fp in files]
+
+
+def run_codec(spec, frames, out_dir):
+    codec = get_codec(spec)
+    name = spec.replace(":", "_")
+    with ImageSink(codec) as sink:
+        t0 = time.perf_counter()
+        for i, frame in enumerate(frames):
+            sink.save(frame, out_dir / f"{name}_{i:06}{sink.extension}")
+        sink.flush()
+        elapsed = time.perf_counter() - t0
+    raw_bytes = sum(frame.nbytes for frame in frames)
+    return {
+        "images_per_s": len(frames) / elapsed,
+        "raw_mb_per_s": raw_bytes / elapsed / 1e6,
+        "bytes_per_image": sink.bytes_written / len(frames),
+        "compression_ratio": raw_bytes / sink.bytes_written,
+        "lossless": codec.lossless,
+    }
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kinds", nargs="+", choices=list(KINDS.keys()), default=list(KINDS.keys()))
+    parser.add_argument("--codecs", nargs="+", default=None,
+                        help="Codecs to compare. Defaults to a selection per image kind, "
+                             "codecs that don't support a kind's images are skipped.")
+    parser.add_argument("--frames", type=int, default=60, help="Number of images per kind.")
+    parser.add_argument("--resolution", nargs=2, type=int, default=(640, 480))
+    parser.add_argument("--threads", type=int, default=None, help="Size of the encode pool, defaults to #CPUs.")
+    parser.add_argument("--episode", type=str, default=None, help="Episode folder to take the images from.")
+    parser.add_argument("--out", type=str, default=None, help="If specified, writes the JSON report there.")
+    return parser.parse_args()
+
+
+def main(bench_cfg):
+    import tempfile
+    if bench_cfg.threads is not None:
+        image_codecs.set_encode_threads(bench_cfg.threads)
+    report = {"config": {"frames": bench_cfg.frames, "resolution": list(bench_cfg.resolution),
+                         "threads": image_codecs.get_encode_threads(), "episode": bench_cfg.episode},
+              "kinds": {}}
+    with tempfile.TemporaryDirectory(prefix="sl_cutscenes_codecs_") as tmp_dir:
+        for kind in bench_cfg.kinds:
+            if bench_cfg.episode is not None:
+                frames = episode_frames(bench_cfg.episode, kind, bench_cfg.frames)
+            else:
+                frames = synthetic_frames(kind, bench_cfg.frames, *bench_cfg.resolution)
+            report["kinds"][kind] = {}
+            for spec in bench_cfg.codecs or KINDS[kind]:
+                try:
+                    report["kinds"][kind][spec] = run_codec(spec, frames, Path(tmp_dir))
+                except (ValueError, ImportError) as e:
+                    print(f"{kind}/{spec}: skipped ({e})")
+    print(json.dumps(report, indent=2))
+    if bench_cfg.out is not None:
+        with open(bench_cfg.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(get_args())
@@ -0,0 +1,83 @@
+"""
+Measures the import time of the package entry points in fresh interpreters and guards that the heavy backends
+(stillleben, nimblephysics, scipy) are only imported when they are actually needed.
+Run from the repository root: 'python benchmarks/import_time.py [--baseline benchmarks/import_time_baseline.json]'
+"""
+import sys
+sys.path.append(".")
+import os
+import json
+import argparse
+import subprocess
+import statistics
+
+from sl_cutscenes.backends import HEAVY_MODULES
+
+# target name -> (code to import, modules that must NOT be imported afterwards)
+TARGETS = {
+    "package": ("import sl_cutscenes", HEAVY_MODULES),
+    "cli_args": ("import sl_cutscenes.utils.utils; import sl_cutscenes.constants", HEAVY_MODULES),
+    "scenario_registry": ("from sl_cutscenes.scenarios import SCENARIOS; list(SCENARIOS.keys())", HEAVY_MODULES),
+    "physx_scenario": ("from sl_cutscenes.scenarios import SCENARIOS; SCENARIOS['bowl']; import sl_cutscenes.output",
+                       ["nimblephysics", "scipy"]),
+    "generation": ("from sl_cutscenes import generate", ["nimblephysics", "scipy"]),
+}
+
+MEASURE_SNIPPET = """
+import sys, time, json
+t0 = time.perf_counter()
+{code}
+t1 = time.perf_counter()
+print(json.dumps({{"seconds": t1 - t0, "modules": sorted({{m.split('.')[0] for m in sys.modules}})}}))
+"""
+
+
+def measure(code, repeats):
+    """ Imports the given code in 'repeats' fresh interpreters. Returns the timings and the imported top-level modules """
+    timings, modules = [], set()
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", MEASURE_SNIPPET.format(code=code)], cwd=os.getcwd(),
+                             capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        modules.update(result["modules"])
+    return timings, modules
+
+
+def main(cfg):
+    baseline = None
+    if cfg.baseline is not None and os.path.exists(cfg.baseline):
+        with open(cfg.baseline, "r") as f:
+            baseline = json.load(f)
+
+    report, failures = {}, []
+    for name in cfg.targets:
+        code, forbidden = TARGETS[name]
+        timings, modules = measure(code, cfg.repeats)
+        leaked = sorted(set(forbidden) & modules)
+        report[name] = {"median_s": statistics.median(timings), "min_s": min(timings), "leaked_modules": leaked}
+        if leaked:
+            failures.append(f"{name}: imports {leaked}")
+        if baseline is not None and name in baseline:
+            limit = baseline[name]["median_s"] * cfg.tolerance
+            if report[name]["median_s"] > limit:
+                failures.append(f"{name}: {report[name]['median_s']:.3f}s exceeds baseline limit of {limit:.3f}s")
+
+    print(json.dumps(report, indent=2))
+    if cfg.save_baseline is not None:
+        with open(cfg.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    if failures:
+        print("Import time guard FAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--targets", nargs="+", choices=list(TARGETS.keys()), default=list(TARGETS.keys()))
+    parser.add_argument("--repeats", type=int, default=5, help="Number of fresh interpreters per target.")
+    parser.add_argument("--baseline", type=str, default=None, help="JSON report to compare the timings against.")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="A target fails if its median import time exceeds the baseline by this factor.")
+    parser.add_argument("--save-baseline", type=str, default=None, help="If specified, writes the report there.")
+    main(parser.parse_args())
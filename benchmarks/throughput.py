@@ -0,0 +1,177 @@
+"""
+End-to-end throughput benchmark: runs each given scenario for a fixed seed and frame count and reports
+the throughput as well as latency percentiles for every traced stage of the pipeline (scene population, mesh
+loading, decoration, collision checks, simulation steps, rendering, every phase of frame writing) as JSON.
+Optionally compares against a stored baseline.
+
+Run from the repository root, e.g.:
+    python benchmarks/throughput.py --scenarios bowl stack --frames 30 --resolution 640 480 --renderer cpu
+    python benchmarks/throughput.py --baseline benchmarks/baseline.json  # exits with 1 on regressions
+"""
+import sys
+sys.path.append(".")
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from main import get_parser, prepare_cfg
+from sl_cutscenes import backends
+from sl_cutscenes.backends import sl
+from sl_cutscenes import tracing
+from sl_cutscenes.scenarios import SCENARIOS
+
+
+def summarize_stages(durations):
+    """ Latency statistics per stage, given a dict mapping stage names to lists of durations in seconds """
+    summary = {}
+    for stage, samples in sorted(durations.items()):
+        samples_ms = np.array(samples) * 1000.0
+        summary[stage] = {
+            "count": len(samples),
+            "total_s": float(samples_ms.sum() / 1000.0),
+            "mean_ms": float(samples_ms.mean()),
+            "p50_ms": float(np.percentile(samples_ms, 50)),
+            "p90_ms": float(np.percentile(samples_ms, 90)),
+            "p99_ms": float(np.percentile(samples_ms, 99)),
+        }
+    return summary
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def init_renderer(renderer):
+    if renderer == "fake":
+        backends.use_fake_stillleben()
+    if renderer == "cuda":
+        sl.init_cuda()
+    else:
+        sl.init()
+    return sl.RenderPass()
+
+
+def make_generation_cfg(bench_cfg, scenario_id, out_path):
+    args = ["--scenario", scenario_id, "--frames", str(bench_cfg.frames),
+            "--resolution", *[str(r) for r in bench_cfg.resolution],
+            "--cameras", str(bench_cfg.cameras), "--no-watchdog"]
+    if bench_cfg.renderer != "cuda":
+        args.append("--no-cuda")
+    if bench_cfg.renderer == "fake":
+        args.append("--fake-backend")
+    if bench_cfg.nimble or scenario_id == "robopushing":
+        args += ["--physics-engine", "nimble"]
+    if bench_cfg.no_gen:
+        args.append("--no-gen")
+    cfg = prepare_cfg(get_parser().parse_args(args))
+    cfg.out_path = str(out_path)
+    return cfg
+
+
+def run_benchmark(bench_cfg):
+    from sl_cutscenes.generation import init_populate_scene, run_and_render_scenario
+    renderer = init_renderer(bench_cfg.renderer)
+
+    report = {
+        "config": {"seed": bench_cfg.seed, "frames": bench_cfg.frames, "episodes": bench_cfg.episodes,
+                   "resolution": list(bench_cfg.resolution), "cameras": bench_cfg.cameras,
+                   "renderer": bench_cfg.renderer, "no_gen": bench_cfg.no_gen},
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "torch": torch.__version__},
+        "scenarios": {},
+    }
+    tracing.enable()  # the stages are the spans recorded by the tracing hooks of the generation code
+    with tempfile.TemporaryDirectory(prefix="sl_cutscenes_bench_") as tmp_dir:
+        for scenario_id in bench_cfg.scenarios:
+            tracing.TRACER.reset()
+            frames_written, wall_time = 0, 0.0
+            for episode in range(bench_cfg.episodes):
+                seed_everything(bench_cfg.seed + episode)
+                cfg = make_generation_cfg(bench_cfg, scenario_id, Path(tmp_dir) / f"{scenario_id}_{episode}")
+                t0 = time.perf_counter()
+                res = init_populate_scene(cfg, scenario_id=scenario_id)
+                if not res["render"]:
+                    print(f"scenario '{scenario_id}', episode {episode}: scene could not be populated")
+                    continue
+                scenario = res["scenario"]
+                run_and_render_scenario(cfg, renderer, scenario, episode)
+                wall_time += time.perf_counter() - t0
+                n_writers = sum(len(cam.stereo_positions) for cam in scenario.cameras)
+                frames_written += cfg.frames * n_writers
+
+            report["scenarios"][scenario_id] = {
+                "frames": frames_written,
+                "wall_s": wall_time,
+                "fps": frames_written / wall_time if wall_time > 0 else 0.0,
+                "stages": summarize_stages(tracing.TRACER.durations()),
+                "counters": tracing.TRACER.counters(),
+            }
+    return report
+
+
+def compare_to_baseline(report, baseline, tolerance):
+    """ Returns a list of human-readable regressions of 'report' w.r.t. 'baseline' """
+    regressions = []
+    for scenario_id, result in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(scenario_id)
+        if base is None:
+            continue
+        if result["fps"] < base["fps"] / tolerance:
+            regressions.append(f"{scenario_id}: {result['fps']:.2f} fps (baseline: {base['fps']:.2f} fps)")
+        for stage, stats in result["stages"].items():
+            base_stats = base["stages"].get(stage)
+            if base_stats is not None and stats["p50_ms"] > base_stats["p50_ms"] * tolerance:
+                regressions.append(f"{scenario_id}/{stage}: p50 {stats['p50_ms']:.2f}ms "
+                                   f"(baseline: {base_stats['p50_ms']:.2f}ms)")
+    return regressions
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS.keys()),
+                        default=[s for s in SCENARIOS.keys() if s != "robopushing"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--frames", type=int, default=30, help="Number of frames per episode.")
+    parser.add_argument("--episodes", type=int, default=1, help="Number of episodes per scenario.")
+    parser.add_argument("--resolution", nargs="+", type=int, default=(640, 480))
+    parser.add_argument("--cameras", type=int, default=1)
+    parser.add_argument("--renderer", type=str, choices=["cuda", "cpu", "fake"], default="cpu",
+                        help="'cpu' initializes stillleben with sl.init() and works without a GPU, 'fake' uses the "
+                             "CPU-only stand-in backend to measure the Python-side overhead of the pipeline.")
+    parser.add_argument("--nimble", action="store_true", help="If specified, simulates with nimblephysics.")
+    parser.add_argument("--no-gen", action="store_true", help="If specified, frames are rendered but not written.")
+    parser.add_argument("--out", type=str, default=None, help="If specified, writes the JSON report there.")
+    parser.add_argument("--baseline", type=str, default=None, help="JSON report to compare against.")
+    parser.add_argument("--tolerance", type=float, default=1.25,
+                        help="Relative slowdown w.r.t. the baseline that counts as a regression.")
+    return parser.parse_args()
+
+
+def main(bench_cfg):
+    report = run_benchmark(bench_cfg)
+    print(json.dumps(report, indent=2))
+    if bench_cfg.out is not None:
+        with open(bench_cfg.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if bench_cfg.baseline is not None:
+        with open(bench_cfg.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, bench_cfg.tolerance)
+        if regressions:
+            print("Throughput regressions w.r.t. baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("No regressions w.r.t. baseline.")
+
+
+if __name__ == "__main__":
+    main(get_args())
@@ -2,12 +2,13 @@ import os
 import argparse
 
 import sl_cutscenes.utils.utils as utils
-from sl_cutscenes import generate
 from sl_cutscenes.scenarios import SCENARIOS
 from sl_cutscenes.constants import ALL_LIGHTMAPS
+from sl_cutscenes.depth_encoding import DEPTH_FORMATS, DEFAULT_DEPTH_SCALE
 
-if __name__ == "__main__":
-    os.system("cls" if os.name == "nt" else "clear")
+
+def get_parser():
+    """ The command line interface of the data generation. """
     parser = argparse.ArgumentParser(
         description=__doc__,
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
@@ -19,6 +20,12 @@ if __name__ == "__main__":
         help="If specified, starts stillleben in CPU mode. "
              "This is useful if viewing a scene using a different graphics device."
     )
+    parser.add_argument(
+        "--fake-backend",
+        action="store_true",
+        help="If specified, replaces stillleben by a CPU-only stand-in that approximates all objects by boxes. "
+             "Useful for testing and profiling without a render context or the object assets."
+    )
     parser.add_argument(
         "--no-gen",
         action="store_true",
@@ -59,7 +66,79 @@ if __name__ == "__main__":
     parser.add_argument(
         "--assemble-rgb",
         action="store_true",
-        help="If specified, creates mp4 video files from the RGB frames of an episode.",
+        help="If specified, creates mp4 video files from the RGB frames of an episode. "
+             "The frames are encoded while they are written, so the video is done when the episode is.",
+    )
+    parser.add_argument(
+        "--no-rgb-images",
+        action="store_true",
+        help="If specified, the RGB frames are not stored as JPEG images (e.g. if the video is enough).",
+    )
+    parser.add_argument(
+        "--rgb-codec",
+        type=str,
+        default="jpeg:95",
+        help="Image codec of the RGB frames as 'name' or 'name:param': jpeg:<quality>, png:<zlib level>, "
+             "webp:<quality>|lossless, qoi or raw (.npy).",
+    )
+    parser.add_argument(
+        "--lossless-codec",
+        type=str,
+        default="png:6",
+        help="Image codec of depth maps and masks: png:<zlib level> (lower levels encode faster, but bigger) or raw.",
+    )
+    parser.add_argument(
+        "--encode-threads",
+        type=int,
+        default=None,
+        help="Number of threads of the image encode pool shared by all writers. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--frame-ring",
+        type=str,
+        default=None,
+        help="If specified, every written frame (RGB, depth, index masks, object poses, camera) is additionally copied "
+             "into a shared-memory ring buffer of this name, which consumer processes can read without copying "
+             "(see frame_ring.py).",
+    )
+    parser.add_argument(
+        "--frame-ring-slots",
+        type=int,
+        default=16,
+        help="Number of frame slots of the shared-memory ring buffer.",
+    )
+    parser.add_argument(
+        "--frame-ring-max-objects",
+        type=int,
+        default=256,
+        help="Number of object entries of the pose table of a frame slot.",
+    )
+    parser.add_argument(
+        "--depth-format",
+        type=str,
+        default="uint16",
+        choices=DEPTH_FORMATS,
+        help="Storage format of the depth maps: 16-bit PNGs of 'depth * depth-scale', or float16/float32 meters "
+             "in compressed .npz files. The depth scale is recorded in scene_camera.json.",
+    )
+    parser.add_argument(
+        "--depth-scale",
+        type=float,
+        default=DEFAULT_DEPTH_SCALE,
+        help="uint16 depth pixels per meter. The default (0.1 mm units) covers depths up to 6.55 m, "
+             "use e.g. 1000 (1 mm units) for depths up to 65.5 m.",
+    )
+    parser.add_argument(
+        "--mask-pngs",
+        action="store_true",
+        help="If specified, the visible mask of every object in every frame is additionally saved as PNG file in "
+             "'mask_visib'. All visible and amodal masks are written as COCO RLE to scene_gt_masks.json anyway.",
+    )
+    parser.add_argument(
+        "--frame-streams",
+        action="store_true",
+        help="If specified, depth and index masks of an episode are stored losslessly in one delta-compressed "
+             "frame stream file each instead of one PNG per frame. Read them with frame_stream.FrameStreamReader.",
     )
     parser.add_argument(
         "--serialize-scene",
@@ -132,14 +211,100 @@ if __name__ == "__main__":
         help="BETA: If specified, and the nimblephysics engine is used, starts a nimblephysics GUI after scene "
              "simulation/rendering to let the user view the scene as it plays out in nimblephysics."
     )
+    parser.add_argument(
+        "--no-watchdog",
+        action="store_true",
+        help="If specified, disables the per-frame sanity checks (NaN states, objects leaving the room or "
+             "tunneling through the table, exceeded time budget) that abort and discard broken episodes."
+    )
+    parser.add_argument(
+        "--episode-timeout",
+        type=float,
+        default=600.0,
+        help="Wall-clock time budget (in s) for simulating and rendering a single episode. 0 disables the timeout."
+    )
+    parser.add_argument(
+        "--episode-retries",
+        type=int,
+        default=2,
+        help="Number of times an episode discarded by the watchdog is re-generated before giving up."
+    )
+    parser.add_argument(
+        "--spawn-at-rest",
+        action="store_true",
+        help="If specified, the props of the 'tidy' and 'robopushing' scenarios are spawned in one of their stable "
+             "resting poses (see scripts/compute_resting_poses.py) instead of being left to settle."
+    )
+    parser.add_argument(
+        "--fork-variants",
+        type=int,
+        default=1,
+        help="If > 1, the preparation phase of each episode (in which the objects settle) is simulated once, "
+             "and this many variants are forked from the settled state, each with its own output folders."
+    )
+    parser.add_argument(
+        "--fork-reroll",
+        nargs="*",
+        choices=["cameras", "lighting"],
+        default=["cameras", "lighting"],
+        help="What is re-sampled for every forked variant. Events after the preparation phase (e.g. the gripper "
+             "trajectory or the bowling ball) are always sampled anew."
+    )
+    parser.add_argument(
+        "--room-library",
+        type=str,
+        default=None,
+        help="If specified, the room of every episode is drawn from this library of pre-generated room layouts "
+             "(see scripts/bake_rooms.py) instead of being assembled and furnished online."
+    )
+    parser.add_argument(
+        "--recycle-scenes",
+        type=int,
+        default=0,
+        help="If > 0, the scene of a finished episode is reused by a later episode of the same scenario: only the "
+             "room (floor, walls, furniture) is kept, everything else is set up anew. A room is re-randomized after "
+             "being used for this many episodes. 0 creates a new scene for every episode."
+    )
+    parser.add_argument(
+        "--record-trajectories",
+        action="store_true",
+        help="If specified, episodes are only simulated: the object poses and camera positions of every frame are "
+             "saved to '<episode>.traj.npz', to be rendered later (with any camera rig and resolution, and in "
+             "parallel) by scripts/replay_trajectories.py."
+    )
+    parser.add_argument(
+        "--prefetch-episodes",
+        action="store_true",
+        help="If specified, the scene of the next episode is populated in a background thread while the current "
+             "episode is simulated and rendered. Meshes and light maps are cached across episodes either way. "
+             "Note: as both threads draw from the same random generators, runs are not reproducible with this flag. "
+             "With '--trace', spans are recorded per thread: the scene setup spans of a prefetched episode are saved "
+             "with that episode, on the prefetch thread's track and before the episode's start (negative times)."
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="If specified, records spans of the generation hot paths (scene setup, simulation, rendering, "
+             "frame writing) and saves them per episode as a Chrome trace / Perfetto JSON file."
+    )
+
+    return parser
+
 
-    # config preparation
-    cfg = parser.parse_args()
+def prepare_cfg(cfg):
+    """ Adds the derived configuration values to the parsed arguments. """
     cfg.out_path = f"out/{utils.timestamp()}"
     cfg.device = "cpu" if cfg.no_cuda else "cuda"
     cfg.sim_dt = 1.0 / cfg.sim_steps_per_sec
     cfg.cam_dt = cfg.sim_dt * cfg.sim_steps_per_frame
     cfg.sim_fps = cfg.sim_steps_per_sec / cfg.sim_steps_per_frame
+    return cfg
+
+
+if __name__ == "__main__":
+    os.system("cls" if os.name == "nt" else "clear")
+    cfg = prepare_cfg(get_parser().parse_args())
 
     print(f"Generating {cfg.frames} frames at {cfg.sim_fps} fps")
+    from sl_cutscenes import generate  # imported late so that e.g. '--help' does not load the renderer
     generate(cfg)
@@ -0,0 +1,61 @@
+"""
+Bakes a library of room layouts for main.py's '--room-library': assembles and furnishes rooms exactly like
+the online room assembly does, and stores the catalog names and poses of their objects together with
+their occupancy grids. Layout i is generated with the seed 'seed + i'.
+
+Run from the repository root, e.g.:
+    python scripts/bake_rooms.py --num-layouts 500 --seed 0 --out rooms/rooms_500.json
+"""
+import sys
+sys.path.append(".")
+import argparse
+import random
+
+import numpy as np
+import torch
+from tqdm import tqdm
+
+from sl_cutscenes import backends
+from sl_cutscenes.backends import sl
+from sl_cutscenes.constants import SCENARIO_DEFAULTS
+from sl_cutscenes.room_library import RoomLibrary
+from sl_cutscenes.room_models import RoomAssembler
+import sl_cutscenes.utils.utils as utils
+
+
+def bake_layout(seed):
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+    torch.manual_seed(seed)
+    utils.randomize()  # picks the floor and wall meshes
+
+    room = RoomAssembler(scene=sl.Scene((64, 64)))
+    room.make_room()
+    room.add_wall_furniture()
+    layout = room.get_layout()
+    layout["seed"] = seed
+    return layout
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-layouts", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first layout.")
+    parser.add_argument("--out", type=str, required=True, help="Path of the library file (JSON).")
+    parser.add_argument("--fake-backend", action="store_true",
+                        help="Use the CPU-only stand-in backend, whose meshes are boxes of the objects' sizes.")
+    return parser.parse_args()
+
+
+def main(bake_cfg):
+    if bake_cfg.fake_backend:
+        backends.use_fake_stillleben()
+    sl.init()  # loading meshes needs a render context
+    layouts = [bake_layout(bake_cfg.seed + i) for i in tqdm(range(bake_cfg.num_layouts))]
+    library = RoomLibrary(layouts, seed=bake_cfg.seed, bounds=SCENARIO_DEFAULTS["decorator"]["bounds"])
+    library.save(bake_cfg.out)
+    print(f"saved {len(library)} room layouts to '{bake_cfg.out}'")
+
+
+if __name__ == "__main__":
+    main(get_args())
@@ -1,15 +1,30 @@
 """
 Iterating through all sequences in a data directory, computing data stats for
 each sequence (#instances, #activities, ...), cleaning stats and saving them
+
+The sequences are processed in parallel (see '--workers'), and the annotation files are parsed frame by frame,
+so that the memory consumption neither depends on the length of the sequences nor on their number:
+the per-sequence stats are streamed into 'all_stats.json' while only a mergeable aggregate is kept per activity.
+
+The stats of each sequence are cached in a sidecar file inside the sequence directory, keyed by size, mtime and
+content hash of the annotation files. When the stats of a growing dataset are refreshed, only new or changed
+sequences are parsed again.
 """
 
 import os
-import copy
-from tqdm import tqdm
+import re
 import json
+import hashlib
 import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
 import numpy as np
-import pandas as pd
+
+# per-sequence quantities of which mean/std/min/max are reported, as named in the output files
+QUANTITIES = ["frames", "instances", "pix", "bbox", "pix_visibility", "bbox visibility"]
+ANNOTATION_FILES = ["scene_gt.json", "scene_gt_info.json"]
+CACHE_FILE = "seq_stats_cache.json"
 
 
 def get_args():
@@ -21,6 +36,17 @@ def get_args():
         required=True,
         help="Directory with the sequences to extract the stats from. Relative to root directory",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of processes parsing the sequences. 1 processes all sequences in the main process",
+    )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="If specified, ignores the cached per-sequence stats and parses all sequences again",
+    )
     cfg = parser.parse_args()
 
     assert os.path.exists(os.path.join(os.getcwd(), cfg.data_path)), \
@@ -29,6 +55,157 @@ def get_args():
     return cfg
 
 
+class JSONObjectStream:
+    """
+    Incremental parser for files holding one large JSON object, such as the BOP annotation files
+    {"0": [...], "1": [...], ...}. Only a single value (i.e. the annotations of one frame) is decoded at a time.
+    """
+    WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+    def __init__(self, f, chunk_size=1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf, self.pos = "", 0
+
+    def _fill(self):
+        """ Reads the next chunk, dropping the consumed part of the buffer. Returns False at the end of the file """
+        chunk = self.f.read(self.chunk_size)
+        self.buf, self.pos = self.buf[self.pos:] + chunk, 0
+        return len(chunk) > 0
+
+    def _peek(self):
+        while True:
+            self.pos = self.WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return None
+
+    def _expect(self, chars):
+        c = self._peek()
+        if c is None or c not in chars:
+            raise ValueError(f"Invalid JSON object in {self.f.name}: expected one of '{chars}', got '{c}'")
+        self.pos += 1
+        return c
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                if end < len(self.buf):  # otherwise, e.g. a number might continue in the next chunk
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                pass
+            if not self._fill():
+                value, self.pos = self.decoder.raw_decode(self.buf, self.pos)  # raises for truncated files
+                return value
+
+    def items(self):
+        """ Yields the (key, value) pairs of the object """
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            yield key, self._value()
+            if self._expect(",}") == "}":
+                return
+
+
+def iter_json_items(file):
+    """ Streams the (key, value) pairs of the JSON object in the given file, using ijson if it is installed """
+    try:
+        import ijson
+    except ImportError:
+        with open(file, "r") as f:
+            yield from JSONObjectStream(f).items()
+    else:
+        with open(file, "rb") as f:
+            yield from ijson.kvitems(f, "", use_float=True)
+
+
+class StatsAggregate:
+    """
+    Partial aggregate over a set of sequences: count, mean, sum of squared deviations (M2), min and max
+    of each of the QUANTITIES, as well as the object frequencies. Aggregates are merged associatively.
+    """
+
+    def __init__(self):
+        """ Empty aggregate """
+        self.num_seqs = 0
+        self.mean = np.zeros(len(QUANTITIES))
+        self.m2 = np.zeros(len(QUANTITIES))
+        self.min = np.full(len(QUANTITIES), np.inf)
+        self.max = np.full(len(QUANTITIES), -np.inf)
+        self.obj_freqs = Counter()
+
+    @classmethod
+    def from_sequence(cls, seq_stats):
+        """ Aggregate of a single sequence, given its entry of all_stats.json """
+        gt_stats, info_stats = seq_stats["gt_stats"], seq_stats["info_stats"]
+        values = np.array([
+            gt_stats["num_frames"], gt_stats["num_instances"],
+            *info_stats["num_pixels"], *info_stats["bbox_size"],
+            *info_stats["pixel_visibility"], *info_stats["bbox_visibility"]
+        ], dtype=np.float64)
+
+        aggregate = cls()
+        aggregate.num_seqs = 1
+        aggregate.mean, aggregate.min, aggregate.max = values, values.copy(), values.copy()
+        for freqs in gt_stats["freq_objects"]:
+            aggregate.obj_freqs.update({int(obj_id): count for obj_id, count in freqs.items()})
+        return aggregate
+
+    def merge(self, other):
+        """ Merges 'other' into this aggregate (Chan et al.'s parallel variance) """
+        n = self.num_seqs + other.num_seqs
+        if other.num_seqs == 0:
+            return self
+        delta = other.mean - self.mean
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.num_seqs * other.num_seqs / n
+        self.mean = self.mean + delta * other.num_seqs / n
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        self.obj_freqs.update(other.obj_freqs)
+        self.num_seqs = n
+        return self
+
+    @staticmethod
+    def reduce(aggregates):
+        """ Vectorized merge of a list of aggregates (e.g. one per activity) into a single one """
+        aggregates = [aggregate for aggregate in aggregates if aggregate.num_seqs > 0]
+        result = StatsAggregate()
+        if len(aggregates) == 0:
+            return result
+        counts = np.array([aggregate.num_seqs for aggregate in aggregates], dtype=np.float64)[:, None]
+        means = np.stack([aggregate.mean for aggregate in aggregates])
+        result.num_seqs = int(counts.sum())
+        result.mean = (counts * means).sum(axis=0) / counts.sum()
+        result.m2 = np.stack([aggregate.m2 for aggregate in aggregates]).sum(axis=0) + \
+            (counts * (means - result.mean) ** 2).sum(axis=0)
+        result.min = np.stack([aggregate.min for aggregate in aggregates]).min(axis=0)
+        result.max = np.stack([aggregate.max for aggregate in aggregates]).max(axis=0)
+        for aggregate in aggregates:
+            result.obj_freqs.update(aggregate.obj_freqs)
+        return result
+
+    def get_stats(self):
+        """ Mean, std, min and max of each quantity """
+        std = np.sqrt(self.m2 / self.num_seqs)
+        return {
+            quantity: {
+                "mean": float(self.mean[i]),
+                "std": float(std[i]),
+                "min": float(self.min[i]),
+                "max": float(self.max[i])
+            } for i, quantity in enumerate(QUANTITIES)
+        }
+
+
 class DatasetStats:
     """
     Object for computing and accumulating the dataset stats
@@ -37,136 +214,115 @@ class DatasetStats:
     def __init__(self, data_path):
         """ """
         self.data_path = data_path
-        self.gt_stats = {
-            "num_frames": [],
-            "num_instances": [],
-            "freq_objects": []
-        }
-        self.info_stats = {
-            "num_pixels": [],
-            "bbox_size": [],
-            "pixel_visibility": [],
-            "bbox_visibility": []
-        }
+        self.num_seqs = 0
+        self.aggregates = {}  # activity -> StatsAggregate
 
-        self.all_stats = {}
+        # the per-sequence stats are streamed to disk and moved to their final location in save_stats()
+        self.all_stats_tmp_file = os.path.join(data_path, "all_stats.json.tmp")
+        self.all_stats_file = open(self.all_stats_tmp_file, "w")
+        self.all_stats_file.write("{\n")
         return
 
     # NOTE: Will the objects always be the same for all frames, or will that eventually change?
-    def compute_gt_stats(self, file):
+    @staticmethod
+    def compute_gt_stats(file):
         """
         Computing some stats from the scene_gt.json file
         """
         assert file.split("_")[-1] == "gt.json", f"Wrong gt file {os.path.basename(file)}..."
-        with open(file, "r") as f:
-            gt_data = json.load(f)
 
-        # fetching object ids and num objects for sequence
-        data = gt_data[list(gt_data.keys())[0]]
+        # fetching object ids and num objects of the first frame, counting the frames of the sequence
+        data, num_frames = None, 0
+        for _, frame_data in iter_json_items(file):
+            data = frame_data if data is None else data
+            num_frames += 1
         obj_ids = [obj["obj_id"] for obj in data]
         unique_ids, counts = np.unique(obj_ids, return_counts=True)
-        num_instances = len(data)
-        num_frames = len(gt_data)
-
-        # accumulating
-        gt_stats = copy.deepcopy(self.gt_stats)
-        gt_stats["num_frames"] = num_frames
-        gt_stats["num_instances"] = num_instances
-        gt_stats["freq_objects"].append({int(id): int(count) for id, count in zip(unique_ids, counts)})
 
+        gt_stats = {
+            "num_frames": num_frames,
+            "num_instances": len(data),
+            "freq_objects": [{int(id): int(count) for id, count in zip(unique_ids, counts)}]
+        }
         return gt_stats
 
-    def compute_info_stats(self, file):
+    @staticmethod
+    def compute_info_stats(file):
         """
         Computing some stats from the scene_gt_info.json file
         """
         assert file.split("_")[-1] == "info.json", f"Wrong gt_info file {os.path.basename(file)}..."
-        with open(file, "r") as f:
-            info_data = json.load(f)
 
         # NOTE: What frequency do we want, framewise or sequence wise?. Let"s go sequencewise for now
-        # fetching framewise pixel and bbox information
-        cur_pixels, cur_bbox, cur_pixel_vis, cur_bbox_vis = [], [], [], []
-        for _, data in info_data.items():
+        # accumulating framewise pixel and bbox information
+        sums, count = np.zeros(4), 0
+        for _, data in iter_json_items(file):
             for obj in data:
-                cur_pixels.append(obj["px_count_all"])
-                cur_bbox.append(obj["bbox_obj"][2] * obj["bbox_obj"][3])
-                cur_pixel_vis.append(obj["visib_fract"])
-                cur_bbox_vis.append(
-                        self._get_bbox_vis(bbox=obj["bbox_obj"], bbox_vis=obj["bbox_visib"])
-                    )
-
-        info_stats = copy.deepcopy(self.info_stats)
-        info_stats["num_pixels"].append( np.mean(cur_pixels) )
-        info_stats["bbox_size"].append( np.mean(cur_bbox) )
-        info_stats["pixel_visibility"].append( np.mean(cur_pixel_vis) )
-        info_stats["bbox_visibility"].append( np.mean(cur_bbox_vis) )
-
+                sums += (
+                    obj["px_count_all"],
+                    obj["bbox_obj"][2] * obj["bbox_obj"][3],
+                    obj["visib_fract"],
+                    DatasetStats._get_bbox_vis(bbox=obj["bbox_obj"], bbox_vis=obj["bbox_visib"])
+                )
+                count += 1
+        means = sums / count if count > 0 else np.full(4, np.nan)
+
+        info_stats = {
+            "num_pixels": [float(means[0])],
+            "bbox_size": [float(means[1])],
+            "pixel_visibility": [float(means[2])],
+            "bbox_visibility": [float(means[3])]
+        }
         return info_stats
 
-    def accumulate_stats(self, seq_path):
+    def accumulate_stats(self, seq_path, use_cache=True):
         """
         Computing stats for sequence
         """
-        # files
-        seq_name = os.path.basename(seq_path)
-        scene = seq_name.split("_")[1]
-        gt_file = os.path.join(seq_path, "scene_gt.json")
-        info_file = os.path.join(seq_path, "scene_gt_info.json")
-
-        # computing statistics from each of the files
-        gt_stats = self.compute_gt_stats(gt_file)
-        info_stats = self.compute_info_stats(info_file)
-
-        # aggregating
-        seq_num = len(self.all_stats)
-        cur_stats = {
-            "scene": scene,
-            "seq_name": seq_name,
-            "gt_stats": gt_stats,
-            "info_stats": info_stats
-        }
-        self.all_stats[str(seq_num)] = cur_stats
+        self.add_sequence_stats(get_sequence_stats(seq_path, use_cache=use_cache))
+        return
 
+    def add_sequence_stats(self, seq_stats):
+        """
+        Adding the stats of a sequence, as computed by compute_sequence_stats()
+        """
+        if self.num_seqs != 0:
+            self.all_stats_file.write(",\n")
+        self.all_stats_file.write(f'"{self.num_seqs}": {json.dumps(seq_stats)}')
+        self.num_seqs += 1
+
+        scene = seq_stats["scene"]
+        if scene not in self.aggregates:
+            self.aggregates[scene] = StatsAggregate()
+        self.aggregates[scene].merge(StatsAggregate.from_sequence(seq_stats))
         return
 
     def compute_avg_stats(self, scene=None):
         """ Computing overall average stats considering all sequences """
 
-        stats = self.all_stats if scene is None else {k: v for k, v in self.all_stats.items() if v["scene"] == scene}
-        df = pd.DataFrame.from_dict(stats, orient="index")
+        scenes = list(self.aggregates.keys()) if scene is None else [scene]
+        aggregate = StatsAggregate.reduce([self.aggregates[s] for s in scenes])
+        stats = aggregate.get_stats()
 
         avg_stats = {}
 
         # frequency of each activity
-        scene_counts = df["scene"].value_counts().to_dict()
-        norm_scene_counts = (df["scene"].value_counts() / df["scene"].count()).to_dict()
-        avg_stats["scene_counts"] = scene_counts
-        avg_stats["norm_scene_counts"] = norm_scene_counts
+        scene_counts = sorted(((s, self.aggregates[s].num_seqs) for s in scenes), key=lambda sc: -sc[1])
+        avg_stats["scene_counts"] = {s: count for s, count in scene_counts}
+        avg_stats["norm_scene_counts"] = {s: count / aggregate.num_seqs for s, count in scene_counts}
 
         # mean/min/max number of frames and instances
-        frames = [stats[n]["gt_stats"]["num_frames"] for n in stats.keys()]
-        instances = [stats[n]["gt_stats"]["num_instances"] for n in stats.keys()]
-        avg_stats["frames"] = self._add_stats(frames)
-        avg_stats["instances"] = self._add_stats(instances)
+        avg_stats["frames"] = stats["frames"]
+        avg_stats["instances"] = stats["instances"]
 
         # frequency of each object
-        freqs = [freqs for n in stats.keys() for freqs in stats[n]["gt_stats"]["freq_objects"]]
-        df = pd.DataFrame(freqs)
-        obj_freqs = df.sum(0).to_dict()
-        norm_obj_freqs = (df.sum(0) / df.sum().sum()).to_dict()
-        avg_stats["obj_freqs"] = obj_freqs
-        avg_stats["norm_obj_freqs"] = norm_obj_freqs
+        total_freqs = sum(aggregate.obj_freqs.values())
+        avg_stats["obj_freqs"] = dict(aggregate.obj_freqs)
+        avg_stats["norm_obj_freqs"] = {obj_id: freq / total_freqs for obj_id, freq in aggregate.obj_freqs.items()}
 
         # mean/min/max of annotated pixels, bbox and corresponding visibilities
-        pix = [p for n in stats.keys() for p in stats[n]["info_stats"]["num_pixels"]]
-        bbox = [b for n in stats.keys() for b in stats[n]["info_stats"]["bbox_size"]]
-        pix_vis = [p for n in stats.keys() for p in stats[n]["info_stats"]["pixel_visibility"]]
-        bbox_vis = [b for n in stats.keys() for b in stats[n]["info_stats"]["bbox_visibility"]]
-        avg_stats["pix"] = self._add_stats(pix)
-        avg_stats["bbox"] = self._add_stats(bbox)
-        avg_stats["pix_visibility"] = self._add_stats(pix_vis)
-        avg_stats["bbox visibility"] = self._add_stats(bbox_vis)
+        for quantity in ["pix", "bbox", "pix_visibility", "bbox visibility"]:
+            avg_stats[quantity] = stats[quantity]
 
         return avg_stats
 
@@ -176,14 +332,12 @@ class DatasetStats:
         """
         path = path if path is not None else self.data_path
         # average stats for each sequence
-        all_stats_file = os.path.join(path, "all_stats.json")
-        with open(all_stats_file, "w") as f:
-            json.dump(self.all_stats, f)
+        self.all_stats_file.write("\n}")
+        self.all_stats_file.close()
+        os.replace(self.all_stats_tmp_file, os.path.join(path, "all_stats.json"))
 
         # stats for each activity independently
-        df = pd.DataFrame.from_dict(self.all_stats, orient="index")
-        activities = df["scene"].unique()
-        for activity in activities:
+        for activity in self.aggregates.keys():
             activity_stats_file = os.path.join(path, f"stats_{activity}.json")
             activity_stats = self.compute_avg_stats(scene=activity)
             with open(activity_stats_file, "w") as f:
@@ -197,17 +351,8 @@ class DatasetStats:
 
         return
 
-    def _add_stats(self, data):
-        """ Getting mean, std, max, min for a list of measurements """
-        stats = {
-            "mean": float(np.mean(data)),
-            "std": float(np.std(data)),
-            "min": float(np.min(data)),
-            "max": float(np.max(data))
-        }
-        return stats
-
-    def _get_bbox_vis(self, bbox, bbox_vis):
+    @staticmethod
+    def _get_bbox_vis(bbox, bbox_vis):
         """ Computing the percentage of the bbox that is visible """
         # NOTE: Im assuming GT bboxes are parameterized as (x0, y0, H, W)
         area_bbox = bbox[2] * bbox[3]
@@ -216,16 +361,112 @@ class DatasetStats:
         return bbox_vis
 
 
+def compute_sequence_stats(seq_path):
+    """
+    Computing the stats of a single sequence. Runs in the worker processes.
+    """
+    # files
+    seq_name = os.path.basename(seq_path)
+    scene = seq_name.split("_")[1]
+    gt_file = os.path.join(seq_path, "scene_gt.json")
+    info_file = os.path.join(seq_path, "scene_gt_info.json")
+
+    # computing statistics from each of the files
+    seq_stats = {
+        "scene": scene,
+        "seq_name": seq_name,
+        "gt_stats": DatasetStats.compute_gt_stats(gt_file),
+        "info_stats": DatasetStats.compute_info_stats(info_file)
+    }
+    return seq_stats
+
+
+def get_file_key(file, hash_file=True):
+    """ Cache key of a file: size, mtime and (optionally) the hash of its contents """
+    stat = os.stat(file)
+    key = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+    if hash_file:
+        digest = hashlib.blake2b()
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        key["hash"] = digest.hexdigest()
+    return key
+
+
+def get_sequence_stats(seq_path, use_cache=True):
+    """
+    Stats of a single sequence, either from its cache sidecar or freshly computed (which updates the sidecar).
+    A cache entry is valid if size and mtime of all annotation files are unchanged. If they changed, e.g. because
+    the sequence has been copied, the contents are hashed and the entry is still valid if the hashes match.
+    """
+    cache_file = os.path.join(seq_path, CACHE_FILE)
+    files = [os.path.join(seq_path, file) for file in ANNOTATION_FILES]
+
+    cache, hashed_keys = None, None
+    if use_cache and os.path.exists(cache_file):
+        try:
+            with open(cache_file, "r") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = None  # unreadable sidecar -> recompute
+
+    if cache is not None:
+        keys = [get_file_key(file, hash_file=False) for file in files]
+        cached_keys = [cache["keys"].get(file_name, {}) for file_name in ANNOTATION_FILES]
+        unchanged = all(key["size"] == cached["size"] and key["mtime"] == cached["mtime"]
+                        for key, cached in zip(keys, cached_keys) if cached)
+        if len(cache["keys"]) != len(ANNOTATION_FILES) or not unchanged:
+            hashed_keys = [get_file_key(file) for file in files]
+            if any(key["hash"] != cached.get("hash") for key, cached in zip(hashed_keys, cached_keys)):
+                cache = None  # contents changed
+            else:
+                write_cache(cache_file, hashed_keys, cache["gt_stats"], cache["info_stats"])  # e.g. copied
+
+    if cache is not None:
+        gt_stats, info_stats = cache["gt_stats"], cache["info_stats"]
+    else:
+        keys = hashed_keys if hashed_keys is not None else [get_file_key(file) for file in files]
+        seq_stats = compute_sequence_stats(seq_path)
+        gt_stats, info_stats = seq_stats["gt_stats"], seq_stats["info_stats"]
+        write_cache(cache_file, keys, gt_stats, info_stats)
+
+    # name and activity are derived from the current path, since sequences might have been renamed
+    seq_name = os.path.basename(seq_path)
+    return {"scene": seq_name.split("_")[1], "seq_name": seq_name, "gt_stats": gt_stats, "info_stats": info_stats}
+
+
+def write_cache(cache_file, keys, gt_stats, info_stats):
+    """ Writing the cache sidecar of a sequence atomically """
+    cache = {
+        "keys": {file_name: key for file_name, key in zip(ANNOTATION_FILES, keys)},
+        "gt_stats": gt_stats,
+        "info_stats": info_stats
+    }
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_file, cache_file)
+    return
+
+
 def main(cfg):
     """ """
     data_path = cfg.data_path
     seq_paths = [os.path.join(data_path, dir) for dir in sorted(os.listdir(data_path))]
+    seq_paths = [seq_path for seq_path in seq_paths if os.path.isdir(seq_path)]
     statsCalculator = DatasetStats(data_path)
 
-    for seq_path in tqdm(seq_paths):
-        if(not os.path.isdir(seq_path)):
-            continue
-        statsCalculator.accumulate_stats(seq_path=seq_path)
+    if cfg.workers > 1:
+        with ProcessPoolExecutor(max_workers=cfg.workers) as pool:
+            chunksize = max(1, min(64, len(seq_paths) // (4 * cfg.workers)))
+            use_cache = [not cfg.no_cache] * len(seq_paths)
+            all_seq_stats = pool.map(get_sequence_stats, seq_paths, use_cache, chunksize=chunksize)
+            for seq_stats in tqdm(all_seq_stats, total=len(seq_paths)):
+                statsCalculator.add_sequence_stats(seq_stats)
+    else:
+        for seq_path in tqdm(seq_paths):
+            statsCalculator.accumulate_stats(seq_path=seq_path, use_cache=not cfg.no_cache)
 
     statsCalculator.save_stats()
 
@@ -0,0 +1,147 @@
+"""
+Computes the stable resting poses of catalog objects by dropping many copies of each object in random
+orientations onto a floor and clustering the orientations they come to rest in (see sl_cutscenes/resting_poses.py).
+The results are merged into the resting pose file next to the object catalog, which the scenarios use with
+main.py's '--spawn-at-rest'.
+
+Run from the repository root, e.g.:
+    python scripts/compute_resting_poses.py --sets YCBV_OBJECTS --drops 64
+    python scripts/compute_resting_poses.py --prefixes 002 003 004 --tags bowl
+    python scripts/compute_resting_poses.py --objects 002_master_chef_can 005_tomato_soup_can --out poses.json
+"""
+import sys
+sys.path.append(".")
+import json
+import argparse
+
+import numpy as np
+import torch
+from tqdm import tqdm
+
+from sl_cutscenes import backends
+from sl_cutscenes.backends import sl
+import sl_cutscenes.constants as CONSTANTS
+from sl_cutscenes.object_info import CATALOG
+from sl_cutscenes.objects.mesh_loader import MeshLoader
+from sl_cutscenes.objects.object_loader import ObjectLoader
+from sl_cutscenes import resting_poses
+
+SIM_DT = 1.0 / 240
+REST_SPEED = 0.01  # objects slower than this (m/s, rad/s) for REST_STEPS steps are at rest
+REST_STEPS = 30
+
+
+def random_rotations(rng, n):
+    """ Uniformly distributed rotation matrices from normalized Gaussian quaternions """
+    q = rng.normal(size=(n, 4))
+    w, x, y, z = (q / np.linalg.norm(q, axis=1, keepdims=True)).T
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], axis=-1),
+        np.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], axis=-1),
+        np.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], axis=-1),
+    ], axis=1)
+
+
+def drop_batch(obj_info, floor_info, rng, batch_size, drop_height, max_time):
+    """
+    Drops batch_size copies of the object onto a floor, side by side in one scene.
+    :return: Rotations (N, 3, 3) and origin heights above the floor (N,) of the copies that came to rest
+    """
+    scene = sl.Scene((64, 64))
+    mesh_loader, object_loader = MeshLoader(), ObjectLoader()
+    mesh_loader.load_meshes([floor_info])
+    mesh_loader.load_meshes([obj_info])
+    floor_info_mesh, obj_info_mesh = mesh_loader.get_meshes()
+
+    floor = object_loader.create_object(*floor_info_mesh, is_static=True)
+    scene.add_object(floor)
+    floor_top = float(floor.pose()[2, 3] + floor.mesh.bbox.max[2])
+
+    extent = float(torch.linalg.norm(obj_info_mesh[1].bbox.max - obj_info_mesh[1].bbox.min))
+    grid = int(np.ceil(np.sqrt(batch_size)))
+    objects = []
+    for i, rotation in enumerate(random_rotations(rng, batch_size)):
+        pose = torch.eye(4)
+        pose[:3, :3] = torch.from_numpy(rotation).float()
+        pose[0, 3] = (i % grid - (grid - 1) / 2) * 2 * extent
+        pose[1, 3] = (i // grid - (grid - 1) / 2) * 2 * extent
+        pose[2, 3] = floor_top + extent / 2 + drop_height
+        obj = object_loader.create_object(*obj_info_mesh, is_static=False, mod_pose=pose)
+        scene.add_object(obj)
+        objects.append(obj)
+
+    resting_steps = np.zeros(len(objects), dtype=int)
+    for _ in range(int(max_time / SIM_DT)):
+        scene.simulate(SIM_DT)
+        speeds = np.array([max(float(torch.linalg.norm(obj.linear_velocity)),
+                               float(torch.linalg.norm(obj.angular_velocity))) for obj in objects])
+        resting_steps = np.where(speeds < REST_SPEED, resting_steps + 1, 0)
+        if (resting_steps >= REST_STEPS).all():
+            break
+
+    at_rest = [obj for obj, steps in zip(objects, resting_steps) if steps >= REST_STEPS]
+    rotations = np.stack([obj.pose()[:3, :3].numpy() for obj in at_rest]) if at_rest else np.zeros((0, 3, 3))
+    heights = np.array([float(obj.pose()[2, 3]) - floor_top for obj in at_rest])
+    return rotations, heights
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", nargs="*", default=[], help="Names of the catalog objects.")
+    parser.add_argument("--sets", nargs="*", default=[], choices=list(CONSTANTS.OBJECT_SETS.keys()),
+                        help="Object sets of the scenarios (see constants.OBJECT_SETS), e.g. 'YCBV_OBJECTS'.")
+    parser.add_argument("--prefixes", nargs="*", default=[], help="Name prefixes of the catalog objects, e.g. '002'.")
+    parser.add_argument("--tags", nargs="*", default=[],
+                        help="Tags the catalog objects all carry, e.g. 'ycb' or 'bowl' (see ObjectCatalog.get_tags()).")
+    parser.add_argument("--drops", type=int, default=64, help="Number of drops per object.")
+    parser.add_argument("--batch-size", type=int, default=16, help="Number of copies dropped at once.")
+    parser.add_argument("--drop-height", type=float, default=0.05, help="Drop height (m) above the floor.")
+    parser.add_argument("--max-time", type=float, default=5.0, help="Maximum simulated time (s) per batch.")
+    parser.add_argument("--angle-tol", type=float, default=10.0,
+                        help="Maximum angle (deg) between the up directions of drops counted as the same pose.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=str, default=str(resting_poses.RESTING_POSES_FP),
+                        help="Resting pose file to merge the results into.")
+    parser.add_argument("--fake-backend", action="store_true",
+                        help="Use the CPU-only stand-in backend (box-shaped objects), e.g. to test the tool.")
+    return parser.parse_args()
+
+
+def main(pose_cfg):
+    if pose_cfg.fake_backend:
+        backends.use_fake_stillleben()
+    sl.init()  # loading meshes needs a render context
+    objects = CATALOG.get_by_names(pose_cfg.objects) + CATALOG.get_by_prefixes(pose_cfg.prefixes)
+    objects += [obj for set_name in pose_cfg.sets for obj in getattr(CONSTANTS, set_name)]
+    objects += CATALOG.query(tags=pose_cfg.tags) if pose_cfg.tags else []
+    objects = list({obj.name: obj for obj in objects}.values())  # unique, in order
+    if not objects:
+        raise ValueError("no catalog objects selected, use '--objects', '--prefixes', '--sets' and/or '--tags'")
+    floor_info = CATALOG.get_by_category("floor")[0]
+    rng = np.random.default_rng(pose_cfg.seed)
+
+    all_poses = resting_poses.load(pose_cfg.out)
+    for obj_info in tqdm(objects):
+        rotations, heights = [], []
+        for start in range(0, pose_cfg.drops, pose_cfg.batch_size):
+            batch_rotations, batch_heights = drop_batch(obj_info, floor_info, rng,
+                                                        min(pose_cfg.batch_size, pose_cfg.drops - start),
+                                                        pose_cfg.drop_height, pose_cfg.max_time)
+            rotations.append(batch_rotations)
+            heights.append(batch_heights)
+        rotations, heights = np.concatenate(rotations), np.concatenate(heights)
+        if len(rotations) == 0:
+            print(f"{obj_info.name}: no drop came to rest, skipped")
+            continue
+        all_poses[obj_info.name] = {
+            "num_drops": int(len(rotations)),
+            "poses": resting_poses.cluster_resting_poses(rotations, heights, angle_tol=pose_cfg.angle_tol),
+        }
+
+    with open(pose_cfg.out, "w") as f:
+        json.dump(all_poses, f, indent=1)
+    print(f"saved the resting poses of {len(objects)} objects to '{pose_cfg.out}'")
+
+
+if __name__ == "__main__":
+    main(get_args())
@@ -1,26 +1,157 @@
+"""
+Tools for managing folders of generated data:
+ - merge_folders: merges folders of generated data into one, renumbering the iterations
+ - get_videos: collects the rendered videos of folders of generated data in separate folders
+
+Instead of copying (the default), files can be hardlinked (sharing their contents with the source files, so in-place
+edits of the output change the original data too), reflinked (copy-on-write clones, e.g. on btrfs or XFS) or moved
+(same file system only), or just a manifest mapping the new names to the existing paths is written (see '--mode').
+The output is assembled in parallel in a staging folder that only replaces the final output if everything
+succeeded, so that failures leave no partial output behind (moved files are moved back).
+"""
+import errno
+import json
 import shutil
 import sys, os, argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 sys.path.append(".")
 import sl_cutscenes.utils.utils as utils
+from sl_cutscenes.stats import AnnotationStats, load_run_stats, save_run_stats
 from pathlib import Path
 
+FICLONE = 0x40049409  # ioctl request of linux/fs.h
+
+
+def hardlink_file(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copy2(src, dst)  # src and dst are on different file systems
+    return dst
+
+
+def reflink_file(src, dst):
+    try:
+        import fcntl
+        with open(src, "rb") as f_src, open(dst, "wb") as f_dst:
+            fcntl.ioctl(f_dst.fileno(), FICLONE, f_src.fileno())
+        shutil.copystat(src, dst)
+    except (ImportError, OSError):
+        shutil.copy2(src, dst)  # no reflink support on this platform/file system
+    return dst
+
+
+FILE_TRANSFERS = {
+    "copy": shutil.copy2,
+    "hardlink": hardlink_file,
+    "reflink": reflink_file,
+}
+MODES = list(FILE_TRANSFERS.keys()) + ["move", "manifest"]
+
+
+def transfer(src, dst, mode):
+    ''' Transfers a file or a directory tree from 'src' to 'dst' according to the mode '''
+    if mode == "move":
+        os.rename(src, dst)
+    elif os.path.isdir(src):
+        shutil.copytree(src, dst, copy_function=FILE_TRANSFERS[mode])
+    else:
+        FILE_TRANSFERS[mode](src, dst)
+
+
+def commit_staging(staging_path, out_path):
+    '''
+    Moves the contents of the staging folder into 'out_path' (in the same parent folder). A new 'out_path' is
+    created by renaming the staging folder, which is atomic. When merging into an existing 'out_path', the entries
+    are moved one by one, and replaced entries are kept aside until all of them have been moved: if a move fails,
+    the moved entries go back to the staging folder and the replaced ones are restored.
+    '''
+    if not out_path.exists():
+        os.rename(staging_path, out_path)
+        return
+    backup_path = out_path.with_name(f"{out_path.name}.replaced")
+    if backup_path.exists():
+        shutil.rmtree(backup_path)  # leftover of a crashed run
+    backup_path.mkdir()
+    committed, replaced = [], []
+    try:
+        for entry in list(staging_path.iterdir()):
+            target = out_path / entry.name
+            if target.exists():
+                os.rename(target, backup_path / entry.name)
+                replaced.append(entry.name)
+            os.rename(entry, target)
+            committed.append(entry.name)
+    except BaseException:
+        for name in reversed(committed):
+            os.rename(out_path / name, staging_path / name)
+        for name in replaced:
+            os.rename(backup_path / name, out_path / name)
+        backup_path.rmdir()
+        raise
+    shutil.rmtree(backup_path)
+    staging_path.rmdir()
+
+
+def execute_plan(plan, out_path, mode, workers, run_stats=None):
+    '''
+    Assembles 'out_path' from the given plan, a list of tuples (source path, new name).
+    Either all entries end up in 'out_path', or none of them does.
+    '''
+    staging_path = out_path.with_name(f"{out_path.name}.partial")
+    if staging_path.exists():
+        shutil.rmtree(staging_path)  # leftover of a crashed run
+    staging_path.mkdir(parents=True)
+    transferred = []
+    try:
+        if mode == "manifest":
+            manifest = {new_name: str(src.resolve()) for src, new_name in plan}
+            with open(staging_path / "manifest.json", "w") as f:
+                json.dump(manifest, f, indent=2)
+        else:
+            errors = []
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(transfer, src, staging_path / new_name, mode): (src, staging_path / new_name)
+                           for src, new_name in plan}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                        transferred.append(futures[future])
+                    except Exception as e:
+                        errors.append(e)
+            if errors:
+                raise errors[0]
+        if run_stats:
+            save_run_stats(staging_path / "annotation_stats.json", run_stats)
+
+        commit_staging(staging_path, out_path)
+    except BaseException:
+        if mode == "move":
+            for src, dst in transferred:
+                os.rename(dst, src)
+        shutil.rmtree(staging_path, ignore_errors=True)
+        raise
+    print(f"{len(plan)} entries -> {out_path} ({mode})")
+
+
 def get_videos_from_folder(cfg):
     '''
-    Extracts the videos from the folders of generated data and copies them to a separate folder.
+    Extracts the videos from the folders of generated data and puts them into a separate folder.
     '''
     data_paths = [Path(dp) for dp in cfg.data_paths]
     for data_path in data_paths:
         out_path = OUT_BASE / f"{str(data_path.stem)}_videos"
-        out_path.mkdir(exist_ok=True)
         seq_names = [dir for dir in os.listdir(str(data_path))
                          if os.path.isdir(str(data_path / dir))]
+        plan = []
         for seq_name in seq_names:
             video_files = [vid_names for vid_names in os.listdir(str(data_path / seq_name))
                            if vid_names[-4:] == ".mp4"]
-            srcs = [str(data_path / seq_name / vid_fn) for vid_fn in video_files]
-            dsts = [str(out_path / f"{seq_name}_{vid_fn}") for vid_fn in video_files]
-            for src, dst in zip(srcs, dsts):
-                utils.copy_overwrite(src, dst)
+            plan += [(data_path / seq_name / vid_fn, f"{seq_name}_{vid_fn}") for vid_fn in video_files]
+        execute_plan(plan, out_path, cfg.mode, cfg.workers)
+
 
 def merge_folders(cfg):
     '''
@@ -28,18 +159,26 @@ def merge_folders(cfg):
     '''
     data_paths = [Path(dp) for dp in cfg.data_paths]
     out_path = OUT_BASE / f"merged_{utils.timestamp()}"
-    out_path.mkdir(exist_ok=True)
+    plan, run_stats = [], dict()
     iter_offset = 0
     for data_path in data_paths:
-        seq_names = [dir for dir in os.listdir(data_path)
-                         if os.path.isdir(str(data_path / dir))]
+        seq_names = sorted([dir for dir in os.listdir(data_path)
+                            if os.path.isdir(str(data_path / dir)) and dir[:6].isdigit()])
+        if len(seq_names) == 0:
+            continue
         for seq_name in seq_names:
             new_seq_path_it = int(seq_name[:6]) + iter_offset
-            seq_path_src = str(data_path / seq_name)
-            seq_path_dst = str(out_path / f"{new_seq_path_it:06d}{seq_name[6:]}")
-            shutil.copytree(seq_path_src, seq_path_dst)
+            plan.append((data_path / seq_name, f"{new_seq_path_it:06d}{seq_name[6:]}"))
         iter_offset += max({int(dir[:6]) for dir in seq_names}) + 1  # increase offset by number of its
 
+        # the annotation stats of the merged folders are merged as well
+        stats_file = data_path / "annotation_stats.json"
+        if stats_file.exists():
+            for scenario_name, stats in load_run_stats(stats_file).items():
+                run_stats.setdefault(scenario_name, AnnotationStats()).merge(stats)
+
+    execute_plan(plan, out_path, cfg.mode, cfg.workers, run_stats=run_stats)
+
 OUT_BASE = Path("out")
 PROGRAMS = {
     "merge_folders": merge_folders,
@@ -47,13 +186,23 @@ PROGRAMS = {
 }
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description=__doc__)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
     parser.add_argument(
         "--data-paths", type=str, nargs="+", help="paths to data directories"
     )
     parser.add_argument(
         "--program", type=str, choices=PROGRAMS.keys()
     )
+    parser.add_argument(
+        "--mode", type=str, choices=MODES, default="copy",
+        help="How the files get into the output folder. 'hardlink' and 'reflink' fall back to copying "
+             "where they are not supported, 'move' requires the output to be on the same file system. "
+             "Note: hardlinked files share their contents with the source files, so editing a file of the output "
+             "in place also changes the original data (and vice versa)."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=8, help="Number of parallel file operations"
+    )
 
     cfg = parser.parse_args()
     run = PROGRAMS[cfg.program]
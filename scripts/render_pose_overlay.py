@@ -55,6 +55,7 @@ def main(cfg):
                 # shutil.move(pose_pred_seq_fp, pose_pred_seq_out_path / pose_pred_seq)
                 (pose_pred_seq_out_path / "rgb").mkdir(exist_ok=True)
                 (pose_pred_seq_out_path / "obj_mask").mkdir(exist_ok=True)
+                (pose_pred_seq_out_path / "instance_index").mkdir(exist_ok=True)
                 (pose_pred_seq_out_path / "blended").mkdir(exist_ok=True)
                 blended_fps = []
 
@@ -74,7 +75,7 @@ def main(cfg):
             involved_class_ids = [int(object_dict["obj_id"]) for object_dict in obj_info_all_frames[0]]
             involved_obj_infos = get_objects_by_class_id(involved_class_ids)
             involved_meshes, involved_objects = {}, []
-            for obj_info in involved_obj_infos:
+            for obj_idx, obj_info in enumerate(involved_obj_infos):
                 involved_mesh = involved_meshes.get(obj_info.class_id, None)
                 if involved_mesh is None:
                     involved_mesh = sl.Mesh(str(mesh_base_path / obj_info.mesh_fp))
@@ -83,6 +84,7 @@ def main(cfg):
                     involved_mesh.pretransform = pt
                     involved_meshes[obj_info.class_id] = involved_mesh
                 obj = sl.Object(involved_mesh)
+                obj.instance_index = obj_idx + 1  # position in the frame's object list, 0 is the background
                 involved_objects.append(obj)
 
             # setup scene for this sequence
@@ -123,6 +125,8 @@ def main(cfg):
                     predicted_rgb = (2 * predicted_rgb / 255) - 1
                     obj_mask_out_fn = str(pose_pred_seq_out_path / "obj_mask" / f"{t:06d}.png")
                     predicted_obj_masks = writer.write_obj_mask(result, obj_mask_out_fn)
+                    instance_index_out_fn = str(pose_pred_seq_out_path / "instance_index" / f"{t:06d}.png")
+                    writer.write_instance_index(result, instance_index_out_fn)
                     use_blended = predicted_obj_masks > 0
                     # TODO value ranges of images?
 
@@ -0,0 +1,110 @@
+"""
+Renders trajectory logs recorded with main.py's '--record-trajectories' (see sl_cutscenes/trajectory.py) into
+BOP folders, like main.py would have written them. Nothing is simulated, so the same logs can be rendered again
+with other camera rigs or resolutions. The episodes (or, with '--split-cameras', their single cameras) are
+distributed over '--workers' processes with one renderer each.
+
+Run from the repository root, e.g.:
+    python scripts/replay_trajectories.py out/2022_01_01_12_00_00 --workers 4 --resolution 640 480
+    python scripts/replay_trajectories.py out/2022_01_01_12_00_00 --resample-cameras --rig-seed 1 --split-cameras
+"""
+import sys
+sys.path.append(".")
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from tqdm import tqdm
+
+from sl_cutscenes import backends
+from sl_cutscenes.backends import sl
+from sl_cutscenes.depth_encoding import DEPTH_FORMATS, DEFAULT_DEPTH_SCALE, DepthEncoder
+from sl_cutscenes.replay import replay_trajectory
+from sl_cutscenes.trajectory import Trajectory
+
+_RENDERER = None  # one render pass per worker process
+
+
+def init_worker(replay_cfg):
+    global _RENDERER
+    if replay_cfg.fake_backend:
+        backends.use_fake_stillleben()
+    if replay_cfg.no_cuda:
+        sl.init()
+    else:
+        sl.init_cuda()
+    _RENDERER = sl.RenderPass()
+
+
+def render_task(replay_cfg, trajectory_fp, camera_ids):
+    trajectory = Trajectory(trajectory_fp)
+    fps = trajectory.meta["sim_fps"]
+    suffix = "" if replay_cfg.rig_seed is None else f"_rig{replay_cfg.rig_seed:02}"
+    return replay_trajectory(trajectory, _RENDERER, replay_cfg.out_path, replay_cfg.resolution,
+                             camera_ids=camera_ids, resample=replay_cfg.resample_cameras, seed=replay_cfg.rig_seed,
+                             name_suffix=suffix, video_fps=fps if replay_cfg.assemble_rgb else None,
+                             write_rgb_images=not replay_cfg.no_rgb_images,
+                             depth_encoder=DepthEncoder(replay_cfg.depth_format, replay_cfg.depth_scale),
+                             mask_pngs=replay_cfg.mask_pngs, rgb_codec=replay_cfg.rgb_codec,
+                             lossless_codec=replay_cfg.lossless_codec)
+
+
+def get_tasks(replay_cfg):
+    """ :return: (trajectory path, camera ids) of all render tasks, camera ids None for all cameras """
+    tasks = []
+    for trajectory_fp in sorted(Path(replay_cfg.trajectories).glob("*.traj.npz")):
+        if replay_cfg.split_cameras:
+            n_cameras = Trajectory(trajectory_fp).meta["camera_rig"]["n_cameras"]
+            tasks.extend((trajectory_fp, [cam_idx]) for cam_idx in range(n_cameras))
+        else:
+            tasks.append((trajectory_fp, None))
+    return tasks
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trajectories", type=str, help="Directory of the trajectory logs (*.traj.npz).")
+    parser.add_argument("--out-path", type=str, default=None, help="Output directory, default: the log directory.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of render processes.")
+    parser.add_argument("--split-cameras", action="store_true",
+                        help="If specified, every camera of an episode is a separate task, e.g. to spread few "
+                             "episodes with many cameras over the workers.")
+    parser.add_argument("--resample-cameras", action="store_true",
+                        help="If specified, a new camera rig is sampled from the recorded rig's config instead of "
+                             "using the recorded camera positions.")
+    parser.add_argument("--rig-seed", type=int, default=None,
+                        help="Seed of the resampled camera rig, which is added to the output folder names.")
+    parser.add_argument("--resolution", nargs="+", type=int, default=(1920, 1080))
+    parser.add_argument("--assemble-rgb", action="store_true", help="If specified, also writes mp4 videos.")
+    parser.add_argument("--no-rgb-images", action="store_true", help="If specified, no RGB images are written.")
+    parser.add_argument("--rgb-codec", type=str, default="jpeg:95")
+    parser.add_argument("--lossless-codec", type=str, default="png:6")
+    parser.add_argument("--depth-format", type=str, default="uint16", choices=DEPTH_FORMATS)
+    parser.add_argument("--depth-scale", type=float, default=DEFAULT_DEPTH_SCALE)
+    parser.add_argument("--mask-pngs", action="store_true")
+    parser.add_argument("--no-cuda", action="store_true", help="If specified, renders in CPU mode.")
+    parser.add_argument("--fake-backend", action="store_true",
+                        help="Use the CPU-only stand-in backend, e.g. to test the tool.")
+    return parser.parse_args()
+
+
+def main(replay_cfg):
+    if replay_cfg.out_path is None:
+        replay_cfg.out_path = replay_cfg.trajectories
+    replay_cfg.resolution = tuple(replay_cfg.resolution)
+    tasks = get_tasks(replay_cfg)
+    if not tasks:
+        raise ValueError(f"no trajectory logs (*.traj.npz) found in '{replay_cfg.trajectories}'")
+
+    # 'spawn': every worker creates its own render context
+    with ProcessPoolExecutor(max_workers=replay_cfg.workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_worker, initargs=(replay_cfg,)) as executor:
+        futures = [executor.submit(render_task, replay_cfg, *task) for task in tasks]
+        for future in tqdm(futures):
+            future.result()
+    print(f"rendered {len(tasks)} tasks into '{replay_cfg.out_path}'")
+
+
+if __name__ == "__main__":
+    main(get_args())
@@ -1 +1,6 @@
-from .generation import generate
+def __getattr__(name):
+    # generation pulls in the renderer, so it is only imported once generate() is actually requested
+    if name == "generate":
+        from .generation import generate
+        return generate
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,72 @@
+"""
+Lazy access to the heavy (and partly optional) native backends.
+
+Importing nimblephysics, scipy or stillleben takes a considerable amount of time, even though e.g.
+PhysX-only runs never touch nimblephysics and 'main.py --help' needs none of them.
+The module proxies defined here only import the wrapped module on first attribute access:
+
+    from sl_cutscenes.backends import nimble
+    world = nimble.simulation.World()  # nimblephysics is imported here
+
+Since every module accesses stillleben through the 'sl' proxy, it can also be swapped for the stand-in
+backend in fake_stillleben.py by calling use_fake_stillleben() before its first use.
+"""
+import importlib
+import sys
+
+
+class LazyModule(object):
+    """
+    Stand-in for a module that is imported the first time one of its attributes is accessed.
+    """
+    def __init__(self, module_name: str):
+        self.__dict__["_module_name"] = module_name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self._module_name)
+            self.__dict__["_module"] = module
+        return module
+
+    def retarget(self, module_name: str):
+        """ Makes the proxy wrap 'module_name' instead, which is only possible before the wrapped module is loaded """
+        module = self.__dict__["_module"]
+        if module is not None and module.__name__ != module_name:
+            raise RuntimeError(f"can't switch to '{module_name}', '{module.__name__}' is already in use")
+        self.__dict__["_module_name"] = module_name
+
+    @property
+    def is_loaded(self):
+        """ True if the wrapped module has been imported, either through this proxy or anywhere else """
+        return self.__dict__["_module"] is not None or self._module_name in sys.modules
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.is_loaded else "not loaded"
+        return f"<lazy module '{self._module_name}' ({state})>"
+
+
+sl = LazyModule("stillleben")
+nimble = LazyModule("nimblephysics")
+scipy_transform = LazyModule("scipy.spatial.transform")
+
+FAKE_STILLLEBEN = "sl_cutscenes.fake_stillleben"
+
+
+def use_fake_stillleben():
+    """ Replaces stillleben by the CPU-only stand-in backend (see fake_stillleben.py), e.g. for tests and profiling """
+    sl.retarget(FAKE_STILLLEBEN)
+
+
+#: Modules that must not be imported by merely importing the package or the scenario registry
+HEAVY_MODULES = ["stillleben", "nimblephysics", "scipy"]
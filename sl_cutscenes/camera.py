@@ -1,3 +1,6 @@
+import random
+from copy import deepcopy
+
 import numpy as np
 import torch
 from typing import List
@@ -131,3 +134,30 @@ class Camera(object):
     def step(self, dt=None):
         dt = dt or self.cam_dt
         self.t += dt
+
+
+def sample_camera_rig(cam_config, n_cameras, cam_dt, base_lookat=None, coplanar_stereo=False,
+                      coplanar_stereo_dist=0.0, movement_complexity=0):
+    """
+    Samples the cameras of a scenario from its camera config: the first camera looks from the default orientation
+    angle, the others from random angles that are multiples of 5 degrees apart from it.
+    :param base_lookat: Overrides the look-at point of the config (e.g. after adjusting it to the table height)
+    """
+    base_lookat = cam_config["base_lookat"] if base_lookat is None else base_lookat
+
+    # pick default ori. angle and (n_cameras-1) other angles from a linspace of angles that are 5 degrees apart
+    default_ori_angle = cam_config["orientation_angle_default"]
+    cam_ori_angles = [0] + random.sample(np.linspace(0, 360, 72+1).tolist()[1:-1], k=n_cameras-1)
+    cam_ori_angles = [(angle + default_ori_angle) % 360 for angle in cam_ori_angles]
+    # TODO parameters 'orientation_angle_min/max' are not yet used!
+
+    cameras = []
+    for i, cam_ori_angle in enumerate(cam_ori_angles):
+        cam_elev_angle = random.uniform(cam_config["elevation_angle_min"], cam_config["elevation_angle_max"])
+        cam_dist = random.uniform(cam_config["distance_min"], cam_config["distance_max"])
+        cam_lookat = deepcopy(base_lookat)
+        cam_name = f"cam_{str(i).zfill(2)}"
+        cam_stereo_positions = ["left", "right"] if coplanar_stereo else ["mono"]
+        cameras.append(Camera(cam_name, cam_dt, cam_elev_angle, cam_ori_angle, cam_dist, cam_lookat,
+                              coplanar_stereo_dist, cam_stereo_positions, movement_complexity))
+    return cameras
@@ -11,7 +11,7 @@ from pathlib import Path
 
 import random
 import torch
-from sl_cutscenes.object_info import OBJECT_INFO
+from sl_cutscenes.object_info import CATALOG
 
 PI = torch.acos(torch.tensor(-1))
 
@@ -95,9 +95,6 @@ STACK_PYRAMID_POSES = [
 # Pre-defined object sets
 #########################
 
-# Robots etc.
-SUCTION_GRIPPER = [obj for obj in OBJECT_INFO if obj.name == "suction_gripper"]
-
 # YCB Objects
 FLAT_OBJS = [str(i).zfill(3) for i in range(0, 11)]
 FRUIT_OBJS = [str(i).zfill(3) for i in range(11, 19)]
@@ -107,64 +104,64 @@ DICE_OBJS = [str(i).zfill(3) for i in [5, 7, 8, 9]]
 YCB_SMALL_BALL_OBJS = [str(i).zfill(3) for i in [55, 56, 57, 58]]
 YCBV_OBJS = [str(i).zfill(3) for i in [2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 19, 21, 24, 25, 35, 36, 37, 40, 51, 52, 61]]
 
-# Meta-Subsets
-YCB_OBJECTS = [obj for obj in OBJECT_INFO if obj.name[0].isdigit()]
-OTHER_OBJECTS = [obj for obj in OBJECT_INFO if not obj.name[0].isdigit()]
-BOWLING_BALL = [obj for obj in OBJECT_INFO if obj.name == "bowling_ball"]
-WOOD_BLOCK = [obj for obj in OBJECT_INFO if obj.name == "036_wood_block"]
-WOODEN_BOX = [obj for obj in OBJECT_INFO if obj.name == "wooden_box"]
-CAMERA_OBJ = [obj for obj in OBJECT_INFO if obj.name == "camera_object"]
-DUMMY_CAMERA_OBJ = [obj for obj in OBJECT_INFO if obj.name == "dummy_camera_object"]
+# The object sets below are queried from the object catalog when they are first accessed
+# (e.g. CONSTANTS.CHAIRS), so that importing this module does not require parsing the object file.
+OBJECT_SETS = {
+    # Robots etc.
+    "SUCTION_GRIPPER": lambda: CATALOG.get_by_names(["suction_gripper"]),
+    # Meta-Subsets
+    "YCB_OBJECTS": lambda: CATALOG.get_by_category("ycb"),
+    "OTHER_OBJECTS": lambda: CATALOG.query(exclude_tags=["ycb"]),
+    "BOWLING_BALL": lambda: CATALOG.get_by_names(["bowling_ball"]),
+    "WOOD_BLOCK": lambda: CATALOG.get_by_names(["036_wood_block"]),
+    "WOODEN_BOX": lambda: CATALOG.get_by_names(["wooden_box"]),
+    "CAMERA_OBJ": lambda: CATALOG.get_by_names(["camera_object"]),
+    "DUMMY_CAMERA_OBJ": lambda: CATALOG.get_by_names(["dummy_camera_object"]),
+    # Decoration Objects
+    "CHAIRS": lambda: CATALOG.query(tags=["chair"]),
+    "CUPBOARDS": lambda: CATALOG.query(tags=["cupboard"]),
+    "TABLES": lambda: CATALOG.query(tags=["table"]),
+    "NO_POOL_TABLES": lambda: [obj for obj in CATALOG.query(tags=["table"]) if obj.name != "pool_table"],
+    "BOWLS": lambda: CATALOG.query(tags=["bowl"], exclude_tags=["ycb"]),
+    "BALL_BOXES": lambda: CATALOG.get_by_names(["laundry_basket"]),  # , "wooden_box"]),
+    "FURNITURES": lambda: CATALOG.query(category="furniture", exclude_tags=["table", "chair"]),
+    # Surfaces and Rooms
+    "FLOORS": lambda: CATALOG.get_by_category("floor"),
+    "FLOOR_NAMES": lambda: [os.path.basename(obj.mesh_fp) for obj in CATALOG.get_by_category("floor")],
+    "WALLS": lambda: CATALOG.get_by_category("wall"),
+    "ROOMS": lambda: CATALOG.get_by_category("room"),
+    # other collections
+    "YCBV_OBJECTS": lambda: CATALOG.get_by_prefixes(YCBV_OBJS),  # Only the YCB-Video subset of objects
+    "STACK_OBJECTS": lambda: CATALOG.get_by_prefixes(FLAT_OBJS),  # Only a subset of 'stackable' objects
+    "BILLIARDS_OBJECTS": lambda: CATALOG.get_by_prefixes(FLAT_OBJS),  # Objects with flat surfaces (do not roll)
+    "DICE_OBJECTS": lambda: CATALOG.get_by_prefixes(DICE_OBJS),  # Objects that do roll, e.g. small regular shapes
+    "FRUIT_OBJECTS": lambda: CATALOG.get_by_prefixes(FRUIT_OBJS),
+    "YCB_SMALL_BALLS": lambda: CATALOG.get_by_prefixes(YCB_SMALL_BALL_OBJS),
+}
 
-# Decoration Objects
-CHAIRS = [obj for obj in OBJECT_INFO if obj.name.endswith("_chair")]
-CUPBOARDS = [obj for obj in OBJECT_INFO if obj.name.endswith("_cupboard")]
-TABLES = [obj for obj in OBJECT_INFO if obj.name.endswith("_table")]
-NO_POOL_TABLES = [obj for obj in OBJECT_INFO if obj.name.endswith("_table") and not obj.name.endswith("pool_table")]
-BOWLS = [obj for obj in OBJECT_INFO if obj.name.endswith("_bowl") and obj.name != "024_bowl"]
-BALL_BOXES = [obj for obj in OBJECT_INFO if obj.name in ["laundry_basket"]]  #, "wooden_box"]]
-FURNITURES = [obj for obj in OBJECT_INFO if "furniture/" in obj.mesh_fp and
-                                            "table" not in obj.name and
-                                            "chair" not in obj.name]
-# FURNITURES = [obj for obj in OBJECT_INFO if "furniture/" in obj.mesh_fp and obj.name == "kitchen_wood_m"]
+# for accessing: a random element of the given object set, re-randomized by utils.randomize()
+RANDOM_OBJECTS = {
+    "TABLE": "TABLES",
+    "NO_POOL_TABLE": "NO_POOL_TABLES",
+    "BOWL": "BOWLS",
+    "BALL_BOX": "BALL_BOXES",
+    "ROOM": "ROOMS",
+    "FLOOR": "FLOORS",
+    "WALL": "WALLS",
+    "FURNITURE": "FURNITURES",
+}
 
-# Surfaces and Rooms
-FLOORS = [obj for obj in OBJECT_INFO if obj.name.endswith("_floor")]
-# FLOORS = [obj for obj in OBJECT_INFO if obj.name.endswith("_floor") and "carpet" in obj.name]
-FLOOR_NAMES = [os.path.basename(obj.mesh_fp) for obj in OBJECT_INFO if obj.name.endswith("_floor")]
-WALLS = [obj for obj in OBJECT_INFO if obj.name.endswith("_wall")]
-# WALLS = [obj for obj in OBJECT_INFO if obj.name.endswith("_wall") and "black_tiling" in obj.name]
-ROOMS = [obj for obj in OBJECT_INFO if "complete_rooms" in obj.mesh_fp]
 
-# for accessing
-TABLE = [random.choice(TABLES)]
-NO_POOL_TABLE = [random.choice(NO_POOL_TABLES)]
-BOWL = [random.choice(BOWLS)]
-BALL_BOX = [random.choice(BALL_BOXES)]
-ROOM = [random.choice(ROOMS)]
-FLOOR = [random.choice(FLOORS)]
-WALL = [random.choice(WALLS)]
-FURNITURE = [random.choice(FURNITURES)]
-
-# other collections
-YCBV_OBJECTS = [  # Only considering the YCB-Video subset of objects
-    obj for obj in OBJECT_INFO if obj.name.split("_")[0] in YCBV_OBJS
-]
-STACK_OBJECTS = [  # Only considering a subset of 'stackable' objects
-    obj for obj in OBJECT_INFO if obj.name.split("_")[0] in FLAT_OBJS
-]
-BILLIARDS_OBJECTS = [  # Considering objects that do not roll, e.g. only objects with flat surfaces
-    obj for obj in OBJECT_INFO if obj.name.split("_")[0] in FLAT_OBJS
-]
-DICE_OBJECTS = [  # Considering objects that do roll, e.g. small and regular shapes
-    obj for obj in OBJECT_INFO if obj.name.split("_")[0] in DICE_OBJS
-]
-FRUIT_OBJECTS = [  # Considering fruits
-    obj for obj in OBJECT_INFO if obj.name.split("_")[0] in FRUIT_OBJS
-]
-YCB_SMALL_BALLS = [  # Small YCB balls
-    obj for obj in OBJECT_INFO if obj.name.split("_")[0] in YCB_SMALL_BALL_OBJS
-]
+def __getattr__(name):
+    if name in OBJECT_SETS:
+        value = OBJECT_SETS[name]()
+    elif name in RANDOM_OBJECTS:
+        source = RANDOM_OBJECTS[name]
+        value = [random.choice(globals()[source] if source in globals() else __getattr__(source))]
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value  # cache, so that later accesses are plain attribute lookups
+    return value
 
 """
 Scenario parameter defaults:
@@ -180,7 +177,7 @@ SCENARIO_DEFAULTS = {
         "prob_assembled": 0.0
     },
     "decorator": {
-        "decorations": CHAIRS,
+        "decorations": ["chair"],  # tags of the catalog objects used for decoration
         "min_objs": 2,
         "max_objs": 5,
         "bounds": {
@@ -192,6 +189,14 @@ SCENARIO_DEFAULTS = {
             "dist": 0.0   # minimum distance between objects
         }
     },
+    "watchdog": {
+        "margin": 0.5,  # tolerance (in meters) around the decorator bounds before an object counts as out of the room
+        "z_min": -0.2,  # objects below this height have fallen through the floor
+        "z_max": 6.0,
+        "max_lin_velocity": 25.0,  # in m/s
+        "max_ang_velocity": 250.0,  # in rad/s
+        "table_margin": 0.02,  # objects that were on the table and are now this far below its top have tunneled
+    },
     "camera_movement": {
         "delta_elev": {
             "min": [-5, -10, -30],
@@ -0,0 +1,163 @@
+"""
+In-memory streaming dataset: simulates and renders episodes on the fly and yields the frames as dicts of tensors,
+without writing them to disk. Usable with a PyTorch DataLoader, e.g.:
+
+    from main import get_parser, prepare_cfg
+    from sl_cutscenes.dataset import SimulatedFramesDataset
+
+    cfg = prepare_cfg(get_parser().parse_args(["--frames", "30", "--no-cuda"]))
+    dataset = SimulatedFramesDataset(cfg, scenario_ids=["bowl", "stack"], num_episodes=1000, seed=0)
+    loader = torch.utils.data.DataLoader(dataset, batch_size=None, num_workers=4)
+
+Episodes are sharded over the DataLoader workers (and optionally over distributed ranks), and every episode is
+simulated with its own seed derived from the base seed and the episode index, so the stream is reproducible
+and no two workers simulate the same episode.
+"""
+import random
+from contextlib import nullcontext
+
+import numpy as np
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+
+from sl_cutscenes.output import BOPWriter
+from sl_cutscenes.watchdog import EpisodeWatchdog, EpisodeAbortedError
+
+_RENDERER = None  # one render pass per (worker) process
+
+
+def get_renderer(cfg):
+    global _RENDERER
+    if _RENDERER is None:
+        from sl_cutscenes.generation import init_renderer
+        _RENDERER = init_renderer(cfg)
+    return _RENDERER
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+    torch.manual_seed(seed)
+
+
+def boxes_from_masks(masks):
+    """
+    Bounding boxes (x, y, w, h) of a stack of masks (N x H x W), computed for all masks at once.
+    Empty masks get the box (0, 0, 0, 0), as in scene_gt_info.json.
+    """
+    if masks.shape[0] == 0:
+        return torch.zeros((0, 4), dtype=torch.long)
+    cols, rows = masks.any(dim=1), masks.any(dim=2)  # N x W, N x H
+    W, H = cols.shape[1], rows.shape[1]
+    x1 = cols.int().argmax(dim=1)
+    x2 = W - cols.flip(dims=[1]).int().argmax(dim=1)
+    y1 = rows.int().argmax(dim=1)
+    y2 = H - rows.flip(dims=[1]).int().argmax(dim=1)
+    boxes = torch.stack([x1, y1, x2 - x1, y2 - y1], dim=1).long()
+    boxes[~cols.any(dim=1)] = 0
+    return boxes
+
+
+def frame_to_tensors(scenario, result, amodal_renderer=None):
+    """
+    Converts a render result of a scenario into a dict of CPU tensors:
+     - 'rgb': H x W x 3 uint8, 'depth': H x W float32 (meters)
+     - 'instance_index', 'class_index': H x W int32 index masks of the annotated (dynamic) objects
+     - 'masks': N x H x W bool visible masks, 'boxes': N x 4 visible bounding boxes (x, y, w, h)
+     - 'amodal_masks': N x H x W bool silhouettes (only if an amodal_renderer is given)
+     - 'instance_ids', 'class_ids': N, 'poses': N x 4 x 4 object-to-camera poses (meters)
+     - 'cam_K': 3 x 3 intrinsics, 'cam_pose': 4 x 4 camera-to-world pose
+    """
+    scene = scenario.scene
+    objects = [obj for obj in scenario.dynamic_objects if hasattr(obj, "instance_index")]
+    instance_segmentation = (result.instance_index()[:,:,0].int() & 0xFFFF).cpu()
+    class_index, instance_index = BOPWriter.index_masks(instance_segmentation, objects)
+    instance_ids = torch.tensor([obj.instance_index for obj in objects], dtype=torch.int32)
+    masks = instance_segmentation[None] == instance_ids[:, None, None]
+
+    W, H = scene.viewport
+    cam_pose = scene.camera_pose().cpu()
+    world_in_camera = torch.inverse(cam_pose)
+    poses = torch.stack([world_in_camera @ obj.pose().cpu() for obj in objects]) if objects \
+        else torch.zeros((0, 4, 4))
+
+    frame = {
+        "rgb": result.rgb()[:,:,:3].cpu().contiguous(),
+        "depth": result.depth().float().cpu(),
+        "instance_index": instance_index,
+        "class_index": class_index,
+        "masks": masks,
+        "boxes": boxes_from_masks(masks),
+        "instance_ids": instance_ids,
+        "class_ids": torch.tensor([obj.mesh.class_index for obj in objects], dtype=torch.int32),
+        "poses": poses,
+        "cam_K": BOPWriter.intrinsicMatrixFromProjection(scene.projection_matrix(), W, H),
+        "cam_pose": cam_pose,
+    }
+    if amodal_renderer is not None:
+        frame["amodal_masks"] = torch.stack([
+            (amodal_renderer.render(scene, predicate=lambda o: o == obj).class_index()[:,:,0] != 0).cpu()
+            for obj in objects
+        ]) if objects else torch.zeros((0, H, W), dtype=torch.bool)
+    return frame
+
+
+class SimulatedFramesDataset(IterableDataset):
+    """
+    Streams freshly simulated and rendered frames of the given scenarios.
+    """
+    def __init__(self, cfg, scenario_ids, num_episodes=None, seed=0, amodal_masks=False, rank=0, world_size=1):
+        """
+        :param cfg: Generation configuration as created by main.py's get_parser() and prepare_cfg()
+        :param scenario_ids: Scenarios to simulate, in turns
+        :param num_episodes: Total number of episodes over all workers and ranks. None streams forever.
+        :param amodal_masks: If True, each object is rendered alone to add its silhouette ('amodal_masks').
+        :param rank, world_size: Shard of this process in distributed training.
+        """
+        super().__init__()
+        self.cfg = cfg
+        self.scenario_ids = list(scenario_ids)
+        self.num_episodes = num_episodes
+        self.seed = seed
+        self.amodal_masks = amodal_masks
+        self.rank = rank
+        self.world_size = world_size
+
+    def episode_indices(self):
+        """ The episode indices of the calling worker """
+        worker_info = get_worker_info()
+        num_workers, worker_id = (1, 0) if worker_info is None else (worker_info.num_workers, worker_info.id)
+        shard, num_shards = self.rank * num_workers + worker_id, self.world_size * num_workers
+        episode = shard
+        while self.num_episodes is None or episode < self.num_episodes:
+            yield episode
+            episode += num_shards
+
+    def __iter__(self):
+        from sl_cutscenes.backends import sl
+        from sl_cutscenes.generation import init_populate_scene, render_frames
+
+        renderer = get_renderer(self.cfg)
+        amodal_renderer = None
+        if self.amodal_masks:
+            amodal_renderer = sl.RenderPass('flat')
+            amodal_renderer.ssao_enabled = False
+
+        for episode in self.episode_indices():
+            seed_everything(self.seed + episode)
+            scenario_id = self.scenario_ids[episode % len(self.scenario_ids)]
+            res = init_populate_scene(self.cfg, scenario_id=scenario_id)
+            if not res["render"]:
+                continue
+            scenario = res["scenario"]
+            watchdog = None if self.cfg.no_watchdog else EpisodeWatchdog(timeout=self.cfg.episode_timeout)
+            try:
+                for frame, _, cam, stereo_pos, result in render_frames(self.cfg, renderer, scenario, watchdog):
+                    sample = frame_to_tensors(scenario, result, amodal_renderer)
+                    sample.update({"scenario": scenario.name, "episode": episode, "frame": frame,
+                                   "camera": cam.get_posed_name(stereo_pos)})
+                    # the consumer's time (e.g. a training step) does not count against the episode's time budget
+                    with watchdog.paused() if watchdog is not None else nullcontext():
+                        yield sample
+            except EpisodeAbortedError as e:
+                print(f"episode {episode}, scenario '{scenario.name}': {e}")  # the remaining frames are skipped
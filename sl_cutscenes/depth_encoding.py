@@ -0,0 +1,96 @@
+"""
+Encoding of rendered depth maps (in meters) for storage.
+
+ - 'uint16':  16-bit PNG, pixel = depth [m] * scale. With the default scale of 10000 (0.1 mm units, as before)
+              depths up to 6.55 m are representable; lower scales trade precision for range
+              (e.g. 1000 -> 1 mm units up to 65.5 m). Depths beyond the range are clipped to the maximum value.
+ - 'float16': meters as half floats (~1 mm precision at 2 m, ~4 mm at 6 m), compressed .npz file.
+ - 'float32': meters as floats, compressed .npz file.
+In scene_camera.json, 'depth_scale' (as in the BOP format) converts the stored values to millimeters and
+'depth_format' names the encoding.
+"""
+import numpy as np
+import torch
+
+DEPTH_FORMATS = ["uint16", "float16", "float32"]
+DEFAULT_DEPTH_SCALE = 10000.0  # uint16 pixel per meter
+UINT16_MAX = 65535
+
+
+def as_png16(pixels : torch.Tensor) -> torch.Tensor:
+    """
+    Clamps integer pixel values to the uint16 range and returns them as int16 tensor with the same bit pattern,
+    since int16 is the 16-bit integer type torch and the image savers support: it is written to 16-bit PNGs unchanged.
+    """
+    pixels = pixels.int().clamp_(0, UINT16_MAX)
+    return torch.where(pixels > 32767, pixels - 65536, pixels).short()
+
+
+class DepthEncoder(object):
+    """
+    Converts rendered depth maps into the configured storage format.
+    """
+    def __init__(self, depth_format="uint16", scale=DEFAULT_DEPTH_SCALE):
+        if depth_format not in DEPTH_FORMATS:
+            raise ValueError(f"unknown depth format '{depth_format}', choose one of {DEPTH_FORMATS}")
+        self.depth_format = depth_format
+        self.scale = scale if depth_format == "uint16" else 1.0  # float formats store meters
+
+    def extension(self, saver=None):
+        """ :param saver: The image sink uint16 depth maps are saved with (PNG if not given) """
+        if self.depth_format != "uint16":
+            return ".npz"
+        return ".png" if saver is None else saver.extension
+
+    @property
+    def bop_depth_scale(self):
+        """ Factor converting a stored value into millimeters """
+        return 1000.0 / self.scale
+
+    @property
+    def max_depth(self):
+        """ Largest representable depth in meters """
+        return UINT16_MAX / self.scale if self.depth_format == "uint16" else float("inf")
+
+    def encode(self, depth : torch.Tensor) -> torch.Tensor:
+        """
+        Encodes a depth map (HxW, in meters) on its device and returns it on the CPU.
+        uint16 values are returned as int16 tensors with the same bit pattern (see as_png16()).
+        """
+        if self.depth_format == "uint16":
+            return as_png16((depth * self.scale).round_()).cpu().contiguous()
+        dtype = torch.float16 if self.depth_format == "float16" else torch.float32
+        return depth.to(dtype).cpu().contiguous()
+
+    def to_numpy(self, encoded : torch.Tensor) -> np.ndarray:
+        """ The encoded depth map as numpy array of the storage dtype """
+        encoded = encoded.numpy()
+        return encoded.view(np.uint16) if self.depth_format == "uint16" else encoded
+
+    def save(self, saver, encoded : torch.Tensor, fp_stem : str):
+        """ Saves an encoded depth map to 'fp_stem' + extension, uint16 depth maps with the given image sink """
+        if self.depth_format == "uint16":
+            saver.save(encoded, fp_stem + self.extension(saver))
+        else:
+            np.savez_compressed(fp_stem + self.extension(), depth=encoded.numpy())
+
+    def decode(self, stored : np.ndarray) -> np.ndarray:
+        """ :return: Depth in meters of a stored (e.g. loaded from PNG or .npz) depth map """
+        return stored.astype(np.float32) / self.scale
+
+
+def load_depth(fp, depth_scale=None):
+    """
+    Loads a stored depth map in meters.
+    :param depth_scale: The 'depth_scale' entry of scene_camera.json (millimeters per stored unit).
+        Defaults to the scale of the default uint16 encoding.
+    """
+    fp = str(fp)
+    if fp.endswith(".npz"):
+        return np.load(fp)["depth"].astype(np.float32)
+    if fp.endswith(".npy"):  # uint16 depth written with the 'raw' image codec
+        depth_scale = 1000.0 / DEFAULT_DEPTH_SCALE if depth_scale is None else depth_scale
+        return np.load(fp).astype(np.float32) * depth_scale / 1000.0
+    from PIL import Image
+    depth_scale = 1000.0 / DEFAULT_DEPTH_SCALE if depth_scale is None else depth_scale
+    return np.asarray(Image.open(fp), dtype=np.float32) * depth_scale / 1000.0
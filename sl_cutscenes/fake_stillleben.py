@@ -0,0 +1,517 @@
+"""
+CPU-only stand-in for the parts of the stillleben API that are used by this package.
+
+It allows running the whole generation pipeline (scene population, simulation, rendering and writing)
+on machines without a render context or without the object assets, e.g. for tests and for profiling the
+Python-side hot paths. Everything is approximated by axis-aligned bounding boxes:
+    - Meshes are boxes whose sizes are derived from the object catalog, no mesh file is read.
+    - Collisions are computed analytically between the world-space AABBs of the objects. Static containers
+      (bowls, baskets, boxes, rooms) hold the objects inside of them instead of pushing them out.
+    - Physics is a semi-implicit Euler integrator with gravity, restitution and friction.
+    - Rendering draws the projected boxes into a z-buffer and returns RGB, depth, class and instance index
+      buffers with the shapes and dtypes of the real renderer.
+
+Use it through the backend switch instead of importing it directly:
+
+    from sl_cutscenes import backends
+    backends.use_fake_stillleben()  # before the first access to 'backends.sl'
+"""
+import enum
+import itertools
+import json
+import math
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+from sl_cutscenes.object_info import CATALOG
+
+GRAVITY = torch.tensor([0.0, 0.0, -9.81])
+NUM_LIGHTS = 4
+CONTACT_TOLERANCE = 1e-3  # penetrations below this depth [m] count as resting contact
+ANGULAR_DAMPING = 0.9  # angular velocity is multiplied with this factor on every contact
+DEFAULT_HFOV = 60.0  # [deg]
+NEAR, FAR = 0.01, 100.0
+
+# (tag, metric size [m] of the box, is container), matched in order against the tags of the catalog objects
+SHAPES = [
+    ("floor", (6.0, 6.0, 0.02), False),
+    ("wall", (6.0, 0.1, 3.0), False),
+    ("room", (8.0, 8.0, 3.0), True),
+    ("ycb", (0.08, 0.08, 0.08), False),
+    ("table", (1.6, 1.0, 0.75), False),
+    ("chair", (0.5, 0.5, 0.9), False),
+    ("bowl", (0.3, 0.3, 0.1), True),
+    ("basket", (0.6, 0.4, 0.3), True),
+    ("box", (0.5, 0.5, 0.3), True),
+    ("cart", (0.9, 0.5, 1.0), True),
+    ("ball", (0.15, 0.15, 0.15), False),
+    ("furniture", (0.9, 0.5, 1.0), False),
+]
+DEFAULT_SIZE = (0.2, 0.2, 0.2)
+
+_shape_lock = threading.Lock()
+_shapes_by_path = None
+
+
+def _lookup_shape(filename):
+    """ :return: The raw (i.e. not pre-transformed) box size and the container flag for the given mesh file """
+    global _shapes_by_path
+    with _shape_lock:
+        if _shapes_by_path is None:
+            from sl_cutscenes.utils.utils import get_absolute_mesh_path
+            infos_by_path = dict()
+            for info in CATALOG:
+                infos_by_path.setdefault(get_absolute_mesh_path(info), []).append(info)
+            _shapes_by_path = {path: _match_shape(infos) for path, infos in infos_by_path.items()}
+    size, scale, container = _shapes_by_path.get(filename, (DEFAULT_SIZE, 1.0, False))
+
+    # deterministic per-file variation so that e.g. different YCB objects have different sizes
+    digest = zlib.crc32(filename.encode()).to_bytes(4, "little")
+    jitter = [0.85 + 0.3 * b / 255 for b in digest[:3]]
+    return [s * j / scale for s, j in zip(size, jitter)], container
+
+
+def _match_shape(infos):
+    if any("complete_room" in info.mesh_fp for info in infos):
+        return SHAPES[2][1], infos[0].scale, True
+    for tag, size, container in SHAPES:
+        for info in infos:
+            if tag in CATALOG.get_tags(info):
+                return size, info.scale, container
+    return DEFAULT_SIZE, infos[0].scale, False
+
+
+def _rotation_from_vector(rotvec):
+    """ Rodrigues' formula """
+    angle = torch.linalg.norm(rotvec)
+    if angle < 1e-9:
+        return torch.eye(3)
+    k = rotvec / angle
+    K = torch.tensor([[0.0, -k[2], k[1]], [k[2], 0.0, -k[0]], [-k[1], k[0], 0.0]])
+    return torch.eye(3) + torch.sin(angle) * K + (1 - torch.cos(angle)) * K @ K
+
+
+def _color(key):
+    digest = zlib.crc32(str(key).encode()).to_bytes(4, "little")
+    return torch.tensor([64 + b // 2 for b in digest[:3]], dtype=torch.float32)
+
+
+def init():
+    pass
+
+
+def init_cuda():
+    pass
+
+
+def view(scene):
+    raise RuntimeError("The stand-in stillleben backend has no viewer")
+
+
+class BBox(object):
+    def __init__(self, min, max):
+        self.min = min
+        self.max = max
+
+    @property
+    def center(self):
+        return (self.min + self.max) / 2
+
+    @property
+    def size(self):
+        return self.max - self.min
+
+
+class Mesh(object):
+    """ Box-shaped stand-in for a mesh file """
+
+    class Flag(enum.IntFlag):
+        NONE = 0
+        PHYSICS_FORCE_CONVEX_HULL = 1
+
+    def __init__(self, filename, flags=Flag.NONE):
+        self.filename = str(filename)
+        self.flags = flags
+        self.class_index = 0
+        size, self.container = _lookup_shape(self.filename)
+        half_size = torch.tensor(size) / 2
+        self.raw_bbox = BBox(-half_size, half_size)
+        self.pretransform = torch.eye(4)
+
+    @staticmethod
+    def load_threaded(filenames, flags=None, device="cpu"):
+        flags = [Mesh.Flag.NONE] * len(filenames) if flags is None else flags
+        return [Mesh(filename, flag) for filename, flag in zip(filenames, flags)]
+
+    @property
+    def pretransform(self):
+        return self._pretransform.clone()
+
+    @pretransform.setter
+    def pretransform(self, pretransform):
+        self._pretransform = pretransform.float().clone()
+        corners = self._raw_corners() @ self._pretransform[:3, :3].T + self._pretransform[:3, 3]
+        self.bbox = BBox(corners.min(dim=0).values, corners.max(dim=0).values)
+        self.corners = corners  # box corners in object coordinates
+
+    def _raw_corners(self):
+        bounds = torch.stack([self.raw_bbox.min, self.raw_bbox.max])
+        return torch.stack([bounds[list(idx), [0, 1, 2]] for idx in itertools.product([0, 1], repeat=3)])
+
+    def dump_physics_meshes(self, path):
+        """ Writes the box as a single convex part (in raw mesh coordinates) """
+        vertices = self._raw_corners().tolist()
+        faces = [(1, 3, 4, 2), (5, 6, 8, 7), (1, 2, 6, 5), (3, 7, 8, 4), (1, 5, 7, 3), (2, 4, 8, 6)]
+        with open(f"{path}/part_000.obj", "w") as f:
+            f.writelines([f"v {x} {y} {z}\n" for x, y, z in vertices])
+            f.writelines([f"f {a} {b} {c} {d}\n" for a, b, c, d in faces])
+
+
+class Object(object):
+    def __init__(self, mesh):
+        self.mesh = mesh
+        self._pose = torch.eye(4)
+        self.linear_velocity = torch.zeros(3)
+        self.angular_velocity = torch.zeros(3)
+        self.static = False
+        self.kinematic = False  # moved from the outside only, e.g. the end effector of a ManipulationSim
+        self.instance_index = 0
+        size = mesh.bbox.size
+        self.mass = float(size.prod()) * 500.0
+        self.metallic = 0.0
+        self.roughness = 0.5
+        self.restitution = 0.5
+        self.static_friction = 0.5
+        self.dynamic_friction = 0.5
+        self.casts_shadows = True
+
+    def pose(self):
+        return self._pose.clone()
+
+    def set_pose(self, pose):
+        self._pose = pose.float().clone()
+
+    @property
+    def linear_velocity(self):
+        return self._linear_velocity.clone()
+
+    @linear_velocity.setter
+    def linear_velocity(self, velocity):
+        self._linear_velocity = torch.as_tensor(velocity, dtype=torch.float32).clone()
+
+    @property
+    def angular_velocity(self):
+        return self._angular_velocity.clone()
+
+    @angular_velocity.setter
+    def angular_velocity(self, velocity):
+        self._angular_velocity = torch.as_tensor(velocity, dtype=torch.float32).clone()
+
+    @property
+    def inertia(self):
+        """ Inertia tensor of a solid box """
+        sx, sy, sz = (self.mesh.bbox.size ** 2).tolist()
+        return torch.diag(torch.tensor([sy + sz, sx + sz, sx + sy])) * self.mass / 12.0
+
+    @property
+    def inertial_frame(self):
+        frame = torch.eye(4)
+        frame[:3, 3] = self.mesh.bbox.center
+        return frame
+
+    @property
+    def movable(self):
+        return not (self.static or self.kinematic)
+
+    def world_corners(self):
+        return self.mesh.corners @ self._pose[:3, :3].T + self._pose[:3, 3]
+
+
+class LightMap(object):
+    def __init__(self, path):
+        self.path = str(path)
+
+
+class Scene(object):
+    def __init__(self, viewport):
+        self.viewport = tuple(int(v) for v in viewport)
+        self._objects = []
+        self.ambient_light = torch.tensor([0.3, 0.3, 0.3])
+        self.light_map = None
+        self.light_directions = torch.zeros(NUM_LIGHTS, 3)
+        self.light_colors = torch.zeros(NUM_LIGHTS, 3)
+        self.manual_exposure = 1.0
+        self.background_color = torch.tensor([0.5, 0.5, 0.5, 1.0])
+        self._camera_pose = torch.eye(4)
+        self.set_camera_hfov(DEFAULT_HFOV * math.pi / 180.0)
+
+    @property
+    def objects(self):
+        return list(self._objects)
+
+    def add_object(self, obj):
+        if obj not in self._objects:
+            self._objects.append(obj)
+
+    def remove_object(self, obj):
+        if obj in self._objects:
+            self._objects.remove(obj)
+
+    # camera
+
+    def set_camera_hfov(self, hfov):
+        W, H = self.viewport
+        f = W / (2 * math.tan(hfov / 2))
+        self.set_camera_intrinsics(f, f, W / 2, H / 2)
+
+    def set_camera_intrinsics(self, fx, fy, cx, cy):
+        self._intrinsics = (float(fx), float(fy), float(cx), float(cy))
+
+    def set_camera_pose(self, pose):
+        self._camera_pose = pose.float().clone()
+
+    def camera_pose(self):
+        return self._camera_pose.clone()
+
+    def set_camera_look_at(self, position, look_at, up=(0.0, 0.0, 1.0)):
+        """ Camera convention as in stillleben: x right, y down, z looking towards 'look_at' """
+        position = torch.as_tensor(position, dtype=torch.float32)
+        z = torch.as_tensor(look_at, dtype=torch.float32) - position
+        z = z / torch.linalg.norm(z)
+        x = torch.linalg.cross(z, torch.as_tensor(up, dtype=torch.float32))
+        if torch.linalg.norm(x) < 1e-6:  # looking along the up vector
+            x = torch.linalg.cross(z, torch.tensor([0.0, 1.0, 0.0]))
+        x = x / torch.linalg.norm(x)
+        pose = torch.eye(4)
+        pose[:3, 0], pose[:3, 1], pose[:3, 2], pose[:3, 3] = x, torch.linalg.cross(z, x), z, position
+        self._camera_pose = pose
+
+    def projection_matrix(self):
+        """ Same layout as stillleben's: intrinsics can be recovered with BOPWriter.intrinsicMatrixFromProjection """
+        W, H = self.viewport
+        fx, fy, cx, cy = self._intrinsics
+        return torch.tensor([
+            [2 * fx / W, 0.0, 2 * cx / W - 1.0, 0.0],
+            [0.0, 2 * fy / H, 2 * cy / H - 1.0, 0.0],
+            [0.0, 0.0, (FAR + NEAR) / (FAR - NEAR), -2 * FAR * NEAR / (FAR - NEAR)],
+            [0.0, 0.0, 1.0, 0.0],
+        ])
+
+    # physics
+
+    def _world_aabbs(self, objects):
+        corners = torch.stack([obj.world_corners() for obj in objects])  # (N, 8, 3)
+        return corners.min(dim=1).values, corners.max(dim=1).values
+
+    def _contacts(self, i, objects, mins, maxs):
+        """
+        :return: A list of tuples (other object, contact normal pointing towards object i, penetration depth)
+        """
+        a_min, a_max = mins[i], maxs[i]
+        gaps = torch.maximum(mins - a_max, a_min - maxs)  # negative along all axes <=> overlap
+        overlapping = (gaps < 0).all(dim=1)
+        overlapping[i] = False
+        contacts = []
+        for j in overlapping.nonzero().flatten().tolist():
+            other = objects[j]
+            center = (a_min + a_max) / 2
+            if other.static and other.mesh.container and (mins[j, :2] <= center[:2]).all() \
+                    and (center[:2] <= maxs[j, :2]).all():
+                # inside of a container: only its floor and its side walls push back
+                inner_penetration = torch.cat([mins[j] - a_min, a_max[:2] - maxs[j, :2]])
+                for k in inner_penetration.nonzero().flatten().tolist():
+                    if inner_penetration[k] > 0:
+                        normal = torch.zeros(3)
+                        normal[k % 3] = 1.0 if k < 3 else -1.0
+                        contacts.append((other, normal, float(inner_penetration[k])))
+                continue
+            depth, axis = (-gaps[j]).min(dim=0)
+            normal = torch.zeros(3)
+            normal[axis] = 1.0 if center[axis] >= (mins[j, axis] + maxs[j, axis]) / 2 else -1.0
+            contacts.append((other, normal, float(depth)))
+        return contacts
+
+    def check_collisions(self):
+        """ Sets the 'separation' of all dynamic objects: the (negative) depth of their deepest penetration """
+        objects = self._objects
+        if not objects:
+            return
+        mins, maxs = self._world_aabbs(objects)
+        for i, obj in enumerate(objects):
+            if obj.static:
+                continue
+            depths = [depth for (_, _, depth) in self._contacts(i, objects, mins, maxs)]
+            depth = max(depths, default=0.0)
+            obj.separation = -depth if depth > CONTACT_TOLERANCE else 0.0
+
+    def simulate(self, dt):
+        objects = self._objects
+        movable = [i for i, obj in enumerate(objects) if obj.movable]
+        if not movable:
+            return
+
+        # semi-implicit Euler step
+        for i in movable:
+            obj = objects[i]
+            obj._linear_velocity += GRAVITY * dt
+            obj._pose[:3, 3] += obj._linear_velocity * dt
+            obj._pose[:3, :3] = _rotation_from_vector(obj._angular_velocity * dt) @ obj._pose[:3, :3]
+
+        # contact resolution: push objects out of each other, then reflect and dampen their velocities
+        mins, maxs = self._world_aabbs(objects)
+        for i in movable:
+            obj = objects[i]
+            for other, normal, depth in self._contacts(i, objects, mins, maxs):
+                share = 0.5 if other.movable else 1.0  # the other object resolves its half on its own
+                obj._pose[:3, 3] += normal * depth * share
+                v = obj._linear_velocity
+                v_n = torch.dot(v, normal)
+                if v_n < 0:
+                    restitution = min(obj.restitution, other.restitution)
+                    v = v - (1 + restitution) * v_n * normal
+                    v_t = v - torch.dot(v, normal) * normal
+                    v_t_norm = float(torch.linalg.norm(v_t))
+                    if v_t_norm > 0:
+                        friction = obj.dynamic_friction * float(-v_n) / v_t_norm
+                        v = v - v_t * min(1.0, friction)
+                    obj._linear_velocity = v
+                obj._angular_velocity *= ANGULAR_DAMPING
+
+    def serialize(self):
+        return json.dumps({
+            "viewport": list(self.viewport),
+            "camera_pose": self._camera_pose.flatten().tolist(),
+            "objects": [{"mesh": obj.mesh.filename, "class_index": obj.mesh.class_index,
+                         "instance_index": obj.instance_index, "static": obj.static,
+                         "pose": obj._pose.flatten().tolist()} for obj in self._objects],
+        })
+
+
+class ManipulationSim(object):
+    """ Moves the end effector kinematically to the commanded pose, the rest of the scene is simulated as usual """
+
+    def __init__(self, scene, ee, ee_pose):
+        self.scene = scene
+        self.ee = ee
+        self.ee.kinematic = True
+        self.ee.set_pose(ee_pose)
+
+    def set_spring_parameters(self, stiffness, damping, force_limit):
+        pass
+
+    def step(self, ee_pose, dt):
+        self.ee.set_pose(ee_pose)
+        self.scene.simulate(dt)
+
+
+class RenderPassResult(object):
+    def __init__(self, rgb, depth, class_index, instance_index):
+        self._rgb = rgb
+        self._depth = depth
+        self._class_index = class_index
+        self._instance_index = instance_index
+
+    def rgb(self):
+        """ [H, W, 4] byte tensor """
+        return self._rgb
+
+    def depth(self):
+        """ [H, W] float tensor, distance along the camera z axis in m, 0 for the background """
+        return self._depth
+
+    def class_index(self):
+        """ [H, W, 1] short tensor """
+        return self._class_index
+
+    def instance_index(self):
+        """ [H, W, 1] short tensor """
+        return self._instance_index
+
+
+class RenderPass(object):
+    """ Draws the projected bounding boxes of the objects into a z-buffer, one constant depth per object """
+
+    def __init__(self, shading="pbr"):
+        self.shading = shading
+        self.ssao_enabled = True
+
+    def render(self, scene, predicate=None):
+        W, H = scene.viewport
+        fx, fy, cx, cy = scene._intrinsics
+        world_to_cam = torch.inverse(scene._camera_pose)
+        cam_t = scene._camera_pose[:3, 3]
+
+        depth = torch.full((H, W), math.inf)
+        rgb = scene.background_color[:3].repeat(H, W, 1) * 255
+        class_index = torch.zeros(H, W, dtype=torch.int16)
+        instance_index = torch.zeros(H, W, dtype=torch.int16)
+        for obj in scene._objects:
+            if predicate is not None and not predicate(obj):
+                continue
+            corners = obj.world_corners()
+            if ((corners.min(dim=0).values <= cam_t) & (cam_t <= corners.max(dim=0).values)).all():
+                continue  # camera inside of the object (e.g. a room): seen from the inside, it is just background
+            corners = corners @ world_to_cam[:3, :3].T + world_to_cam[:3, 3]
+            corners = corners[corners[:, 2] > NEAR]
+            if len(corners) == 0:
+                continue  # behind the camera
+            u = corners[:, 0] / corners[:, 2] * fx + cx
+            v = corners[:, 1] / corners[:, 2] * fy + cy
+            u0, u1 = max(int(u.min()), 0), min(int(math.ceil(u.max())), W)
+            v0, v1 = max(int(v.min()), 0), min(int(math.ceil(v.max())), H)
+            if u0 >= u1 or v0 >= v1:
+                continue  # outside of the image
+            obj_depth = max(float(corners[:, 2].mean()), NEAR)
+
+            visible = depth[v0:v1, u0:u1] > obj_depth
+            depth[v0:v1, u0:u1][visible] = obj_depth
+            class_index[v0:v1, u0:u1][visible] = obj.mesh.class_index
+            instance_index[v0:v1, u0:u1][visible] = obj.instance_index
+            shade = 1.0 if self.shading == "flat" else min(1.0, 1.5 / (1.0 + 0.2 * obj_depth))
+            rgb[v0:v1, u0:u1][visible] = _color(obj.mesh.filename) * shade
+
+        depth[torch.isinf(depth)] = 0.0
+        alpha = torch.full((H, W, 1), 255, dtype=torch.uint8)
+        rgb = torch.cat([rgb.clamp(0, 255).byte(), alpha], dim=-1)
+        return RenderPassResult(rgb, depth, class_index.unsqueeze(-1), instance_index.unsqueeze(-1))
+
+
+class ImageSaver(object):
+    """ Writes images in background threads, like stillleben's ImageSaver """
+
+    def __init__(self, num_threads=4):
+        self.num_threads = num_threads
+        self.executor = None
+
+    def __enter__(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.num_threads)
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.executor.shutdown(wait=True)
+        self.executor = None
+
+    def save(self, tensor, filename):
+        image = tensor.detach().cpu().numpy().copy()
+        if self.executor is None:
+            ImageSaver._write(image, filename)
+        else:
+            self.executor.submit(ImageSaver._write, image, filename)
+
+    @staticmethod
+    def _write(image, filename):
+        from PIL import Image
+        if image.dtype in (np.int16, np.uint16, np.int32):
+            image = image.astype(np.uint16)  # 16 bit png, e.g. depth
+        elif image.dtype != np.uint8:
+            image = image.astype(np.uint8)
+        if image.ndim == 3 and image.shape[-1] == 1:
+            image = image[:, :, 0]
+        if filename.endswith(".jpg"):
+            Image.fromarray(image).save(filename, quality=95)
+        else:
+            Image.fromarray(image).save(filename)
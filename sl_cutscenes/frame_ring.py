@@ -0,0 +1,218 @@
+"""
+Shared-memory ring buffer for handing rendered frames to consumer processes (e.g. a trainer or a recorder)
+without pickling or copying them.
+
+The producer creates a ring of preallocated frame slots sized from the resolution and the maximum number of
+objects, and writes every frame into the next slot. Any number of local consumers can attach to the ring by
+its name and read the slots as numpy views of the shared memory. The producer never waits for consumers:
+a consumer that falls behind by more than the number of slots skips the overwritten frames. Every slot carries
+a sequence number that is odd while the slot is written, so consumers can verify that a frame they worked on
+has not been overwritten in the meantime (see FrameRingReader.is_valid()).
+
+    # producer (see main.py's '--frame-ring')
+    ring = FrameRing.create("sl_frames", resolution=(640, 480), max_objects=256, num_slots=16)
+    ring.write(rgb=..., depth=..., instance_index=..., class_index=..., ...)
+
+    # consumer
+    with FrameRing.attach("sl_frames") as ring:
+        reader = ring.reader()
+        while (frame := reader.next(timeout=5.0)) is not None:
+            train_step(torch.from_numpy(frame["rgb"]))  # zero-copy view of the slot
+"""
+import json
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+MAGIC = b"SLFR"
+HEADER_SIZE = 4096  # magic, layout length and JSON layout
+ALIGNMENT = 64
+HEAD, CLOSED = 0, 1  # indices into the control array, which is followed by the slot sequence numbers
+
+
+def slot_fields(width, height, max_objects):
+    """ :return: (name, dtype, shape) of the arrays of a frame slot """
+    return [
+        ("rgb", "u1", (height, width, 3)),
+        ("depth", "<f4", (height, width)),  # meters
+        ("instance_index", "<u2", (height, width)),
+        ("class_index", "<u2", (height, width)),
+        ("instance_ids", "<i4", (max_objects,)),
+        ("class_ids", "<i4", (max_objects,)),
+        ("poses", "<f4", (max_objects, 4, 4)),  # object-to-camera, meters
+        ("cam_K", "<f4", (3, 3)),
+        ("cam_pose", "<f4", (4, 4)),
+        ("meta", "<i8", (4,)),  # frame position in the ring, frame index of the episode, number of objects, writer id
+    ]
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _attach_shared_memory(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # python >= 3.13
+    except TypeError:
+        # don't let the resource tracker of a consumer unlink the producer's memory when the consumer exits
+        from multiprocessing import resource_tracker
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class FrameRing(object):
+    """
+    A ring of frame slots in shared memory. Use create() in the producer and attach() in consumers.
+    """
+    def __init__(self, shm, layout, owner):
+        self.shm = shm
+        self.layout = layout
+        self.owner = owner
+        self.num_slots = layout["num_slots"]
+        self.max_objects = layout["max_objects"]
+        self.control = np.ndarray((2 + self.num_slots,), dtype="<u8", buffer=shm.buf, offset=HEADER_SIZE)
+        self.seqs = self.control[2:]
+        self.slots = []
+        for i in range(self.num_slots):
+            offset = layout["slots_offset"] + i * layout["slot_size"]
+            self.slots.append({
+                name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset + field_offset)
+                for name, dtype, shape, field_offset in layout["fields"]
+            })
+
+    @classmethod
+    def create(cls, name, resolution, max_objects=256, num_slots=16):
+        width, height = resolution
+        fields, slot_size = [], 0
+        for field_name, dtype, shape in slot_fields(width, height, max_objects):
+            fields.append((field_name, dtype, shape, slot_size))
+            slot_size = _align(slot_size + int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        slots_offset = _align(HEADER_SIZE + 8 * (2 + num_slots))
+        layout = {"num_slots": num_slots, "max_objects": max_objects, "resolution": [width, height],
+                  "slot_size": slot_size, "slots_offset": slots_offset, "fields": fields}
+        layout_bytes = json.dumps(layout).encode()
+        if len(MAGIC) + 4 + len(layout_bytes) > HEADER_SIZE:
+            raise ValueError("frame ring layout does not fit into the header")
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=slots_offset + num_slots * slot_size)
+        shm.buf[:len(MAGIC)] = MAGIC
+        shm.buf[len(MAGIC):len(MAGIC) + 4] = len(layout_bytes).to_bytes(4, "little")
+        shm.buf[len(MAGIC) + 4:len(MAGIC) + 4 + len(layout_bytes)] = layout_bytes
+        ring = cls(shm, layout, owner=True)
+        ring.control[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        shm = _attach_shared_memory(name)
+        if bytes(shm.buf[:len(MAGIC)]) != MAGIC:
+            shm.close()
+            raise ValueError(f"shared memory '{name}' is not a frame ring")
+        layout_len = int.from_bytes(shm.buf[len(MAGIC):len(MAGIC) + 4], "little")
+        layout = json.loads(bytes(shm.buf[len(MAGIC) + 4:len(MAGIC) + 4 + layout_len]))
+        layout["fields"] = [(name, dtype, tuple(shape), offset) for name, dtype, shape, offset in layout["fields"]]
+        return cls(shm, layout, owner=False)
+
+    @property
+    def head(self):
+        """ Number of frames written so far """
+        return int(self.control[HEAD])
+
+    @property
+    def closed(self):
+        return bool(self.control[CLOSED])
+
+    def write(self, rgb, depth, instance_index, class_index, instance_ids, class_ids, poses, cam_K, cam_pose,
+              frame=0, writer_id=0):
+        """
+        Copies a frame into the next slot (producer only). Array arguments may be numpy arrays or CPU tensors.
+        Objects beyond max_objects are dropped from the pose table.
+        """
+        pos = self.head
+        slot_idx = pos % self.num_slots
+        slot = self.slots[slot_idx]
+        num_objects = min(len(instance_ids), self.max_objects)
+
+        self.seqs[slot_idx] = 2 * pos + 1  # odd: being written
+        slot["rgb"][:] = rgb
+        slot["depth"][:] = depth
+        slot["instance_index"][:] = instance_index
+        slot["class_index"][:] = class_index
+        slot["instance_ids"][:num_objects] = instance_ids[:num_objects]
+        slot["class_ids"][:num_objects] = class_ids[:num_objects]
+        slot["poses"][:num_objects] = poses[:num_objects]
+        slot["cam_K"][:] = cam_K
+        slot["cam_pose"][:] = cam_pose
+        slot["meta"][:] = (pos, frame, num_objects, writer_id)
+        self.seqs[slot_idx] = 2 * pos + 2  # even: complete
+        self.control[HEAD] = pos + 1
+
+    def reader(self, from_start=False):
+        """ :param from_start: Start at the oldest frame still in the ring instead of the next written frame """
+        return FrameRingReader(self, start=max(0, self.head - self.num_slots) if from_start else self.head)
+
+    def close(self):
+        """ Consumers need to drop all frame views of the ring before closing it """
+        if self.owner:
+            self.control[CLOSED] = 1
+        self.slots, self.control, self.seqs = [], None, None  # release the views before closing the memory
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+class FrameRingReader(object):
+    """ Reads the frames of a ring in order, skipping frames that have been overwritten before being read """
+    def __init__(self, ring, start):
+        self.ring = ring
+        self.pos = start
+        self.skipped = 0  # number of frames lost because this reader fell behind
+
+    def next(self, timeout=None, poll_interval=0.001):
+        """
+        :return: The next frame as dict of views into its slot (arrays of the pose table cut to the number of
+            objects, 'pos' is the frame's position in the ring), or None if the producer closed the ring
+            or the timeout (in s) passed without a new frame.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            head = self.ring.head
+            if head - self.pos > self.ring.num_slots:  # overwritten: skip to the oldest frame in the ring
+                self.skipped += head - self.ring.num_slots - self.pos
+                self.pos = head - self.ring.num_slots
+            if self.pos < head:
+                slot_idx = self.pos % self.ring.num_slots
+                if self.ring.seqs[slot_idx] == 2 * self.pos + 2:
+                    frame = self.view(slot_idx)
+                    self.pos += 1
+                    return frame
+                continue  # overwritten while checking
+            if self.ring.closed or (deadline is not None and time.time() > deadline):
+                return None
+            time.sleep(poll_interval)
+
+    def view(self, slot_idx):
+        slot = self.ring.slots[slot_idx]
+        num_objects = int(slot["meta"][2])
+        frame = dict(slot)
+        for name in ["instance_ids", "class_ids", "poses"]:
+            frame[name] = slot[name][:num_objects]
+        frame["pos"] = self.pos
+        frame["frame"] = int(slot["meta"][1])
+        frame["writer_id"] = int(slot["meta"][3])
+        return frame
+
+    def is_valid(self, frame):
+        """ :return: True if the slot of the given frame has not been (partially) overwritten since reading it """
+        return self.ring.seqs[frame["pos"] % self.ring.num_slots] == 2 * frame["pos"] + 2
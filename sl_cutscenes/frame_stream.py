@@ -0,0 +1,174 @@
+"""
+Lossless per-episode frame streams for depth and index masks.
+
+Instead of one PNG per frame, all frames of an episode are stored in a single file. Every frame is stored
+as the XOR delta to its predecessor (with a full keyframe every KEYFRAME_INTERVAL frames), compressed with
+zstd if the 'zstandard' package is installed and zlib otherwise. For static cameras, consecutive frames
+are nearly identical, so the deltas are almost all zeros and compress extremely well.
+
+File layout:
+    MAGIC | header length (u32) | JSON header (dtype, shape, codec, keyframe interval)
+    records: frame type (u8, 0: keyframe, 1: delta) | payload length (u32) | compressed payload
+    index:   record offsets (u64 each) | number of frames (u64) | INDEX_MAGIC
+The index is written when the stream is closed; streams without one (e.g. of a crashed run) are scanned.
+"""
+import json
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b"SLFS"
+INDEX_MAGIC = b"SLFI"
+VERSION = 1
+KEYFRAME_INTERVAL = 30
+KEYFRAME, DELTA = 0, 1
+RECORD_HEADER = struct.Struct("<BI")
+INDEX_FOOTER = struct.Struct("<Q4s")
+
+
+def _get_codec(name=None):
+    """ :return: the codec name and its (compress, decompress) functions """
+    if name in (None, "zstd"):
+        try:
+            import zstandard
+            compressor, decompressor = zstandard.ZstdCompressor(level=3), zstandard.ZstdDecompressor()
+            return "zstd", (compressor.compress, decompressor.decompress)
+        except ImportError:
+            if name == "zstd":
+                raise ImportError("This frame stream is zstd-compressed, which requires 'pip install zstandard'")
+    return "zlib", (lambda data: zlib.compress(data, 1), zlib.decompress)
+
+
+def _as_bits(frame):
+    """ Reinterprets a frame as unsigned integers of the same width, so that XOR deltas work for any dtype """
+    return frame.view(np.dtype(f"u{frame.dtype.itemsize}"))
+
+
+class FrameStreamWriter(object):
+    """
+    Appends frames of a fixed shape and dtype to a frame stream file.
+    """
+    def __init__(self, path, keyframe_interval=KEYFRAME_INTERVAL, codec=None):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.codec, (self.compress, _) = _get_codec(codec)
+        self.file = open(path, "wb")
+        self.offsets = []
+        self.prev = None  # bits of the previous frame
+        self.dtype, self.shape = None, None
+
+    def _write_header(self, frame):
+        self.dtype, self.shape = frame.dtype, frame.shape
+        header = json.dumps({"version": VERSION, "dtype": frame.dtype.str, "shape": list(frame.shape),
+                             "codec": self.codec, "keyframe_interval": self.keyframe_interval}).encode()
+        self.file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    def write(self, frame):
+        """ :param frame: Frame as numpy array or (CPU) torch tensor """
+        frame = np.ascontiguousarray(frame.numpy() if hasattr(frame, "numpy") else frame)
+        if self.dtype is None:
+            self._write_header(frame)
+        elif frame.dtype != self.dtype or frame.shape != self.shape:
+            raise ValueError(f"frame of {frame.dtype}{frame.shape} does not match stream of {self.dtype}{self.shape}")
+
+        bits = _as_bits(frame)
+        if len(self.offsets) % self.keyframe_interval == 0:
+            frame_type, payload = KEYFRAME, bits
+        else:
+            frame_type, payload = DELTA, np.bitwise_xor(bits, self.prev)
+        self.prev = bits.copy()
+        data = self.compress(payload.tobytes())
+        self.offsets.append(self.file.tell())
+        self.file.write(RECORD_HEADER.pack(frame_type, len(data)))
+        self.file.write(data)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.write(np.asarray(self.offsets, dtype="<u8").tobytes())
+        self.file.write(INDEX_FOOTER.pack(len(self.offsets), INDEX_MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+class FrameStreamReader(object):
+    """
+    Random access to the frames of a frame stream file: 'reader[i]' decodes frame i starting from the
+    preceding keyframe, and consecutive accesses reuse the last decoded frame.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a frame stream")
+        header_len, = struct.unpack("<I", self.file.read(4))
+        header = json.loads(self.file.read(header_len))
+        self.dtype, self.shape = np.dtype(header["dtype"]), tuple(header["shape"])
+        self.keyframe_interval = header["keyframe_interval"]
+        _, (_, self.decompress) = _get_codec(header["codec"])
+        self.offsets = self._read_index(data_start=self.file.tell())
+        self.cache = (None, None)  # (index, bits) of the last decoded frame
+
+    def _read_index(self, data_start):
+        self.file.seek(0, 2)
+        file_size = self.file.tell()
+        if file_size - data_start >= INDEX_FOOTER.size:
+            self.file.seek(file_size - INDEX_FOOTER.size)
+            num_frames, magic = INDEX_FOOTER.unpack(self.file.read(INDEX_FOOTER.size))
+            if magic == INDEX_MAGIC:
+                self.file.seek(file_size - INDEX_FOOTER.size - 8 * num_frames)
+                return np.frombuffer(self.file.read(8 * num_frames), dtype="<u8").tolist()
+
+        # no index: scan the records, ignoring a truncated last one
+        offsets, pos = [], data_start
+        while pos + RECORD_HEADER.size <= file_size:
+            self.file.seek(pos)
+            _, length = RECORD_HEADER.unpack(self.file.read(RECORD_HEADER.size))
+            if pos + RECORD_HEADER.size + length > file_size:
+                break
+            offsets.append(pos)
+            pos += RECORD_HEADER.size + length
+        return offsets
+
+    def _read_record(self, i):
+        self.file.seek(self.offsets[i])
+        frame_type, length = RECORD_HEADER.unpack(self.file.read(RECORD_HEADER.size))
+        bits = np.frombuffer(self.decompress(self.file.read(length)), dtype=_as_bits(np.empty(0, self.dtype)).dtype)
+        return frame_type, bits.reshape(self.shape)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"frame {i} out of range for a stream of {len(self)} frames")
+        cached_idx, bits = self.cache
+        start = i - i % self.keyframe_interval
+        if cached_idx is None or not start <= cached_idx <= i:
+            cached_idx, bits = start - 1, None
+        for j in range(cached_idx + 1, i + 1):
+            frame_type, record = self._read_record(j)
+            bits = record if frame_type == KEYFRAME else np.bitwise_xor(bits, record)
+        self.cache = (i, bits)
+        return bits.view(self.dtype).copy()
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
@@ -2,14 +2,26 @@
 Main logic for running the simulator and generating data.
 """
 import itertools
+import shutil
+import threading
 import time
 from pathlib import Path
 from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
 import tqdm
-import stillleben as sl
 
+from sl_cutscenes import backends
+from sl_cutscenes.backends import sl
+from sl_cutscenes import tracing
 from sl_cutscenes.scenarios import SCENARIOS
 from sl_cutscenes.output import BOPWriter
+from sl_cutscenes.depth_encoding import DepthEncoder
+from sl_cutscenes import image_codecs
+from sl_cutscenes.frame_ring import FrameRing
+from sl_cutscenes.resource_cache import RenderContextRequired
+from sl_cutscenes.stats import AnnotationStats, save_run_stats
+from sl_cutscenes.trajectory import TrajectoryRecorder
+from sl_cutscenes.watchdog import EpisodeWatchdog, EpisodeAbortedError
 
 
 def generate(cfg):
@@ -19,11 +31,11 @@ def generate(cfg):
     """
 
     # preparation
-    if cfg.no_cuda or cfg.viewer:
-        sl.init()
-    else:
-        sl.init_cuda()
-    renderer = sl.RenderPass()
+    renderer = init_renderer(cfg)
+    if cfg.trace:
+        tracing.enable()
+    if cfg.encode_threads is not None:
+        image_codecs.set_encode_threads(cfg.encode_threads)
 
     if cfg.scenario != "all" and cfg.viewer:  # load scenario and view
         res = init_populate_scene(cfg, scenario_id=cfg.scenario)
@@ -33,43 +45,206 @@ def generate(cfg):
         else:
             print("Number of trials exceeded. Scene could not be rendered....")
     else:  # set up scenarios and generate data
-        Path(cfg.out_path).mkdir(exist_ok=True, parents=True)
-        print(f"will generate {cfg.iterations} episodes per scenario")
-        scenario_ids = SCENARIOS.keys() if cfg.scenario == "all" else [cfg.scenario]
-        for it in range(cfg.iterations):
-            for scenario_id in scenario_ids:
-                if scenario_id in ["robopushing"] and cfg.physics_engine != "nimble":
-                    assert cfg.scenario == "all", "Robot scenarios require nimblephysics sim"
-                    continue
-                res = init_populate_scene(cfg, scenario_id=scenario_id)
-                if res["render"]:
-                    print(f"Scene successfully populated on iteration #{res['n_errors']}....")
-                    run_and_render_scenario(cfg, renderer, res["scenario"], it)
+        frame_ring = None
+        if cfg.frame_ring is not None:
+            frame_ring = FrameRing.create(cfg.frame_ring, cfg.resolution, max_objects=cfg.frame_ring_max_objects,
+                                          num_slots=cfg.frame_ring_slots)
+            print(f"writing frames into shared-memory ring '{cfg.frame_ring}' ({cfg.frame_ring_slots} slots)")
+        try:
+            generate_episodes(cfg, renderer, frame_ring)
+        finally:
+            if frame_ring is not None:
+                frame_ring.close()
+    return
+
+
+def generate_episodes(cfg, renderer, frame_ring=None):
+    """ Generates cfg.iterations episodes of the configured scenario(s) """
+    Path(cfg.out_path).mkdir(exist_ok=True, parents=True)
+    print(f"will generate {cfg.iterations} episodes per scenario")
+    scenario_ids = SCENARIOS.keys() if cfg.scenario == "all" else [cfg.scenario]
+    run_stats = dict()  # scenario name -> AnnotationStats of all completed episodes
+    episodes = []  # (iteration, scenario id) of all episodes to generate
+    for it in range(cfg.iterations):
+        for scenario_id in scenario_ids:
+            if scenario_id in ["robopushing"] and cfg.physics_engine != "nimble":
+                assert cfg.scenario == "all", "Robot scenarios require nimblephysics sim"
+                continue
+            episodes.append((it, scenario_id))
+
+    recycler = SceneRecycler(cfg, max_uses=cfg.recycle_scenes) if cfg.recycle_scenes > 0 else None
+    prefetcher = EpisodePrefetcher(cfg, recycler) if cfg.prefetch_episodes else None
+    try:
+        for i, (it, scenario_id) in enumerate(episodes):
+            for attempt in range(cfg.episode_retries + 1):
+                tracing.TRACER.reset()  # one trace file per episode
+                if prefetcher is not None and attempt == 0:
+                    res = prefetcher.get(scenario_id)
+                    if i + 1 < len(episodes):  # populate the next scene while this episode is rendered
+                        prefetcher.prefetch(episodes[i + 1][1])
                 else:
+                    res = init_populate_scene(cfg, scenario_id=scenario_id, recycler=recycler)
+                if not res["render"]:
+                    if recycler is not None:
+                        recycler.release(scenario_id, res["scenario"])
                     print(f"""Iteration {it}, Scene ID {scenario_id} :Number of trials exceeded.
                               Scene could not be rendered....""")
-    return
+                    break
+                print(f"Scene successfully populated on iteration #{res['n_errors']}....")
+                if cfg.fork_variants > 1:
+                    success = run_variants(cfg, renderer, res["scenario"], it, run_stats=run_stats,
+                                           frame_ring=frame_ring)
+                else:
+                    success = run_and_render_scenario(cfg, renderer, res["scenario"], it, run_stats=run_stats,
+                                                      frame_ring=frame_ring)
+                if recycler is not None:
+                    recycler.release(scenario_id, res["scenario"])
+                if cfg.trace:
+                    trace_fp = Path(cfg.out_path) / f"{it:06}_{res['scenario'].name}_trace_{attempt}.json"
+                    tracing.TRACER.save(trace_fp)
+                if success:
+                    if not cfg.no_gen and not cfg.record_trajectories:
+                        save_run_stats(Path(cfg.out_path) / "annotation_stats.json", run_stats)
+                    break
+                print(f"Iteration {it}, Scene ID {scenario_id}: episode discarded on attempt #{attempt + 1}....")
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+
+
+class EpisodePrefetcher(object):
+    """
+    Double-buffered episode setup: populates the scene of the next episode in a background thread while the
+    current episode is simulated and rendered. Render resources are cached process-wide (see resource_cache.py),
+    so once they have been loaded by earlier episodes, populating a scene does not need the render context.
+    If it does (e.g. a mesh that has not been used before), the scene is populated in the main thread instead.
+    The trace events of the background thread are kept aside and added to the trace of the episode they belong to
+    when it is started with get().
+    """
+    def __init__(self, cfg, recycler=None):
+        self.cfg = cfg
+        self.recycler = recycler
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="episode_prefetch")
+        self.pending = None  # (scenario id, future, trace events)
 
+    def populate(self, scenario_id, trace_events):
+        with tracing.TRACER.capture(trace_events):
+            return init_populate_scene(self.cfg, scenario_id, recycler=self.recycler)
 
-def init_populate_scene(cfg, scenario_id, N_TRIALS=3):
+    def prefetch(self, scenario_id):
+        trace_events = []
+        self.pending = (scenario_id, self.executor.submit(self.populate, scenario_id, trace_events), trace_events)
+
+    def get(self, scenario_id):
+        """
+        :return: The result of init_populate_scene() for the given scenario, prefetched if possible.
+            Call this after resetting the tracer for the new episode.
+        """
+        if self.pending is not None and self.pending[0] == scenario_id:
+            _, future, trace_events = self.pending
+            self.pending = None
+            try:
+                res = future.result()
+                tracing.counter("prefetched_episodes", hit=1)
+                return res
+            except RenderContextRequired:
+                tracing.counter("prefetched_episodes", hit=0)
+            finally:
+                tracing.TRACER.add_captured(trace_events)
+        return init_populate_scene(self.cfg, scenario_id=scenario_id, recycler=self.recycler)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def init_renderer(cfg):
+    """ Initializes the configured rendering backend and returns a render pass """
+    if cfg.fake_backend:
+        backends.use_fake_stillleben()
+    if cfg.no_cuda or cfg.viewer:
+        sl.init()
+    else:
+        sl.init_cuda()
+    return sl.RenderPass()
+
+
+@tracing.traced("init_populate_scene")
+def init_populate_scene(cfg, scenario_id, N_TRIALS=3, recycler=None):
     """
     Initializing a scene, populating it with objects, and making sure there are
     no object collisions
+    :param recycler: If given, a scene (and room) of a finished episode is reused if possible (see SceneRecycler)
     """
     is_there_collision = True
     n_errors = 0
     scene, scenario = None, None
     while is_there_collision and n_errors < N_TRIALS:
         n_errors += 1
-        scene = sl.Scene(cfg.resolution)
-        scenario = SCENARIOS[scenario_id](cfg, scene)
+        if recycler is not None:
+            scene, room = recycler.acquire(scenario_id, previous=scenario)
+        else:
+            scene, room = sl.Scene(cfg.resolution), None
+        scenario = SCENARIOS[scenario_id](cfg, scene, room=room)
         is_there_collision = scenario.is_there_collision()
     else:
         render = True if(n_errors < N_TRIALS) else False
+    tracing.counter("populate_trials", trials=n_errors)
 
     return {"render": render, "scene": scene, "scenario": scenario, "n_errors": n_errors}
 
 
+class SceneRecycler(object):
+    """
+    Reuses the scenes of finished episodes: instead of creating a new scene and building a new room for every
+    episode, all objects except the room (floor, walls, furniture) are removed from the scene of a previous episode
+    of the same scenario, and only the scenario objects, cameras, decorations and lighting are set up anew.
+    A room is kept for up to 'max_uses' episodes before it is re-randomized.
+    """
+    def __init__(self, cfg, max_uses):
+        self.cfg = cfg
+        self.max_uses = max_uses
+        self.released = dict()  # scenario id -> [(scene, room, uses)] of finished episodes
+        self.uses = dict()  # id(scene) -> number of episodes the scene's room has been used for
+        self.lock = threading.Lock()  # scenes may be acquired by the prefetch thread
+
+    def acquire(self, scenario_id, previous=None):
+        """
+        :param previous: A scenario populated by an unsuccessful trial of the same episode, its scene is reused.
+        :return: A scene and the room to reuse (None if the scene is new)
+        """
+        with tracing.span("acquire_scene"):
+            if previous is not None:
+                scene, room = previous.scene, previous.room_assembler
+            else:
+                with self.lock:
+                    candidates = self.released.get(scenario_id, [])
+                    scene, room = candidates.pop() if candidates else (None, None)
+                    if scene is not None:
+                        self.uses[id(scene)] += 1
+            if scene is None:
+                scene = sl.Scene(self.cfg.resolution)
+                with self.lock:
+                    self.uses[id(scene)] = 1
+                return scene, None
+            self.strip_scene(scene, room)
+            return scene, room
+
+    def release(self, scenario_id, scenario):
+        """ Makes the scene of a finished episode available to later episodes of the same scenario """
+        with self.lock:
+            uses = self.uses.pop(id(scenario.scene), self.max_uses)
+            if uses < self.max_uses:
+                self.uses[id(scenario.scene)] = uses
+                self.released.setdefault(scenario_id, []).append((scenario.scene, scenario.room_assembler))
+
+    @staticmethod
+    def strip_scene(scene, room):
+        """ Removes all objects but the room's from the scene, which also removes them from the physics scene """
+        for obj in list(scene.objects):
+            if obj not in room.objects:
+                scene.remove_object(obj)
+
+
 def view_scenario(cfg, renderer, scenario):
     scene = scenario.scene
     view_cam = scenario.cameras[0]
@@ -78,60 +253,157 @@ def view_scenario(cfg, renderer, scenario):
     sl.view(scene)
 
 
-def run_and_render_scenario(cfg, renderer, scenario, it):
+def simulate_frames(cfg, scenario, watchdog=None):
+    """
+    Simulates the scenario until cfg.frames frames are due. Yields a tuple (frame index, sim steps) whenever
+    a frame is due, and continues simulating when the generator is resumed.
+    :param watchdog: If given, checks the scenario before each frame and raises an EpisodeAbortedError.
+    """
+    sim_steps, frames = 0, 0
+    while frames < cfg.frames:
+        # after sim's prep period, a frame is due every SIM_STEPS_PER_FRAME sim steps
+        if sim_steps % cfg.sim_steps_per_frame == 0 and scenario.can_render():
+            if watchdog is not None:
+                watchdog.check(scenario)  # don't render frames of a broken episode
+            yield frames, sim_steps
+            frames += 1
+
+        # sim step
+        with tracing.span("simulate"):
+            scenario.simulate()
+        sim_steps += 1
+
+
+def render_frames(cfg, renderer, scenario, watchdog=None):
+    """
+    Simulates the scenario and renders cfg.frames frames from every camera (and stereo position).
+    Yields a tuple (frame index, sim steps, camera, stereo position, render result) per rendering;
+    the render result is only valid until the generator is resumed.
+    :param watchdog: If given, checks the scenario before rendering each frame and raises an EpisodeAbortedError.
+    """
+    for frame, sim_steps in simulate_frames(cfg, scenario, watchdog):
+        for cam in scenario.cameras:  # for every cam, there might exist multiple stereo positions
+            for cam_stereo_pos in cam.stereo_positions:  # set scene camera and render for each position
+                scenario.set_camera_look_at(pos=cam.get_pos(cam_stereo_pos),
+                                            lookat=cam.get_lookat(cam_stereo_pos))
+                with tracing.span("render", cam=cam.get_posed_name(cam_stereo_pos)):
+                    result = renderer.render(scenario.scene)
+                yield frame, sim_steps, cam, cam_stereo_pos, result
+            cam.step()  # advance camera for next step if it's a moving one
+
+
+@tracing.traced("record_trajectory")
+def record_trajectory(cfg, scenario, episode_name, watchdog=None):
+    """
+    Simulates the scenario without rendering and saves the object poses and camera positions of all frames
+    to '<episode_name>.traj.npz' (see trajectory.py), to be rendered later by replay.py.
+    :return: True if the episode has been completed, False if it has been aborted by the watchdog.
+    """
+    recorder = TrajectoryRecorder(scenario, sim_fps=cfg.sim_fps)
+    pbar = tqdm.tqdm(total=cfg.frames)
+    try:
+        for frame, sim_steps in simulate_frames(cfg, scenario, watchdog):
+            recorder.record()
+            for cam in scenario.cameras:
+                cam.step()
+            pbar.update(1)
+            pbar.set_postfix(sim_steps=sim_steps)
+    except EpisodeAbortedError as e:
+        print(f"episode '{episode_name}': {e}")
+        return False
+    finally:
+        pbar.close()
+    with tracing.span("save_trajectory"):
+        recorder.save(Path(cfg.out_path) / f"{episode_name}.traj.npz")
+    return True
+
+
+def run_variants(cfg, renderer, scenario, it, run_stats=None, frame_ring=None):
+    """
+    Simulates the preparation phase of the scenario once and forks cfg.fork_variants episodes from the settled
+    state. Before each further variant, the settled state is restored and the cameras and/or the lighting are
+    re-sampled (cfg.fork_reroll). Random events after the preparation phase (e.g. the gripper's waypoints or the
+    bowling ball's velocity) are drawn anew for every variant anyway.
+    :return: True if at least one variant has been completed. Discarded variants are not re-generated.
+    """
+    scenario.settle()
+    snapshot = scenario.snapshot()
+    completed = 0
+    for variant in range(cfg.fork_variants):
+        if variant > 0:
+            scenario.restore(snapshot)
+            if "cameras" in cfg.fork_reroll:
+                scenario.reroll_cameras()
+            if "lighting" in cfg.fork_reroll:
+                scenario.setup_lighting()
+        completed += run_and_render_scenario(cfg, renderer, scenario, it, run_stats=run_stats,
+                                             frame_ring=frame_ring, variant=variant)
+    return completed > 0
+
+
+@tracing.traced("run_and_render_scenario")
+def run_and_render_scenario(cfg, renderer, scenario, it, run_stats=None, frame_ring=None, variant=None):
     """
     The actual scenario simulation and rendering happens in this method.
+    :param run_stats: If given, a dict (scenario name -> AnnotationStats) into which the annotation stats
+        of the completed episode are merged.
+    :param frame_ring: If given, a FrameRing into which the writers additionally copy every frame.
+    :param variant: Index of the variant of a forked episode (see run_variants()), which is added to the output paths.
+    :return: True if the episode has been completed, False if it has been aborted by the watchdog and discarded.
     """
+    watchdog = None if cfg.no_watchdog else EpisodeWatchdog(timeout=cfg.episode_timeout)
+    episode_name = f"{it:06}_{scenario.name}" if variant is None else f"{it:06}_{scenario.name}_v{variant:02}"
+    if cfg.record_trajectories:
+        print(f"iteration {it}, scenario '{scenario.name}': recording a trajectory of {cfg.frames} frames")
+        return record_trajectory(cfg, scenario, episode_name, watchdog)
 
     # a list of tuples (camera, writers), where each 'writers' itself is a list of tuples (stereo_position, writer)
     writers_per_cam = [(cam, [
-        (stereo_pos, BOPWriter(Path(cfg.out_path) / f"{it:06}_{scenario.name}_{cam.get_posed_name(stereo_pos)}"))
-        for stereo_pos in cam.stereo_positions
-        ]) for cam in scenario.cameras
+        (stereo_pos, BOPWriter(Path(cfg.out_path) / f"{episode_name}_{cam.get_posed_name(stereo_pos)}",
+                               video_fps=cfg.sim_fps if cfg.assemble_rgb else None,
+                               write_rgb_images=not cfg.no_rgb_images, frame_streams=cfg.frame_streams,
+                               depth_encoder=DepthEncoder(cfg.depth_format, cfg.depth_scale),
+                               mask_pngs=cfg.mask_pngs, rgb_codec=cfg.rgb_codec,
+                               lossless_codec=cfg.lossless_codec, frame_ring=frame_ring,
+                               ring_writer_id=cam_idx * len(cam.stereo_positions) + pos_idx))
+        for pos_idx, stereo_pos in enumerate(cam.stereo_positions)
+        ]) for cam_idx, cam in enumerate(scenario.cameras)
     ]
     # if cam information is not needed, these are the writers in a plain list
     writers_list = [writer for (_, writer) in list(itertools.chain(*[writers for (cam, writers) in writers_per_cam]))]
     frame_str = "" if cfg.no_gen else f": generating {cfg.frames} frames for {len(writers_list)} individual cameras"
+    variant_str = "" if variant is None else f", variant {variant}"
     print(
-        f"iteration {it}, scenario '{scenario.name}'{frame_str}"
+        f"iteration {it}, scenario '{scenario.name}'{variant_str}{frame_str}"
     )
 
     with ExitStack() as stack:
         for writer in writers_list:
             stack.enter_context(writer)
 
-        sim_steps, written_frames = 0, 0
         pbar = tqdm.tqdm(total=cfg.frames)
+        writer_lookup = {(id(cam), stereo_pos): writer
+                         for cam, cam_writers in writers_per_cam for stereo_pos, writer in cam_writers}
 
         if cfg.serialize_scene:
             print("Serializing scene...")
             for writer in writers_list:
                 writer.serialize_scene(scenario.scene)
 
-        while written_frames < cfg.frames:
-            # after sim's prep period, save visualizations every SIM_STEPS_PER_FRAME sim steps
-            if sim_steps % cfg.sim_steps_per_frame == 0 and scenario.can_render():
-                for cam, cam_writers in writers_per_cam:  # for every cam, there might exist multiple writers (stereo)
-                    for cam_stereo_pos, writer in cam_writers:  # set scene camera and render for each posed writer
-                        scenario.set_camera_look_at(pos=cam.get_pos(cam_stereo_pos),
-                                                    lookat=cam.get_lookat(cam_stereo_pos))
-                        result = renderer.render(scenario.scene)
-                        if not cfg.no_gen:
-                            writer.write_frame(scenario, result)
-                    cam.step()  # advance camera for next step if it's a moving one
-                written_frames += 1
-                pbar.update(1)
-                pbar.set_postfix(sim_steps=sim_steps)
-
-            # sim step
-            scenario.simulate()
-            sim_steps += 1
-            # time.sleep(10)
+        aborted = None
+        try:
+            for frame, sim_steps, cam, cam_stereo_pos, result in render_frames(cfg, renderer, scenario, watchdog):
+                if not cfg.no_gen:
+                    writer_lookup[(id(cam), cam_stereo_pos)].write_frame(scenario, result)
+                if frame + 1 > pbar.n:
+                    pbar.update(1)
+                    pbar.set_postfix(sim_steps=sim_steps)
+        except EpisodeAbortedError as e:
+            aborted = e
         pbar.close()
 
-        if cfg.assemble_rgb and not cfg.no_gen:
-            for writer in writers_list:
-                writer.assemble_rgb_video(in_fps=cfg.sim_fps, out_fps=cfg.sim_fps)
+        if aborted is not None:
+            print(f"iteration {it}, scenario '{scenario.name}': {aborted}")
 
         if cfg.physics_engine == "nimble" and cfg.nimble_debug:
             import nimblephysics as nimble
@@ -141,3 +413,14 @@ def run_and_render_scenario(cfg, renderer, scenario, it):
             vis_secs = 60
             print(f"serving nimblephysics visualization for {vis_secs}s at port 8080")
             time.sleep(vis_secs)
+
+    # writers are closed at this point -> remove all output of a discarded episode
+    if aborted is not None:
+        for writer in writers_list:
+            shutil.rmtree(writer.path, ignore_errors=True)
+        return False
+    if run_stats is not None:
+        scenario_stats = run_stats.setdefault(scenario.name, AnnotationStats())
+        for writer in writers_list:
+            scenario_stats.merge(writer.stats)
+    return True
@@ -0,0 +1,192 @@
+"""
+Image encoding for the writers: interchangeable codecs and image sinks that encode and write in a shared,
+process-wide thread pool (instead of one saver with its own threads per writer).
+
+Codecs are specified as 'name' or 'name:param', e.g. 'png:1' (zlib level 1), 'jpeg:90' (quality 90), 'webp:80',
+'webp:lossless', 'qoi' or 'raw' (.npy files). See benchmarks/image_codecs.py to compare their encode
+throughput and file sizes.
+"""
+import io
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+MAX_PENDING = 64  # images per sink that may wait for encoding before save() blocks
+
+
+def to_numpy(image):
+    """
+    Converts an image (torch tensor or numpy array, HxW, HxWx1 or HxWxC) to a numpy array for encoding.
+    int16 images hold uint16 values (see depth_encoding.as_png16()) and are reinterpreted as such.
+    """
+    image = image.detach().cpu().numpy() if hasattr(image, "detach") else np.asarray(image)
+    if image.ndim == 3 and image.shape[-1] == 1:
+        image = image[:, :, 0]
+    if image.dtype == np.int16:
+        image = image.view(np.uint16)
+    return np.ascontiguousarray(image)
+
+
+class ImageCodec(object):
+    """ Base class of the codecs: encodes numpy images into the bytes of a file """
+    name = None
+    extension = None
+    lossless = True
+    supports_16bit = False
+
+    def encode(self, image : np.ndarray) -> bytes:
+        raise NotImplementedError
+
+    def check(self, image : np.ndarray):
+        if image.dtype == np.uint16 and not self.supports_16bit:
+            raise ValueError(f"codec '{self.name}' does not support 16-bit images")
+
+
+class PNGCodec(ImageCodec):
+    name, extension, supports_16bit = "png", ".png", True
+
+    def __init__(self, level=6):
+        self.level = int(level)  # zlib level: 0 (no compression, fastest) to 9 (smallest)
+
+    def encode(self, image):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.fromarray(image).save(buffer, format="PNG", compress_level=self.level)
+        return buffer.getvalue()
+
+
+class JPEGCodec(ImageCodec):
+    name, extension, lossless = "jpeg", ".jpg", False
+
+    def __init__(self, quality=95):
+        self.quality = int(quality)
+
+    def encode(self, image):
+        from PIL import Image  # Pillow is built with libjpeg-turbo
+        buffer = io.BytesIO()
+        Image.fromarray(image).save(buffer, format="JPEG", quality=self.quality)
+        return buffer.getvalue()
+
+
+class WebPCodec(ImageCodec):
+    name, extension = "webp", ".webp"
+
+    def __init__(self, quality=90):
+        self.lossless = quality == "lossless"
+        self.quality = 100 if self.lossless else int(quality)
+
+    def encode(self, image):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.fromarray(image).save(buffer, format="WEBP", quality=self.quality, lossless=self.lossless)
+        return buffer.getvalue()
+
+
+class QOICodec(ImageCodec):
+    name, extension = "qoi", ".qoi"
+
+    def encode(self, image):
+        try:
+            import qoi
+        except ImportError:
+            raise ImportError("The QOI codec requires 'pip install qoi'")
+        if image.ndim == 2:
+            image = np.repeat(image[:, :, None], 3, axis=2)  # QOI only knows RGB(A)
+        return qoi.encode(np.ascontiguousarray(image))
+
+
+class RawCodec(ImageCodec):
+    name, extension, supports_16bit = "raw", ".npy", True
+
+    def encode(self, image):
+        buffer = io.BytesIO()
+        np.save(buffer, image)
+        return buffer.getvalue()
+
+
+CODECS = {codec.name: codec for codec in [PNGCodec, JPEGCodec, WebPCodec, QOICodec, RawCodec]}
+
+
+def get_codec(spec):
+    """ :return: The codec of a specification 'name' or 'name:param' """
+    if isinstance(spec, ImageCodec):
+        return spec
+    name, _, param = spec.partition(":")
+    if name not in CODECS:
+        raise ValueError(f"unknown image codec '{name}', choose one of {list(CODECS.keys())}")
+    return CODECS[name](param) if param else CODECS[name]()
+
+
+_POOL = None
+_POOL_THREADS = os.cpu_count() or 4
+_POOL_LOCK = threading.Lock()
+
+
+def set_encode_threads(num_threads):
+    """ Sets the size of the shared encode pool. Must be called before the first image is saved. """
+    global _POOL_THREADS
+    with _POOL_LOCK:
+        if _POOL is not None:
+            raise RuntimeError("the encode pool is already running")
+        _POOL_THREADS = num_threads
+
+
+def get_encode_threads():
+    return _POOL_THREADS
+
+
+def get_encode_pool():
+    """ The process-wide thread pool all image sinks encode in (zlib and libjpeg release the GIL) """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(max_workers=_POOL_THREADS, thread_name_prefix="image_encode")
+        return _POOL
+
+
+def _encode_and_write(codec, image, filename):
+    data = codec.encode(image)
+    with open(filename, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+class ImageSink(object):
+    """
+    Saves images with a codec in the shared encode pool. Leaving the context waits for all pending images
+    and raises the first encoding error, if any.
+    """
+    def __init__(self, codec="png"):
+        self.codec = get_codec(codec)
+        self.pending = deque()
+        self.bytes_written = 0
+
+    @property
+    def extension(self):
+        return self.codec.extension
+
+    def save(self, image, filename):
+        """ Encodes 'image' (torch tensor or numpy array) into 'filename' in the background """
+        image = to_numpy(image)  # CPU tensors are shared, so they must not be modified until they are written
+        self.codec.check(image)
+        while len(self.pending) >= MAX_PENDING:
+            self.bytes_written += self.pending.popleft().result()
+        self.pending.append(get_encode_pool().submit(_encode_and_write, self.codec, image, str(filename)))
+
+    def flush(self):
+        while self.pending:
+            self.bytes_written += self.pending.popleft().result()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.flush()
+        else:
+            for future in self.pending:
+                future.cancel()
+            self.pending.clear()
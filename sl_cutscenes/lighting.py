@@ -1,6 +1,6 @@
 import random
-import stillleben as sl
 import sl_cutscenes.constants as CONSTANTS
+from sl_cutscenes import resource_cache
 
 
 def get_lightmap(map_name="random"):
@@ -13,6 +13,6 @@ def get_lightmap(map_name="random"):
         map_name = random.choice(list(CONSTANTS.ALL_LIGHTMAPS.keys()))
     elif map_name == "default":
         map_name = "Subway_Lights"
-    lightmap = sl.LightMap(CONSTANTS.ALL_LIGHTMAPS[map_name])
+    lightmap = resource_cache.get_lightmap(CONSTANTS.ALL_LIGHTMAPS[map_name])
 
     return lightmap
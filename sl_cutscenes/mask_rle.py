@@ -0,0 +1,92 @@
+"""
+Run-length encoding of object masks in the (uncompressed) COCO RLE format:
+{"size": [height, width], "counts": [n_0, n_1, ...]}, where the counts are alternating lengths of runs of 0s and 1s
+of the column-major (Fortran order) flattened mask, starting with 0s. Such RLEs can be converted to
+the compressed COCO format with pycocotools.mask.frPyObjects().
+"""
+import numpy as np
+
+
+def _column_runs(image):
+    """ :return: start, length and value of all runs of equal values in the column-major flattened image """
+    flat = np.asarray(image).ravel(order="F")
+    starts = np.concatenate([[0], np.flatnonzero(flat[1:] != flat[:-1]) + 1])
+    lengths = np.diff(np.concatenate([starts, [flat.size]]))
+    return starts, lengths, flat[starts]
+
+
+def _runs_to_rle(starts, lengths, size, shape):
+    """ COCO RLE of a binary mask, given the (sorted, non-adjacent) runs of its 1s """
+    ends = starts + lengths
+    zeros = starts - np.concatenate([[0], ends[:-1]])
+    counts = np.empty(2 * len(starts) + 1, dtype=np.int64)
+    counts[0:-1:2] = zeros
+    counts[1::2] = lengths
+    counts[-1] = size - (ends[-1] if len(ends) > 0 else 0)
+    return {"size": list(shape), "counts": counts.tolist()}
+
+
+def encode_instances(index_image, instance_ids=None):
+    """
+    Encodes the masks of all instances of an instance index image in one pass.
+    :param index_image: HxW integer image of instance ids
+    :param instance_ids: The ids to encode. Defaults to all non-zero ids in the image.
+        Requested ids that don't appear in the image get empty masks.
+    :return: A dict mapping each instance id to the RLE of its mask
+    """
+    index_image = np.asarray(index_image)
+    shape, size = index_image.shape[:2], index_image.size
+    starts, lengths, values = _column_runs(index_image)
+    if instance_ids is None:
+        instance_ids = np.unique(values[values != 0])
+
+    # group the runs by instance: a stable sort keeps the runs of each instance in order
+    order = np.argsort(values, kind="stable")
+    sorted_values = values[order]
+    instance_ids = np.asarray(instance_ids, dtype=np.int64)
+    first = np.searchsorted(sorted_values, instance_ids, side="left")
+    last = np.searchsorted(sorted_values, instance_ids, side="right")
+    return {
+        int(instance_id): _runs_to_rle(starts[order[lo:hi]], lengths[order[lo:hi]], size, shape)
+        for instance_id, lo, hi in zip(instance_ids, first, last)
+    }
+
+
+def encode_mask(mask):
+    """ :return: The RLE of a binary HxW mask """
+    mask = np.asarray(mask) != 0
+    return encode_instances(mask.astype(np.uint8), instance_ids=[1])[1]
+
+
+def decode_mask(rle):
+    """ :return: The binary (bool) HxW mask of an RLE """
+    height, width = rle["size"]
+    counts = np.asarray(rle["counts"], dtype=np.int64)
+    values = np.zeros(len(counts), dtype=bool)
+    values[1::2] = True
+    flat = np.repeat(values, counts)
+    return flat.reshape((height, width), order="F")
+
+
+def area(rle):
+    """ :return: Number of mask pixels of an RLE """
+    return int(sum(rle["counts"][1::2]))
+
+
+def bbox(rle):
+    """ :return: The bounding box (x, y, w, h) of an RLE, or (0, 0, 0, 0) for empty masks """
+    height, _ = rle["size"]
+    counts = np.asarray(rle["counts"], dtype=np.int64)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    run_starts, run_ends = starts[1::2], ends[1::2] - 1  # first and last pixel of each run of 1s
+    nonempty = counts[1::2] > 0
+    if not nonempty.any():
+        return 0, 0, 0, 0
+    run_starts, run_ends = run_starts[nonempty], run_ends[nonempty]
+    x1, x2 = int(run_starts[0] // height), int(run_ends[-1] // height)
+    # runs spanning multiple columns cover the full column height in between
+    spans_columns = run_starts // height != run_ends // height
+    y1 = 0 if spans_columns.any() else int((run_starts % height).min())
+    y2 = height - 1 if spans_columns.any() else int((run_ends % height).max())
+    return x1, y1, x2 - x1 + 1, y2 - y1 + 1
@@ -5,7 +5,8 @@ that affect scenario simulation and rendering.
 
 from collections import namedtuple
 import json
-from typing import List
+from pathlib import Path
+from typing import Iterable, List
 
 FLAG_CONCAVE = 1 << 0
 ObjectInfo = namedtuple(
@@ -14,27 +15,152 @@ ObjectInfo = namedtuple(
      "restitution", "scale", "static_friction", "dynamic_friction", "class_id"],
 )
 
-with open('sl_cutscenes/assets/objects.json') as json_file:
-    obj_info_dict = json.load(json_file)
+OBJECT_INFO_FP = Path(__file__).parent / "assets" / "objects.json"
+
+
+class ObjectCatalog:
+    """
+    Indexed collection of the ObjectInfo tuples for all available objects.
+
+    The object file is only parsed on first access. Afterwards, lookups by name, class id, category,
+    mesh path and tag are hash lookups instead of scans over the full object list.
+    Returned lists always keep the order in which the objects are listed in the object file.
+
+    YCB object weight sources: http://www.ycbbenchmarks.com/wp-content/uploads/2015/09/object-list-Sheet1.pdf
+    A few notes on the 'scale' parameter: stillleben is completely metric, so non-metric meshes need to be scaled:
+     - YCB-Video (BOP version) in millimeters -> scale = 0.001
+     - YCB Objects (the originals) in meters -> scale = 1.0
+     - Other objects in centimeters -> scale = 0.01
+     - However: you can scale all objects according to your needs (don't forget the weight)!
+    """
+
+    def __init__(self, fp=OBJECT_INFO_FP):
+        self.fp = Path(fp)
+        self._objects = None
+
+    def load(self):
+        """ Parses the object file and builds the indexes. Called automatically on first access. """
+        if self._objects is not None:
+            return
+        with open(self.fp) as json_file:
+            obj_info_dict = json.load(json_file)
+        objects = [ObjectInfo(name=name, **other_properties) for name, other_properties in obj_info_dict.items()]
+
+        self._position, self._by_name, self._tags = {}, {}, {}
+        self._by_class_id, self._by_category, self._by_mesh_fp, self._by_prefix, self._by_tag = {}, {}, {}, {}, {}
+        for i, obj in enumerate(objects):
+            self._position[obj.name] = i
+            self._by_name[obj.name] = obj
+            self._by_class_id.setdefault(obj.class_id, []).append(obj)
+            self._by_category.setdefault(self.get_category(obj), []).append(obj)
+            self._by_mesh_fp.setdefault(obj.mesh_fp, []).append(obj)
+            self._by_prefix.setdefault(obj.name.split("_")[0], []).append(obj)
+            self._tags[obj.name] = self.get_tags(obj)
+            for tag in self._tags[obj.name]:
+                self._by_tag.setdefault(tag, []).append(obj)
+        self._objects = objects
+
+    @property
+    def objects(self) -> List[ObjectInfo]:
+        self.load()
+        return self._objects
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def __contains__(self, name):
+        self.load()
+        return name in self._by_name
+
+    def get_by_name(self, name: str) -> ObjectInfo:
+        self.load()
+        return self._by_name[name]
+
+    def get_by_names(self, names: Iterable[str]) -> List[ObjectInfo]:
+        self.load()
+        return self._sorted([self._by_name[name] for name in names if name in self._by_name])
+
+    def get_by_class_id(self, class_id: int) -> List[ObjectInfo]:
+        self.load()
+        return self._by_class_id.get(class_id, [])
+
+    def get_by_category(self, category: str) -> List[ObjectInfo]:
+        self.load()
+        return self._by_category.get(category, [])
+
+    def get_by_mesh_fp(self, mesh_fp: str) -> List[ObjectInfo]:
+        self.load()
+        return self._by_mesh_fp.get(str(mesh_fp), [])
+
+    def get_by_prefixes(self, prefixes: Iterable[str]) -> List[ObjectInfo]:
+        """ Objects whose names start with one of the given prefixes, e.g. the YCB numbers '002', '003', ... """
+        self.load()
+        return self._sorted([obj for prefix in set(prefixes) for obj in self._by_prefix.get(prefix, [])])
+
+    def query(self, tags: Iterable[str] = (), exclude_tags: Iterable[str] = (), category: str = None):
+        """
+        Returns all objects that carry every tag in 'tags', none of the tags in 'exclude_tags'
+        and (if specified) belong to the given category.
+        """
+        self.load()
+        tags, exclude_tags = list(tags), set(exclude_tags)
+        if category is not None:
+            candidates = self._by_category.get(category, [])
+        elif len(tags) > 0:  # start from the smallest tag bucket
+            candidates = min((self._by_tag.get(tag, []) for tag in tags), key=len)
+        else:
+            candidates = self._objects
+        return [obj for obj in candidates
+                if self._tags[obj.name].issuperset(tags) and self._tags[obj.name].isdisjoint(exclude_tags)]
+
+    @staticmethod
+    def get_category(obj: ObjectInfo) -> str:
+        """ Coarse category of an object, derived from its name and mesh path """
+        if obj.name.endswith("_floor"):
+            return "floor"
+        elif obj.name.endswith("_wall"):
+            return "wall"
+        elif "complete_rooms" in obj.mesh_fp:
+            return "room"
+        elif "furniture/" in obj.mesh_fp:
+            return "furniture"
+        elif obj.name[0].isdigit():
+            return "ycb"
+        return obj.mesh_fp.split("/")[0]
+
+    @staticmethod
+    def get_tags(obj: ObjectInfo) -> set:
+        """ Tags of an object: its category and the last part of its name (e.g. 'chair' for 'metal_chair') """
+        tags = {ObjectCatalog.get_category(obj), obj.name.split("_")[-1]}
+        if obj.flags & FLAG_CONCAVE:
+            tags.add("concave")
+        return tags
+
+    def _sorted(self, objs):
+        return sorted(objs, key=lambda obj: self._position[obj.name])
+
 
 """
-The OBJECT_INFO constant holds ObjectInfo tuple for all available objects.
-
-YCB object weight sources: http://www.ycbbenchmarks.com/wp-content/uploads/2015/09/object-list-Sheet1.pdf
-A few notes on the 'scale' parameter: stillleben is completely metric, so non-metric meshes need to be scaled:
- - YCB-Video (BOP version) in millimeters -> scale = 0.001
- - YCB Objects (the originals) in meters -> scale = 1.0
- - Other objects in centimeters -> scale = 0.01
- - However: you can scale all objects according to your needs (don't forget the weight)!
+The CATALOG holds the ObjectInfo tuples for all available objects.
 """
-OBJECT_INFO = [ObjectInfo(name=name, **other_properties) for name, other_properties in obj_info_dict.items()]
+CATALOG = ObjectCatalog()
+
+
+def __getattr__(name):
+    # the full object list is kept for backwards compatibility, but only built when it is actually accessed
+    if name == "OBJECT_INFO":
+        return CATALOG.objects
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_objects_by_class_id(class_ids : List[int]):
     obj_infos = []
     for class_id in class_ids:
-        obj_infos += [obj_info for obj_info in OBJECT_INFO if obj_info.class_id == class_id]
+        obj_infos += CATALOG.get_by_class_id(class_id)
     return obj_infos
 
 def get_object_by_class_id(class_id : int):
-    return get_objects_by_class_id([class_id])[0]
+    return CATALOG.get_by_class_id(class_id)[0]
@@ -1,4 +1,6 @@
-import stillleben as sl
+from __future__ import annotations
+
+from sl_cutscenes.backends import sl
 import random
 import torch
 from typing import List
@@ -8,6 +10,7 @@ import sl_cutscenes.utils.utils as utils
 import sl_cutscenes.constants as CONSTANTS
 from sl_cutscenes.constants import SCENARIO_DEFAULTS
 from sl_cutscenes import object_info
+from sl_cutscenes.object_info import CATALOG
 
 
 class MeshLoader:
@@ -138,7 +141,7 @@ class DecoratorLoader:
     def __init__(self, scene):
         """ Object initializer """
         self.config = SCENARIO_DEFAULTS["decorator"]
-        decorations = self.config["decorations"]
+        decorations = CATALOG.query(tags=self.config["decorations"])
         bounds = self.config["bounds"]
         self.bounds = bounds
         self.pi = torch.acos(torch.zeros(1))
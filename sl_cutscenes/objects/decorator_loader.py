@@ -3,6 +3,7 @@ import random
 import torch
 
 from sl_cutscenes.constants import SCENARIO_DEFAULTS, PI
+from sl_cutscenes.object_info import CATALOG
 from sl_cutscenes.objects.mesh_loader import MeshLoader
 from sl_cutscenes.objects.occupancy_matrix import OccupancyMatrix
 from sl_cutscenes.utils import utils as utils
@@ -17,7 +18,7 @@ class DecoratorLoader:
     def __init__(self, scene):
         """ Object initializer """
         self.config = SCENARIO_DEFAULTS["decorator"]
-        decorations = self.config["decorations"]
+        decorations = CATALOG.query(tags=self.config["decorations"])
         bounds = self.config["bounds"]
         self.bounds = bounds
         self.pi = torch.acos(torch.zeros(1))
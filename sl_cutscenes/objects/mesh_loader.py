@@ -1,10 +1,11 @@
 from typing import List
 
-import stillleben as sl
-import torch
+from sl_cutscenes.backends import sl
 
 from sl_cutscenes.utils.utils import get_absolute_mesh_path
 from sl_cutscenes import object_info
+from sl_cutscenes import resource_cache
+from sl_cutscenes import tracing
 
 
 class MeshLoader:
@@ -24,6 +25,7 @@ class MeshLoader:
         extract_singular = lambda x: x[0] if len(x) == 1 else x
         return [extract_singular(item) for item in self.loaded_meshes]
 
+    @tracing.traced("load_meshes")
     def load_meshes(self, obj_info: List[object_info.ObjectInfo], **kwargs):
         """
         Loads the meshes whose information is given in parameter 'obj_info.
@@ -37,14 +39,8 @@ class MeshLoader:
         mod_scales = kwargs.get("mod_scale", [1.0] * len(scales))
         scales = [s * ms for (s, ms) in zip(scales, mod_scales)]
         flags = [mesh_flags(obj) for obj in obj_info]
-        meshes = sl.Mesh.load_threaded(filenames=paths, flags=flags)
-
-        # Setup class IDs
-        for _, (mesh, scale, class_id) in enumerate(zip(meshes, scales, class_ids)):
-            pt = torch.eye(4)
-            pt[:3, :3] *= scale
-            mesh.pretransform = pt
-            mesh.class_index = class_id
+        # meshes are loaded once per process and shared by all scenes, with scale pretransform and class ID set up
+        meshes = resource_cache.get_meshes(paths, flags, scales, class_ids)
 
         info_mesh_tuples = list(zip(obj_info, meshes))
         self.loaded_meshes.append(info_mesh_tuples)
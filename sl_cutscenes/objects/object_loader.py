@@ -1,48 +1,42 @@
-import stillleben as sl
+from __future__ import annotations
+
+from sl_cutscenes.backends import sl
 import torch
-import threading
 
 from sl_cutscenes import object_info
+from sl_cutscenes.objects.object_registry import ObjectRegistry
 
 
 class ObjectLoader:
     """
     Class to load the objects in a scene
     """
-    # These 'global' variables determine the loaded objects from ALL instantiated object loaders.
-    # They can be re-set by the scenario so that multiple object loaders don't lead to duplicates
-    # IMPORTANT: update them only inside a 'with ObjectLoader.lock:' statement!
-    scenario_objects_loaded = 0
-    loaded_objects = dict()
-    lock = threading.Lock()
 
-    def __init__(self, scenario_reset=False):
-        """Module initializer"""
-        self.reset(scenario_reset)
+    def __init__(self, registry: ObjectRegistry = None):
+        """
+        Module initializer
+        :param registry: Registry of the scene the objects are created for. Loaders that create objects for the
+            same scene (e.g. the scenario's and the room assembler's) must share it to get unique instance ids.
+        """
+        self.registry = ObjectRegistry() if registry is None else registry
 
-    def reset(self, new_scenario):
-        if new_scenario:
-            with ObjectLoader.lock:
-                ObjectLoader.scenario_objects_loaded = 0
-                ObjectLoader.loaded_objects = dict()
+    def reset(self):
+        self.registry.clear()
 
     @property
     def all_objects(self):
-        with ObjectLoader.lock:
-            objs = ObjectLoader.loaded_objects.values()
-        return objs
+        return self.registry.all_objects
 
     @property
     def static_objects(self):
-        with ObjectLoader.lock:
-            static_objs = [obj for obj in ObjectLoader.loaded_objects.values() if obj.static]
-        return static_objs
+        return self.registry.static_objects
 
     @property
     def dynamic_objects(self):
-        with ObjectLoader.lock:
-            dynamic_objs = [obj for obj in ObjectLoader.loaded_objects.values() if not obj.static]
-        return dynamic_objs
+        return self.registry.dynamic_objects
+
+    def get_object(self, instance_id):
+        return self.registry.get(instance_id)
 
     def create_object(self, object_info: object_info.ObjectInfo, mesh: sl.Mesh, is_static: bool, **obj_mod):
         """
@@ -71,16 +65,8 @@ class ObjectLoader:
         obj.angular_velocity = obj_mod.get("mod_v_angular", torch.tensor([0.0, 0.0, 0.0]))
         obj.static = is_static
 
-        with ObjectLoader.lock:
-            ObjectLoader.scenario_objects_loaded += 1
-            ins_idx = ObjectLoader.scenario_objects_loaded
-            obj.instance_index = ins_idx
-            ObjectLoader.loaded_objects[ins_idx] = obj
+        self.registry.add(obj)
         return obj
 
     def remove_object(self, instance_id, decrement_ins_idx=True):
-        with ObjectLoader.lock:
-            obj = ObjectLoader.loaded_objects.pop(instance_id, None)
-            if decrement_ins_idx and obj is not None:
-                ObjectLoader.scenario_objects_loaded -= 1
-        return obj
\ No newline at end of file
+        return self.registry.remove(instance_id, decrement_ins_idx=decrement_ins_idx)
\ No newline at end of file
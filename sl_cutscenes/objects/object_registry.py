@@ -0,0 +1,84 @@
+"""
+Registry of the objects of one scene
+"""
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+from sl_cutscenes.backends import sl
+
+
+class ObjectRegistry:
+    """
+    The objects created for one scene, indexed by their instance id.
+    Static and dynamic objects are kept in separate dicts that are updated on every add/remove,
+    and the views handed out to callers are only rebuilt after the registry has changed.
+    Objects must not change their 'static' flag after they have been added.
+    """
+
+    def __init__(self):
+        self.objects = dict()  # instance id -> sl.Object, in creation order
+        self.static = dict()
+        self.dynamic = dict()
+        self.num_loaded = 0  # last assigned instance id
+        self._views = None  # (all, static, dynamic) tuples, None if outdated
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __contains__(self, instance_id):
+        return instance_id in self.objects
+
+    def __iter__(self):
+        return iter(self.all_objects)
+
+    def get(self, instance_id) -> Optional[sl.Object]:
+        """ :return: The object with the given instance id or None """
+        return self.objects.get(instance_id)
+
+    def add(self, obj: sl.Object, instance_id=None) -> int:
+        """
+        Assigns the next instance id to the object and registers it
+        :param instance_id: If given, the object is registered with this id instead (e.g. to re-register an object
+            under its previous id), which must be free. The counter of assigned ids is not changed.
+        """
+        if instance_id is None:
+            self.num_loaded += 1
+            instance_id = self.num_loaded
+        obj.instance_index = instance_id
+        self.objects[obj.instance_index] = obj
+        (self.static if obj.static else self.dynamic)[obj.instance_index] = obj
+        self._views = None
+        return obj.instance_index
+
+    def remove(self, instance_id, decrement_ins_idx=True) -> Optional[sl.Object]:
+        obj = self.objects.pop(instance_id, None)
+        if obj is not None:
+            self.static.pop(instance_id, None)
+            self.dynamic.pop(instance_id, None)
+            self._views = None
+            if decrement_ins_idx:
+                self.num_loaded -= 1
+        return obj
+
+    def clear(self):
+        self.objects, self.static, self.dynamic = dict(), dict(), dict()
+        self.num_loaded = 0
+        self._views = None
+
+    def _get_views(self) -> Tuple[tuple, tuple, tuple]:
+        if self._views is None:
+            self._views = (tuple(self.objects.values()), tuple(self.static.values()), tuple(self.dynamic.values()))
+        return self._views
+
+    @property
+    def all_objects(self):
+        return self._get_views()[0]
+
+    @property
+    def static_objects(self):
+        return self._get_views()[1]
+
+    @property
+    def dynamic_objects(self):
+        return self._get_views()[2]
@@ -2,30 +2,75 @@
 Methods for writing an output frame
 Taken from SynPick and modified
 """
+from __future__ import annotations
 
-import stillleben as sl
+import json
 import torch
 from pathlib import Path
-from sl_cutscenes.scenarios.scenario import Scenario
+from typing import TYPE_CHECKING
+
+from sl_cutscenes.backends import sl
+from sl_cutscenes import tracing
+from sl_cutscenes.stats import AnnotationStats
+from sl_cutscenes.video import VideoSink
+from sl_cutscenes.frame_stream import FrameStreamWriter
+from sl_cutscenes.depth_encoding import DepthEncoder, as_png16
+from sl_cutscenes import mask_rle
+from sl_cutscenes.image_codecs import ImageSink
+if TYPE_CHECKING:
+    from sl_cutscenes.scenarios.scenario import Scenario
+    from sl_cutscenes.frame_ring import FrameRing
 
 class BOPWriter(object):
     '''
     'Full' writer, logging all availiable renderings of a scene in the BOP format (https://bop.felk.cvut.cz/datasets)
     '''
-    def __init__(self, path : Path):
+    def __init__(self, path : Path, video_fps : float = None, write_rgb_images : bool = True,
+                 frame_streams : bool = False, depth_encoder : DepthEncoder = None, mask_pngs : bool = False,
+                 rgb_codec : str = "jpeg:95", lossless_codec : str = "png", frame_ring : FrameRing = None,
+                 ring_writer_id : int = 0):
+        '''
+        :param video_fps: If given, the RGB frames are streamed into 'rgb_video.mp4' at this frame rate while writing.
+        :param write_rgb_images: If False, the RGB frames are not stored as JPEG images.
+        :param frame_streams: If True, depth and index masks are stored in lossless per-episode frame streams
+            ('depth.fstream', 'class_index.fstream', 'instance_index.fstream', see frame_stream.py) instead of PNGs.
+        :param depth_encoder: Storage format of the depth maps, defaults to uint16 PNGs in 0.1 mm units.
+        :param mask_pngs: If True, the visible mask of every object is additionally saved as PNG in 'mask_visib'.
+            The visible and amodal masks of all objects are always written as RLE to 'scene_gt_masks.json'.
+        :param rgb_codec: Image codec of the RGB frames (see image_codecs.py).
+        :param lossless_codec: Image codec of depth maps and masks, needs to be lossless and support 16-bit images.
+        :param frame_ring: If given, every frame is additionally copied into this shared-memory ring for consumer
+            processes, tagged with 'ring_writer_id'.
+        '''
         self.path = path
         self.idx = 0
-        self.depth_scale = 10000.0  # depth [m] = pixel / depth_scale
-        self.saver = sl.ImageSaver()
+        self.depth_encoder = DepthEncoder() if depth_encoder is None else depth_encoder
+        self.rgb_saver = ImageSink(rgb_codec)
+        self.saver = ImageSink(lossless_codec)
+        if not (self.saver.codec.lossless and self.saver.codec.supports_16bit):
+            raise ValueError(f"'{lossless_codec}' can't store depth maps and index masks")
+        self.stats = AnnotationStats()  # saved next to the data when the writer is closed
+        self.write_rgb_images = write_rgb_images
+        self.video = VideoSink(path / 'rgb_video.mp4', fps=video_fps) if video_fps is not None else None
+        self.frame_ring = frame_ring
+        self.ring_writer_id = ring_writer_id
 
         # Create output directory
         path.mkdir(parents=True)
 
-        (path / 'rgb').mkdir()
-        (path / 'mask_visib').mkdir()
-        (path / 'class_index_masks').mkdir()
-        (path / 'instance_index_masks').mkdir()
-        (path / 'depth').mkdir()
+        if write_rgb_images:
+            (path / 'rgb').mkdir()
+        self.mask_pngs = mask_pngs
+        if mask_pngs:
+            (path / 'mask_visib').mkdir()
+        if frame_streams:
+            self.streams = {name: FrameStreamWriter(path / f'{name}.fstream')
+                            for name in ['depth', 'class_index', 'instance_index']}
+        else:
+            self.streams = None
+            (path / 'class_index_masks').mkdir()
+            (path / 'instance_index_masks').mkdir()
+            (path / 'depth').mkdir()
 
         self.camera_file = open(path / 'scene_camera.json', 'w')
         self.camera_file.write('{\n')
@@ -36,6 +81,9 @@ class BOPWriter(object):
         self.info_file = open(path / 'scene_gt_info.json', 'w')
         self.info_file.write('{\n')
 
+        self.masks_file = open(path / 'scene_gt_masks.json', 'w')
+        self.masks_file.write('{\n')
+
         self.log_file = open(path / 'log.txt', 'w')
 
         self.mask_renderer = sl.RenderPass('flat')
@@ -43,10 +91,12 @@ class BOPWriter(object):
 
 
     def __enter__(self):
+        self.rgb_saver.__enter__()
         self.saver.__enter__()
         return self
 
 
+    @tracing.traced("writer_close")
     def __exit__(self, type, value, traceback):
         # Finish camera_file
         self.camera_file.write('\n}')
@@ -60,10 +110,25 @@ class BOPWriter(object):
         self.info_file.write('\n}')
         self.info_file.close()
 
+        # Finish masks file
+        self.masks_file.write('\n}')
+        self.masks_file.close()
+
         # Finish log file
         self.log_file.close()
 
-        self.saver.__exit__(type, value, traceback)
+        self.stats.save(self.path / 'annotation_stats.json')
+
+        if self.video is not None:
+            self.video.close(discard=type is not None)
+        if self.streams is not None:
+            for stream in self.streams.values():
+                stream.close()
+
+        try:
+            self.rgb_saver.__exit__(type, value, traceback)
+        finally:  # flush the pending depth and mask writes even if the RGB saver failed
+            self.saver.__exit__(type, value, traceback)
 
 
     @staticmethod
@@ -116,6 +181,22 @@ class BOPWriter(object):
         else:
             return 0, 0, 0, 0
 
+    @staticmethod
+    def index_masks(instance_segmentation, objects):
+        """
+        Class and instance index masks of the given objects, looked up from the instance segmentation in one pass.
+        Pixels of other objects are 0.
+        """
+        instance_ids = torch.tensor([obj.instance_index for obj in objects], dtype=torch.long)
+        class_ids = torch.tensor([obj.mesh.class_index for obj in objects], dtype=torch.int32)
+        num_ids = max(int(instance_segmentation.max()), int(instance_ids.max()) if len(objects) > 0 else 0) + 1
+        class_lut = torch.zeros(num_ids, dtype=torch.int32)
+        class_lut[instance_ids] = class_ids
+        instance_lut = torch.zeros(num_ids, dtype=torch.int32)
+        instance_lut[instance_ids] = instance_ids.int()
+        instance_segmentation = instance_segmentation.long()
+        return class_lut[instance_segmentation], instance_lut[instance_segmentation]
+
     def write_log(self, *args, **kwargs):
         self.log_file.write(f'{self.idx:06}: ')
         print(*args, **kwargs, file=self.log_file)
@@ -124,24 +205,26 @@ class BOPWriter(object):
         with open(self.path / 'scene.sl', 'w') as f:
             f.write(scene.serialize())
 
+    @tracing.traced("write_frame")
     def write_frame(self, scenario : Scenario, result : sl.RenderPassResult):
 
         scene = scenario.scene
 
         # RGB
-        #t0 = time.time()
-        rgb = result.rgb()[:,:,:3].cpu().contiguous()
-        #t1 = time.time()
-        #print(f'RGB: {t1-t0}')
-        self.saver.save(rgb, str(self.path / 'rgb' / f'{self.idx:06}.jpg'))
-
+        with tracing.span("write_rgb"):
+            rgb = result.rgb()[:,:,:3].cpu().contiguous()
+            if self.write_rgb_images:
+                self.rgb_saver.save(rgb, str(self.path / 'rgb' / f'{self.idx:06}{self.rgb_saver.extension}'))
+            if self.video is not None:
+                self.video.write(rgb)
 
         # Depth
-        #t0 = time.time()
-        depth = (result.depth() * self.depth_scale).short().cpu().contiguous()
-        #t1 = time.time()
-        #print(f'Depth: {t1-t0}')
-        self.saver.save(depth, str(self.path / 'depth' / f'{self.idx:06}.png'))
+        with tracing.span("write_depth"):
+            depth = self.depth_encoder.encode(result.depth())
+            if self.streams is not None:
+                self.streams['depth'].write(self.depth_encoder.to_numpy(depth))
+            else:
+                self.depth_encoder.save(self.saver, depth, str(self.path / 'depth' / f'{self.idx:06}'))
 
         if self.idx != 0:
             self.info_file.write(',\n\n')
@@ -149,92 +232,142 @@ class BOPWriter(object):
 
         # Masks
         active_objects = scenario.dynamic_objects
-        instance_segmentation = result.instance_index()[:,:,0].byte().cpu()
-        class_index_masks, instance_index_masks = [], []
-
-        for i, obj in enumerate(active_objects):
-            if(not hasattr(obj, "instance_index")):
-                continue
-            mask = (instance_segmentation == obj.instance_index).byte()
-            self.saver.save(mask * 255, str(self.path / 'mask_visib' / f'{self.idx:06}_{i:06}.png'))
-            class_index_masks.append(mask * obj.mesh.class_index)
-            instance_index_masks.append(mask * obj.instance_index)
-
-            visib_num_pixels = mask.sum()
-            visib_bbox = BOPWriter.bbox_from_mask(mask)
-
-            # Render this object alone
-            silhouette = self.mask_renderer.render(scene, predicate=lambda o: o == obj)
-            sil_mask = (silhouette.class_index()[:,:,0] != 0).byte().cpu()
-            sil_num_pixels = sil_mask.sum()
-            sil_bbox = BOPWriter.bbox_from_mask(sil_mask)
-            visib_fract = float(visib_num_pixels) / float(sil_num_pixels) if sil_num_pixels > 0 else 0
-
-            if i != 0:
-                self.info_file.write(',\n')
-
-            self.info_file.write(
-                f'    {{"bbox_obj": {list(sil_bbox)}, "bbox_visib": {list(visib_bbox)}, ' +
-                f'"px_count_all": {int(sil_num_pixels)}, "px_count_valid": {int(sil_num_pixels)}, ' +
-                f'"px_count_visib": {int(visib_num_pixels)}, "visib_fract": {visib_fract}}}'
+        with tracing.span("write_masks", objects=len(active_objects)):
+            # 16 bit instance ids (the renderer returns them as int16)
+            instance_segmentation = (result.instance_index()[:,:,0].int() & 0xFFFF).cpu()
+            px_counts_all, px_counts_visib, bboxes_obj, bboxes_visib, class_ids = [], [], [], [], []
+
+            # visible masks of all objects, encoded in one pass over the instance segmentation
+            annotated_objects = [obj for obj in active_objects if hasattr(obj, "instance_index")]
+            visib_rles = mask_rle.encode_instances(
+                instance_segmentation.numpy(), [obj.instance_index for obj in annotated_objects]
             )
-
-        self.info_file.write(']')
-
-        class_index_mask = (torch.stack(class_index_masks, dim=0)).sum(dim=0).byte()
-        self.saver.save(class_index_mask, str(self.path / 'class_index_masks' / f'{self.idx:06}.png'))
-        instance_index_mask = torch.stack(instance_index_masks, dim=0).sum(dim=0).byte()
-        self.saver.save(instance_index_mask, str(self.path / 'instance_index_masks' / f'{self.idx:06}.png'))
-
-        # Figure out cam_K
-        P = scene.projection_matrix()
-        W,H = scene.viewport
-
-        cam_K = BOPWriter.intrinsicMatrixFromProjection(P, W, H)
-
-        world_in_camera = torch.inverse(scene.camera_pose())
-        cam_R_w2c = world_in_camera[:3,:3].contiguous()
-        cam_t_w2c = world_in_camera[:3,3] * 1000.0 # millimeters, of course.
-
-        # Write scene_camera.json
-        if self.idx != 0:
-            self.camera_file.write(',\n')
-        self.camera_file.write(f'  "{self.idx}": {{"cam_K": {cam_K.view(-1).tolist()}, '
-                               f'"cam_P": {P.flatten().tolist()}, "cam_viewport": {[W, H]}, '
-                               f'"depth_scale": {1.0 / (self.depth_scale / 1000.0)}, '
-                               f'"cam_pose": {scene.camera_pose().flatten().tolist()}, '
-                               f'"cam_R_w2c": {cam_R_w2c.view(-1).tolist()}, "cam_t_w2c": {cam_t_w2c.tolist()}}}')
-
-        # Write scene_gt.json
-        if self.idx != 0:
-            self.gt_file.write(',\n\n')
-
-        def gt(o):
-            T = o.pose()
-            T_m2c = world_in_camera @ T
-
-            cam_R = T[:3,:3].contiguous()
-            cam_t = T[:3,3] * 1000.0 # millimeters, of course.
-
-            cam_R_m2c = T_m2c[:3,:3].contiguous()
-            cam_t_m2c = T_m2c[:3,3] * 1000.0 # millimeters, of course.
-
-            return f'{{"cam_R": {cam_R.view(-1).tolist()}, "cam_t": {cam_t.tolist()}' \
-                   f', "cam_R_m2c": {cam_R_m2c.view(-1).tolist()}, "cam_t_m2c": {cam_t_m2c.tolist()}' \
-                   f', "obj_id": {o.mesh.class_index}, "ins_id": {o.instance_index}}}'
-
-        formatted_gt = ",\n".join([ gt(o) for o in active_objects ])
-        self.gt_file.write(f'  "{self.idx}": [\n    {formatted_gt}]')
+            mask_records = []
+
+            for i, obj in enumerate(active_objects):
+                if(not hasattr(obj, "instance_index")):
+                    continue
+                if self.mask_pngs:
+                    mask = (instance_segmentation == obj.instance_index).byte()
+                    self.saver.save(mask * 255,
+                                    str(self.path / 'mask_visib' / f'{self.idx:06}_{i:06}{self.saver.extension}'))
+
+                visib_rle = visib_rles[obj.instance_index]
+                visib_num_pixels = mask_rle.area(visib_rle)
+                visib_bbox = mask_rle.bbox(visib_rle)
+
+                # Render this object alone
+                with tracing.span("render_silhouette"):
+                    silhouette = self.mask_renderer.render(scene, predicate=lambda o: o == obj)
+                    sil_mask = (silhouette.class_index()[:,:,0] != 0).byte().cpu()
+                sil_rle = mask_rle.encode_mask(sil_mask.numpy())
+                sil_num_pixels = mask_rle.area(sil_rle)
+                sil_bbox = mask_rle.bbox(sil_rle)
+                mask_records.append({"obj_id": obj.mesh.class_index, "ins_id": obj.instance_index,
+                                     "mask_visib": visib_rle, "mask": sil_rle})
+                visib_fract = float(visib_num_pixels) / float(sil_num_pixels) if sil_num_pixels > 0 else 0
+
+                px_counts_all.append(int(sil_num_pixels))
+                px_counts_visib.append(int(visib_num_pixels))
+                bboxes_obj.append(sil_bbox)
+                bboxes_visib.append(visib_bbox)
+                class_ids.append(obj.mesh.class_index)
+
+                if i != 0:
+                    self.info_file.write(',\n')
+
+                self.info_file.write(
+                    f'    {{"bbox_obj": {list(sil_bbox)}, "bbox_visib": {list(visib_bbox)}, ' +
+                    f'"px_count_all": {int(sil_num_pixels)}, "px_count_valid": {int(sil_num_pixels)}, ' +
+                    f'"px_count_visib": {int(visib_num_pixels)}, "visib_fract": {visib_fract}}}'
+                )
+
+            self.info_file.write(']')
+            self.stats.add_frame(px_counts_all, px_counts_visib, bboxes_obj, bboxes_visib, class_ids)
+
+            # Write scene_gt_masks.json: one record per frame
+            if self.idx != 0:
+                self.masks_file.write(',\n')
+            self.masks_file.write(f'  "{self.idx}": {json.dumps(mask_records)}')
+
+        with tracing.span("write_index_masks"):
+            class_index_mask, instance_index_mask = BOPWriter.index_masks(instance_segmentation, annotated_objects)
+            if self.streams is not None:
+                self.streams['class_index'].write(class_index_mask.numpy().astype('uint16'))
+                self.streams['instance_index'].write(instance_index_mask.numpy().astype('uint16'))
+            else:  # 16-bit images
+                self.saver.save(as_png16(class_index_mask),
+                                str(self.path / 'class_index_masks' / f'{self.idx:06}{self.saver.extension}'))
+                self.saver.save(as_png16(instance_index_mask),
+                                str(self.path / 'instance_index_masks' / f'{self.idx:06}{self.saver.extension}'))
+
+        with tracing.span("write_annotations"):
+            # Figure out cam_K
+            P = scene.projection_matrix()
+            W,H = scene.viewport
+
+            cam_K = BOPWriter.intrinsicMatrixFromProjection(P, W, H)
+
+            world_in_camera = torch.inverse(scene.camera_pose())
+            cam_R_w2c = world_in_camera[:3,:3].contiguous()
+            cam_t_w2c = world_in_camera[:3,3] * 1000.0 # millimeters, of course.
+
+            # Write scene_camera.json
+            if self.idx != 0:
+                self.camera_file.write(',\n')
+            self.camera_file.write(f'  "{self.idx}": {{"cam_K": {cam_K.view(-1).tolist()}, '
+                                   f'"cam_P": {P.flatten().tolist()}, "cam_viewport": {[W, H]}, '
+                                   f'"depth_scale": {self.depth_encoder.bop_depth_scale}, '
+                                   f'"depth_format": "{self.depth_encoder.depth_format}", '
+                                   f'"cam_pose": {scene.camera_pose().flatten().tolist()}, '
+                                   f'"cam_R_w2c": {cam_R_w2c.view(-1).tolist()}, "cam_t_w2c": {cam_t_w2c.tolist()}}}')
+
+            # Write scene_gt.json
+            if self.idx != 0:
+                self.gt_file.write(',\n\n')
+
+            def gt(o):
+                T = o.pose()
+                T_m2c = world_in_camera @ T
+
+                cam_R = T[:3,:3].contiguous()
+                cam_t = T[:3,3] * 1000.0 # millimeters, of course.
+
+                cam_R_m2c = T_m2c[:3,:3].contiguous()
+                cam_t_m2c = T_m2c[:3,3] * 1000.0 # millimeters, of course.
+
+                return f'{{"cam_R": {cam_R.view(-1).tolist()}, "cam_t": {cam_t.tolist()}' \
+                       f', "cam_R_m2c": {cam_R_m2c.view(-1).tolist()}, "cam_t_m2c": {cam_t_m2c.tolist()}' \
+                       f', "obj_id": {o.mesh.class_index}, "ins_id": {o.instance_index}}}'
+
+            formatted_gt = ",\n".join([ gt(o) for o in active_objects ])
+            self.gt_file.write(f'  "{self.idx}": [\n    {formatted_gt}]')
+
+        if self.frame_ring is not None:
+            with tracing.span("write_frame_ring"):
+                poses = [world_in_camera @ obj.pose() for obj in annotated_objects]
+                self.frame_ring.write(
+                    rgb=rgb, depth=result.depth().cpu(), instance_index=instance_index_mask,
+                    class_index=class_index_mask, instance_ids=[obj.instance_index for obj in annotated_objects],
+                    class_ids=[obj.mesh.class_index for obj in annotated_objects],
+                    poses=torch.stack(poses).cpu() if poses else torch.zeros((0, 4, 4)),
+                    cam_K=cam_K, cam_pose=scene.camera_pose().cpu(), frame=self.idx, writer_id=self.ring_writer_id
+                )
 
         self.idx += 1
 
 
+    @tracing.traced("assemble_rgb_video")
     def assemble_rgb_video(self, in_fps, out_fps):
+        '''
+        Creates the video from the stored RGB images after the fact.
+        Not needed if the writer has been created with 'video_fps', which encodes the video while writing.
+        '''
         import glob
         from moviepy.video.io.ImageSequenceClip import ImageSequenceClip
         import moviepy.video.fx.all as vfx
 
-        rgb_frames = sorted(glob.glob(str(self.path / "rgb" / "*.jpg")))
+        rgb_frames = sorted(glob.glob(str(self.path / "rgb" / f"*{self.rgb_saver.extension}")))
         rgb_clip = ImageSequenceClip(rgb_frames, fps=in_fps)
         rgb_clip = rgb_clip.set_fps(out_fps)
         rgb_clip = rgb_clip.fx(vfx.speedx, out_fps / in_fps)  # both speedup and set_fps needed for re-setting FPS
@@ -270,8 +403,12 @@ class OverlayWriter(object):
         return rgb
 
     def write_obj_mask(self, result : sl.RenderPassResult, out_file: str):
-        instance_segmentation = result.instance_index()[:,:,0]
-        instance_segmentation[instance_segmentation > 0] = 1.0
-        instance_segmentation = instance_segmentation.byte().cpu()
-        self.saver.save(instance_segmentation, out_file)
+        obj_mask = (result.instance_index()[:,:,0] != 0).byte().cpu()  # ids > 32767 are negative int16
+        self.saver.save(obj_mask, out_file)
+        return obj_mask
+
+    def write_instance_index(self, result : sl.RenderPassResult, out_file: str):
+        """ Saves the instance index image as 16-bit PNG """
+        instance_segmentation = (result.instance_index()[:,:,0].int() & 0xFFFF).cpu()
+        self.saver.save(as_png16(instance_segmentation), out_file)
         return instance_segmentation
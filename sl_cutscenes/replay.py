@@ -0,0 +1,128 @@
+"""
+Rendering of recorded trajectories (see trajectory.py): rebuilds the scene of a sim-only episode and renders its
+frames with the recorded or a newly sampled camera rig, without simulating anything.
+"""
+import random
+from contextlib import ExitStack
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from sl_cutscenes.backends import sl
+from sl_cutscenes import resource_cache
+from sl_cutscenes import tracing
+from sl_cutscenes.camera import sample_camera_rig
+from sl_cutscenes.output import BOPWriter
+
+
+def load_mesh(source):
+    if source["flags"] is None:
+        return resource_cache.get_mesh(source["path"])
+    return resource_cache.get_meshes([source["path"]], [sl.Mesh.Flag(source["flags"])], [source["scale"]],
+                                     [source["class_id"]])[0]
+
+
+class ReplayScenario(object):
+    """
+    Stand-in for the scenario of a recorded episode: holds the rebuilt scene and sets it to the state of a frame.
+    Provides what the BOPWriter needs from a scenario ('scene' and 'dynamic_objects').
+    """
+    def __init__(self, trajectory, resolution):
+        self.trajectory = trajectory
+        self.name = trajectory.meta["scenario"]
+        self.scene = sl.Scene(resolution)
+        self.objects = []
+        for obj_meta in trajectory.meta["objects"]:
+            obj = sl.Object(load_mesh(obj_meta["mesh"]))
+            obj.metallic = obj_meta["metallic"]
+            obj.roughness = obj_meta["roughness"]
+            obj.casts_shadows = obj_meta["casts_shadows"]
+            obj.static = obj_meta["static"]
+            if obj_meta["instance_index"] is not None:
+                obj.instance_index = obj_meta["instance_index"]
+            self.objects.append(obj)
+        self.in_scene = np.zeros(len(self.objects), dtype=bool)
+        self.dynamic_objects = []
+        self.setup_lighting(trajectory.meta["lighting"])
+
+    def setup_lighting(self, lighting):
+        self.scene.ambient_light = torch.tensor(lighting["ambient_light"])
+        if lighting["light_map"] is not None:
+            self.scene.light_map = resource_cache.get_lightmap(lighting["light_map"])
+        self.scene.light_directions[:] = torch.tensor(lighting["light_directions"])
+        self.scene.light_colors[:] = torch.tensor(lighting["light_colors"])
+        self.scene.manual_exposure = lighting["manual_exposure"]
+
+    def set_frame(self, frame):
+        """ Sets the scene to the recorded state of the given frame """
+        present = self.trajectory.present[frame]
+        for idx in np.flatnonzero(present != self.in_scene):
+            if present[idx]:
+                self.scene.add_object(self.objects[idx])
+            else:
+                self.scene.remove_object(self.objects[idx])
+        self.in_scene = present.copy()
+        for idx in np.flatnonzero(present):
+            pose = torch.eye(4)
+            pose[:3] = torch.from_numpy(self.trajectory.poses[frame, idx])
+            self.objects[idx].set_pose(pose)
+        self.dynamic_objects = [self.objects[idx] for idx in np.flatnonzero(self.trajectory.annotated[frame])]
+
+
+def get_camera_views(trajectory, resample=False, seed=None):
+    """
+    :param resample: If True, a new camera rig is sampled from the recorded rig's config (and look-at point)
+        instead of using the recorded camera positions.
+    :return: The names of the cameras with their stereo positions, and their (F, C, S, 3) positions and look-at points
+    """
+    rig = trajectory.meta["camera_rig"]
+    if not resample:
+        return rig["names"], rig["stereo_positions"], trajectory.cam_positions, trajectory.cam_lookats
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed % 2 ** 32)
+    cameras = sample_camera_rig(rig["config"], rig["n_cameras"], rig["cam_dt"],
+                                base_lookat=torch.tensor(rig["base_lookat"]),
+                                coplanar_stereo=rig["coplanar_stereo"],
+                                coplanar_stereo_dist=rig["coplanar_stereo_dist"],
+                                movement_complexity=rig["movement_complexity"])
+    positions, lookats = [], []
+    for _ in range(trajectory.num_frames):
+        positions.append([[cam.get_pos(pos).tolist() for pos in cam.stereo_positions] for cam in cameras])
+        lookats.append([[cam.get_lookat(pos).tolist() for pos in cam.stereo_positions] for cam in cameras])
+        for cam in cameras:
+            cam.step()
+    return ([cam.name for cam in cameras], cameras[0].stereo_positions,
+            np.array(positions, dtype=np.float32), np.array(lookats, dtype=np.float32))
+
+
+@tracing.traced("replay_trajectory")
+def replay_trajectory(trajectory, renderer, out_path, resolution, camera_ids=None, resample=False, seed=None,
+                      name_suffix="", **writer_kwargs):
+    """
+    Renders all frames of a recorded episode into one BOP folder per camera and stereo position,
+    '<out_path>/<episode><name_suffix>_<camera>_<stereo position>'.
+    :param camera_ids: Indices of the cameras to render, default: all
+    :param writer_kwargs: Further arguments of the BOPWriters, e.g. 'depth_encoder' or 'rgb_codec'
+    """
+    replay = ReplayScenario(trajectory, resolution)
+    cam_names, stereo_positions, positions, lookats = get_camera_views(trajectory, resample=resample, seed=seed)
+    camera_ids = range(len(cam_names)) if camera_ids is None else camera_ids
+    views = [(cam_idx, pos_idx, f"{cam_names[cam_idx]}_{stereo_pos}")
+             for cam_idx in camera_ids for pos_idx, stereo_pos in enumerate(stereo_positions)]
+
+    with ExitStack() as stack:
+        writers = [stack.enter_context(BOPWriter(Path(out_path) / f"{trajectory.name}{name_suffix}_{view_name}",
+                                                 **writer_kwargs))
+                   for _, _, view_name in views]
+        for frame in range(trajectory.num_frames):
+            replay.set_frame(frame)
+            for (cam_idx, pos_idx, view_name), writer in zip(views, writers):
+                replay.scene.set_camera_look_at(position=torch.from_numpy(positions[frame, cam_idx, pos_idx]),
+                                                look_at=torch.from_numpy(lookats[frame, cam_idx, pos_idx]))
+                with tracing.span("render", cam=view_name):
+                    result = renderer.render(replay.scene)
+                writer.write_frame(replay, result)
+    return [writer.path for writer in writers]
+
@@ -0,0 +1,94 @@
+"""
+Process-wide cache of the render resources (meshes and light maps) of all episodes.
+
+Every episode loads the same candidate meshes of its scenario, so meshes are loaded once per process and then
+shared by the objects of all later scenes. Loading a resource uploads it to the GPU and therefore needs the
+render context, which only the main thread has: in other threads (see generation.EpisodePrefetcher), a cache miss
+raises a RenderContextRequired error instead of loading.
+"""
+import threading
+
+import torch
+
+from sl_cutscenes.backends import sl
+
+_MESHES = dict()  # (path, flags, scale, class id) -> sl.Mesh
+_LIGHTMAPS = dict()  # path -> sl.LightMap
+_SOURCES = dict()  # id(cached resource) -> its key in _MESHES / _LIGHTMAPS
+_LOCK = threading.Lock()
+
+
+class RenderContextRequired(RuntimeError):
+    """ Raised if a resource that is not cached yet is requested outside of the render thread """
+    pass
+
+
+def in_render_thread():
+    return threading.current_thread() is threading.main_thread()
+
+
+def _require_render_context(what):
+    if not in_render_thread():
+        raise RenderContextRequired(f"loading {what} needs the render context of the main thread")
+
+
+def get_meshes(paths, flags, scales, class_ids):
+    """
+    :return: The meshes of the given files, loaded with the given flags, scaled with a pretransform and labeled
+        with the class ids. Uncached meshes are loaded together with sl.Mesh.load_threaded().
+    """
+    keys = [(str(path), flag, float(scale), class_id)
+            for path, flag, scale, class_id in zip(paths, flags, scales, class_ids)]
+    with _LOCK:
+        missing = list(dict.fromkeys(key for key in keys if key not in _MESHES))  # unique, in order
+        if missing:
+            _require_render_context(f"{len(missing)} meshes")
+            meshes = sl.Mesh.load_threaded(filenames=[key[0] for key in missing],
+                                           flags=[key[1] for key in missing])
+            for key, mesh in zip(missing, meshes):
+                _, _, scale, class_id = key
+                pt = torch.eye(4)
+                pt[:3, :3] *= scale
+                mesh.pretransform = pt
+                mesh.class_index = class_id
+                _MESHES[key] = mesh
+                _SOURCES[id(mesh)] = key
+        return [_MESHES[key] for key in keys]
+
+
+def get_mesh(path):
+    """ :return: The mesh of the given file, loaded with the default flags and without pretransform """
+    key = (str(path), None, None, None)
+    with _LOCK:
+        if key not in _MESHES:
+            _require_render_context(f"mesh '{path}'")
+            _MESHES[key] = sl.Mesh(str(path))
+            _SOURCES[id(_MESHES[key])] = key
+        return _MESHES[key]
+
+
+def get_lightmap(path):
+    with _LOCK:
+        if path not in _LIGHTMAPS:
+            _require_render_context(f"light map '{path}'")
+            _LIGHTMAPS[path] = sl.LightMap(path)
+            _SOURCES[id(_LIGHTMAPS[path])] = str(path)
+        return _LIGHTMAPS[path]
+
+
+def get_source(resource):
+    """
+    :return: How a cached resource has been loaded, so that it can be loaded again in another process:
+        (path, flags, scale, class id) for meshes (flags, scale and class id are None for get_mesh()),
+        the path for light maps. None if the resource has not been loaded through this cache.
+    """
+    with _LOCK:
+        return _SOURCES.get(id(resource))
+
+
+def clear():
+    """ Releases all cached resources (objects of existing scenes keep theirs) """
+    with _LOCK:
+        _MESHES.clear()
+        _LIGHTMAPS.clear()
+        _SOURCES.clear()
@@ -0,0 +1,101 @@
+"""
+Stable resting poses of the catalog objects, so that scenarios can spawn props already lying on a surface
+instead of dropping them and simulating until they come to rest.
+
+The resting poses are computed offline with scripts/compute_resting_poses.py (many drop simulations per mesh)
+and stored next to the object catalog in 'assets/resting_poses.json':
+
+    {"<object name>": {"num_drops": 64, "poses": [{"up": [x, y, z], "z": 0.031, "prob": 0.62}, ...]}, ...}
+
+'up' is the world's up direction in object coordinates, 'z' the height of the object origin above the supporting
+surface (for the catalog scale of the object) and 'prob' the fraction of the drops that ended in this pose.
+The rotation about the up axis (yaw) is free and sampled uniformly.
+"""
+import json
+import math
+import random
+import threading
+from pathlib import Path
+
+import numpy as np
+import torch
+
+RESTING_POSES_FP = Path(__file__).parent / "assets" / "resting_poses.json"
+
+_POSES = None
+_POSES_LOCK = threading.Lock()
+
+
+def rotation_to_up(up):
+    """ :return: A rotation matrix (numpy, 3x3) that turns the direction 'up' (object coordinates) to world +z """
+    a = np.asarray(up, dtype=np.float64) / np.linalg.norm(up)
+    b = np.array([0.0, 0.0, 1.0])
+    v, c = np.cross(a, b), float(np.dot(a, b))
+    if c < -1.0 + 1e-9:  # upside down: turn by 180 deg about the x axis
+        return np.diag([1.0, -1.0, -1.0])
+    vx = np.array([[0.0, -v[2], v[1]], [v[2], 0.0, -v[0]], [-v[1], v[0], 0.0]])
+    return np.eye(3) + vx + vx @ vx / (1.0 + c)
+
+
+def cluster_resting_poses(rotations, heights, angle_tol=10.0, min_prob=0.02):
+    """
+    Groups the final orientations of drop simulations into resting poses.
+    :param rotations: (N, 3, 3) object-to-world rotations of the objects at rest
+    :param heights: (N,) heights of the object origins above the supporting surface
+    :param angle_tol: Maximum angle (deg) between the up directions of the drops of one resting pose
+    :param min_prob: Resting poses reached by fewer drops are discarded (probabilities are renormalized)
+    :return: A list of resting poses as stored in the resting pose file, most probable first
+    """
+    ups = np.asarray(rotations)[:, 2, :]  # world z axis in object coordinates
+    cos_tol = math.cos(math.radians(angle_tol))
+    clusters = []  # [sum of up vectors, list of heights]
+    for up, height in zip(ups, heights):
+        for cluster in clusters:
+            if np.dot(cluster[0] / np.linalg.norm(cluster[0]), up) >= cos_tol:
+                cluster[0] += up
+                cluster[1].append(float(height))
+                break
+        else:
+            clusters.append([up.copy(), [float(height)]])
+
+    total = sum(len(cluster[1]) for cluster in clusters)
+    clusters = [cluster for cluster in clusters if len(cluster[1]) / total >= min_prob]
+    kept = sum(len(cluster[1]) for cluster in clusters)
+    poses = [{"up": (cluster[0] / np.linalg.norm(cluster[0])).tolist(), "z": float(np.median(cluster[1])),
+              "prob": len(cluster[1]) / kept} for cluster in clusters]
+    return sorted(poses, key=lambda pose: -pose["prob"])
+
+
+def load(fp=RESTING_POSES_FP):
+    """ :return: The resting poses of all objects in the given file (name -> entry), empty if it doesn't exist """
+    fp = Path(fp)
+    if not fp.exists():
+        return dict()
+    with open(fp) as f:
+        return json.load(f)
+
+
+def get_resting_poses(name):
+    """ :return: The resting poses of the catalog object with the given name, or None if they are unknown """
+    global _POSES
+    with _POSES_LOCK:
+        if _POSES is None:
+            _POSES = load()
+    entry = _POSES.get(name)
+    return entry["poses"] if entry else None
+
+
+def sample_resting_pose(name, rng=random):
+    """
+    :return: A tuple (rotation, height): an object-to-world rotation (3x3 tensor) of a resting pose drawn according
+        to the pose probabilities, with a uniformly random yaw, and the height of the object origin above the
+        supporting surface. None if no resting poses are known for the object.
+    """
+    poses = get_resting_poses(name)
+    if not poses:
+        return None
+    pose = rng.choices(poses, weights=[pose["prob"] for pose in poses])[0]
+    yaw = rng.uniform(0.0, 2 * math.pi)
+    yaw_rot = np.array([[math.cos(yaw), -math.sin(yaw), 0.0], [math.sin(yaw), math.cos(yaw), 0.0], [0.0, 0.0, 1.0]])
+    rotation = torch.from_numpy(yaw_rot @ rotation_to_up(pose["up"])).float()
+    return rotation, pose["z"]
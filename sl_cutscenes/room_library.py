@@ -0,0 +1,67 @@
+"""
+Library of pre-generated room layouts (floor, walls and furniture), so that episodes don't have to solve the
+furniture placement online. A library is baked once with scripts/bake_rooms.py and passed to main.py with
+'--room-library'. Every episode then picks one of its layouts at random.
+
+Layout i of a library is baked from the seed 'seed + i', so a library can be re-created (or extended) exactly.
+Each layout stores the catalog names and final poses of its objects and the occupancy grid of the room.
+"""
+import base64
+import functools
+import json
+import random
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+LIBRARY_VERSION = 1
+
+
+def encode_grid(occ_matrix):
+    """ Occupancy grid (0: free, 0.5: margin, 1: occupied) -> compact JSON representation """
+    levels = np.rint(np.asarray(occ_matrix, dtype=np.float32) * 2).astype(np.uint8)
+    return {"shape": list(levels.shape), "data": base64.b64encode(zlib.compress(levels.tobytes())).decode()}
+
+
+def decode_grid(grid):
+    levels = np.frombuffer(zlib.decompress(base64.b64decode(grid["data"])), dtype=np.uint8)
+    return levels.reshape(grid["shape"]).astype(np.float32) / 2
+
+
+class RoomLibrary(object):
+    """ A list of room layouts as written by save() """
+    def __init__(self, layouts, seed=None, bounds=None):
+        self.layouts = layouts
+        self.seed = seed
+        self.bounds = bounds
+
+    def __len__(self):
+        return len(self.layouts)
+
+    def __getitem__(self, idx):
+        return self.layouts[idx]
+
+    def sample(self, rng=random):
+        """ :return: A random layout, drawn from the given random generator (default: the global one) """
+        return self.layouts[rng.randrange(len(self.layouts))]
+
+    @classmethod
+    def load(cls, fp):
+        with open(fp) as f:
+            library = json.load(f)
+        if library.get("version") != LIBRARY_VERSION:
+            raise ValueError(f"room library '{fp}' has version {library.get('version')}, expected {LIBRARY_VERSION}")
+        return cls(library["layouts"], seed=library["seed"], bounds=library["bounds"])
+
+    def save(self, fp):
+        Path(fp).parent.mkdir(parents=True, exist_ok=True)
+        with open(fp, "w") as f:
+            json.dump({"version": LIBRARY_VERSION, "seed": self.seed, "bounds": self.bounds,
+                       "layouts": self.layouts}, f)
+
+
+@functools.lru_cache(maxsize=None)
+def get_library(fp):
+    """ :return: The room library of the given file, loaded once per process """
+    return RoomLibrary.load(fp)
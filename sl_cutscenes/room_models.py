@@ -10,6 +10,8 @@ import sl_cutscenes.utils.utils as utils
 from sl_cutscenes.objects.mesh_loader import MeshLoader
 from sl_cutscenes.objects.object_loader import ObjectLoader
 from sl_cutscenes.objects.occupancy_matrix import OccupancyMatrix
+from sl_cutscenes.object_info import CATALOG
+from sl_cutscenes import room_library
 import sl_cutscenes.constants as CONSTANTS
 from sl_cutscenes.constants import SCENARIO_DEFAULTS
 
@@ -20,20 +22,39 @@ class RoomAssembler:
     floor, walls and objects
     """
 
-    def __init__(self, scene):
-        """ Module initializer """
+    def __init__(self, scene, object_loader=None, library=None):
+        """
+        Module initializer. Pass the object loader of the scenario to share its object registry.
+        :param library: If given, rooms are taken from this RoomLibrary instead of being assembled.
+        """
         self.pi = torch.acos(torch.zeros(1))
         self.scene = scene
         self.config = SCENARIO_DEFAULTS["room"]
 
         self.mesh_loader = MeshLoader()
-        self.object_loader = ObjectLoader()
+        self.object_loader = ObjectLoader() if object_loader is None else object_loader
 
         self.use_assembled = None
+        self.library = library
+        self.objects = []  # all objects of the room, including the furniture
+        self.object_names = []  # catalog names of the objects
+        self.furnished = False
         return
 
+    def adopt(self, object_loader):
+        """ Hands the (already built) room over to the object loader of a new scenario in the same scene """
+        self.object_loader = object_loader
+        for obj in self.objects:
+            object_loader.registry.add(obj)
+        return self
+
     def make_room(self):
         """ Main logic for obtaining a room for the scene """
+        if self.objects:  # reused room
+            return
+        if self.library is not None:
+            self.load_layout(self.library.sample())
+            return
         self.use_assembled = random.random() < self.config["prob_assembled"]
         if(self.use_assembled):
             self.get_existing_room()
@@ -76,7 +97,7 @@ class RoomAssembler:
 
     def add_wall_furniture(self):
         """ Adding furniture to the walls, e.g., cabinets and kitchen stuff"""
-        if not self.use_assembled:
+        if not self.use_assembled and not self.furnished:
             # intializing occupancy matrix for collision avoidance
             self.occ_matrix = OccupancyMatrix(
                     bounds=SCENARIO_DEFAULTS["decorator"]["bounds"],
@@ -85,6 +106,7 @@ class RoomAssembler:
             n_objs = random.randint(a=3, b=6)  # TODO: get param from CONFIG
             for i in range(n_objs):
                 self.add_furniture_element(floor=self.floor, walls=self.walls)
+            self.furnished = True
         return
 
     def add_furniture_element(self, floor, walls):
@@ -130,14 +152,48 @@ class RoomAssembler:
         self.occ_matrix.add_object_margings()
         return
 
-    def add_object_to_scene(self, obj_info_mesh, pose=None):
+    def get_layout(self):
+        """ The room as layout of a RoomLibrary: catalog names and poses of its objects and its occupancy grid """
+        roles = {id(self.floor): "floor", **{id(wall): "wall" for wall in self.walls}} if not self.use_assembled \
+            else {}
+        layout = {
+            "objects": [{"name": name, "role": roles.get(id(obj), "furniture"), "pose": obj.pose().tolist()}
+                        for obj, name in zip(self.objects, self.object_names)],
+            "use_assembled": bool(self.use_assembled),
+        }
+        if not self.use_assembled:
+            layout["occupancy"] = room_library.encode_grid(self.occ_matrix.occ_matrix)
+        return layout
+
+    def load_layout(self, layout):
+        """ Adds the objects of a room layout to the scene, with the poses stored in the layout """
+        self.use_assembled = layout["use_assembled"]
+        self.walls = []
+        for entry in layout["objects"]:
+            self.mesh_loader.load_meshes([CATALOG.get_by_name(entry["name"])])
+            obj = self.add_object_to_scene(self.mesh_loader.get_meshes()[-1], pose=torch.tensor(entry["pose"]),
+                                           adjust_z=False)
+            if entry["role"] == "floor":
+                self.floor = obj
+            elif entry["role"] == "wall":
+                self.walls.append(obj)
+        if "occupancy" in layout:
+            self.occ_matrix = OccupancyMatrix(bounds=SCENARIO_DEFAULTS["decorator"]["bounds"])
+            self.occ_matrix.occ_matrix = torch.from_numpy(room_library.decode_grid(layout["occupancy"]))
+        self.furnished = True
+        return
+
+    def add_object_to_scene(self, obj_info_mesh, pose=None, adjust_z=True):
         """ Adding object to the scene and adjusting the z-component"""
         obj_info, obj_mesh = obj_info_mesh
         obj = self.object_loader.create_object(obj_info, obj_mesh, is_static=True)
         self.scene.add_object(obj)
+        self.objects.append(obj)
+        self.object_names.append(obj_info.name)
 
         pose = torch.eye(4) if pose is None else pose
-        pose = self.adjust_z_coord(obj=obj, pose=pose)
+        if adjust_z:
+            pose = self.adjust_z_coord(obj=obj, pose=pose)
         obj.set_pose(pose)
         return obj
 
@@ -145,6 +201,8 @@ class RoomAssembler:
         """ Removing an object from the scene """
         self.scene.remove_object(obj)
         self.object_loader.remove_object(obj.instance_index)
+        idx = next(i for i, o in enumerate(self.objects) if o is obj)
+        del self.objects[idx], self.object_names[idx]
         return
 
     def adjust_z_coord(self, obj, pose):
@@ -1,23 +1,48 @@
-from .ball_box import BallBoxScenario
-from .bowl import BowlScenario
-from .billiards import BillardsScenario
-from .bowling import BowlingScenario
-from .dice_roll import DiceRollScenario
-from .stack import StackScenario
-from .tabletop import TabletopScenario
-from .throw import ThrowScenario
-from .tidy import TidyScenario
-from .robopushing import RobopushingScenario
-
-SCENARIOS = {
-    "ball_box": BallBoxScenario,
-    "billards": BillardsScenario,
-    "bowl": BowlScenario,
-    "bowling": BowlingScenario,
-    "diceRoll": DiceRollScenario,
-    "stack": StackScenario,
-    "tabletop": TabletopScenario,
-    "throw": ThrowScenario,
-    "tidy": TidyScenario,
-    "robopushing": RobopushingScenario,
-}  #: All available scenarios and the string identifier with which they can be chosen. If the 'all' key (which maps to None) is provided as a command line argument, all scenarios are generated.
+import importlib
+from collections.abc import Mapping
+
+
+class ScenarioRegistry(Mapping):
+    """
+    Maps scenario identifiers to scenario classes. A scenario's module is only imported when its class is
+    requested, so that listing the available scenarios (e.g. for argparse) or running a single scenario does not
+    import all other scenarios and their backends.
+    """
+    def __init__(self, scenarios):
+        self._scenarios = scenarios  # identifier -> (module name, class name)
+        self._loaded = dict()
+
+    def __getitem__(self, scenario_id):
+        if scenario_id not in self._loaded:
+            module_name, class_name = self._scenarios[scenario_id]
+            module = importlib.import_module(f"{__name__}.{module_name}")
+            self._loaded[scenario_id] = getattr(module, class_name)
+        return self._loaded[scenario_id]
+
+    def __iter__(self):
+        return iter(self._scenarios)
+
+    def __len__(self):
+        return len(self._scenarios)
+
+
+SCENARIOS = ScenarioRegistry({
+    "ball_box": ("ball_box", "BallBoxScenario"),
+    "billards": ("billiards", "BillardsScenario"),
+    "bowl": ("bowl", "BowlScenario"),
+    "bowling": ("bowling", "BowlingScenario"),
+    "diceRoll": ("dice_roll", "DiceRollScenario"),
+    "stack": ("stack", "StackScenario"),
+    "tabletop": ("tabletop", "TabletopScenario"),
+    "throw": ("throw", "ThrowScenario"),
+    "tidy": ("tidy", "TidyScenario"),
+    "robopushing": ("robopushing", "RobopushingScenario"),
+})  #: All available scenarios and the string identifier with which they can be chosen. If the 'all' key (which maps to None) is provided as a command line argument, all scenarios are generated.
+
+
+def __getattr__(name):
+    # keeps 'from sl_cutscenes.scenarios import BowlScenario' working without importing every scenario up front
+    for scenario_id, (_, class_name) in SCENARIOS._scenarios.items():
+        if class_name == name:
+            return SCENARIOS[scenario_id]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
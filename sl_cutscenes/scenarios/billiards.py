@@ -12,11 +12,11 @@ from sl_cutscenes.scenarios.scenario import Scenario
 
 
 class BillardsScenario(Scenario):
-    def __init__(self, cfg, scene):
+    def __init__(self, cfg, scene, room=None):
         self.name = "Billards"
         self.config = SCENARIO_DEFAULTS["scenes"]["billards"]
         self.prep_time = 0.002  # during this time (in s), the scene will not be rendered
-        super(BillardsScenario, self).__init__(cfg, scene)   # also calls reset_sim()
+        super(BillardsScenario, self).__init__(cfg, scene, room=room)   # also calls reset_sim()
 
     def can_render(self):
         """
@@ -12,11 +12,11 @@ from sl_cutscenes.scenarios.scenario import Scenario
 
 
 class BowlScenario(Scenario):
-    def __init__(self, cfg, scene):
+    def __init__(self, cfg, scene, room=None):
         self.name = "Bowl"
         self.config = SCENARIO_DEFAULTS["scenes"]["bowl"]
         self.prep_time = 0.0  # during this time (in s), the scene will not be rendered
-        super(BowlScenario, self).__init__(cfg, scene)   # also calls reset_sim()
+        super(BowlScenario, self).__init__(cfg, scene, room=room)   # also calls reset_sim()
 
     def can_render(self):
         """
@@ -11,12 +11,12 @@ import sl_cutscenes.constants as CONSTANTS
 from sl_cutscenes.scenarios.scenario import Scenario
 
 class BowlingScenario(Scenario):
-    def __init__(self, cfg, scene):
+    def __init__(self, cfg, scene, room=None):
         self.name = "Bowling"
         self.config = SCENARIO_DEFAULTS["scenes"]["bowling"]
         self.prep_time = 1.000  # during this time (in s), the scene will not be rendered
         self.bowling_ball_loaded = False
-        super(BowlingScenario, self).__init__(cfg, scene)   # also calls reset_sim()
+        super(BowlingScenario, self).__init__(cfg, scene, room=room)   # also calls reset_sim()
 
     def can_render(self):
         """
@@ -87,6 +87,15 @@ class BowlingScenario(Scenario):
             self.update_camera_height(camera=cam, objs=[self.table]) for cam in self.cameras
         ]
 
+    def get_state_(self):
+        state = super(BowlingScenario, self).get_state_()
+        state["bowling_ball_loaded"] = self.bowling_ball_loaded
+        return state
+
+    def set_state_(self, state):
+        super(BowlingScenario, self).set_state_(state)
+        self.bowling_ball_loaded = state["bowling_ball_loaded"]
+
     def simulate(self):
         # add bowling ball after preparation time to ensure that the object tower stands still
         if self.sim_t > self.prep_time and not self.bowling_ball_loaded:
@@ -12,11 +12,11 @@ from sl_cutscenes.scenarios.scenario import Scenario
 
 
 class DiceRollScenario(Scenario):
-    def __init__(self, cfg, scene):
+    def __init__(self, cfg, scene, room=None):
         self.name = "DiceRoll"
         self.config = SCENARIO_DEFAULTS["scenes"]["dice_roll"]
         self.prep_time = 0.002  # during this time (in s), the scene will not be rendered
-        super(DiceRollScenario, self).__init__(cfg, scene)
+        super(DiceRollScenario, self).__init__(cfg, scene, room=room)
 
     def can_render(self):
         """
@@ -11,11 +11,11 @@ import sl_cutscenes.utils.utils as utils
 
 
 class RobopushingScenario(RobotScenario):
-    def __init__(self, cfg, scene):
+    def __init__(self, cfg, scene, room=None):
         self.name = "Robopushing"
         self.config = SCENARIO_DEFAULTS["scenes"]["robopushing"]
         self.prep_time = 0.000  # during this time (in s), the scene will not be rendered
-        super(RobopushingScenario, self).__init__(cfg, scene)   # also calls reset_sim()
+        super(RobopushingScenario, self).__init__(cfg, scene, room=room)   # also calls reset_sim()
 
     def can_render(self):
         """
@@ -74,8 +74,7 @@ class RobopushingScenario(RobotScenario):
                 random.uniform(self.config["pos"]["z_min"], self.config["pos"]["z_max"])
             ])
             obj_mod = {"mod_t": mod_t}
-            obj = self.add_object_to_scene(obj_info_mesh, False, **obj_mod)
-            obj = self.update_object_height(cur_obj=obj, objs=[self.table])
+            obj, _ = self.add_object_at_rest(obj_info_mesh, support=self.table, **obj_mod)
             
             # removing last object if colliding with anything else
             if self.is_there_collision():
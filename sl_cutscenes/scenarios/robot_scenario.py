@@ -2,18 +2,18 @@
 Abstract scenario subclass for defining robot scenarios
 """
 import torch
-import nimblephysics as nimble
 import pathlib
-import stillleben as sl
 from itertools import chain
 
 from sl_cutscenes import object_info
+from sl_cutscenes import resource_cache
+from sl_cutscenes.backends import sl, nimble
 from sl_cutscenes.scenarios.scenario import Scenario
 import sl_cutscenes.utils.utils as utils
 
 
 class RobotScenario(Scenario):
-    def __init__(self, cfg, scene):
+    def __init__(self, cfg, scene, room=None):
         assert cfg.physics_engine == 'nimble', "Robot scenarios require nimblephysics sim"
         self.nimble_world = nimble.simulation.World()
         self.nimble_world.setGravity([0, -9.81, 0])
@@ -21,7 +21,7 @@ class RobotScenario(Scenario):
         self.prop_sl_objects = []
         self.sim_steps_per_frame = cfg.sim_steps_per_frame
         self.num_sim_steps = 0
-        super(RobotScenario, self).__init__(cfg, scene)   # also calls reset_sim()
+        super(RobotScenario, self).__init__(cfg, scene, room=room)   # also calls reset_sim()
 
     def add_static_sl_to_nimble(self):
         for obj in self.scene.objects:
@@ -40,7 +40,7 @@ class RobotScenario(Scenario):
                     # transfer mesh
                     mesh_path = pathlib.Path(part.getShapeNode(0).getShape().getMeshPath())
                     obj_path = utils.stl_to_obj(mesh_path)
-                    mesh = sl.Mesh(obj_path)
+                    mesh = resource_cache.get_mesh(obj_path)
                     obj = sl.Object(mesh)
                     obj.metallic = 1.0
                     obj.roughness = 0.4
@@ -106,6 +106,17 @@ class RobotScenario(Scenario):
         self.decorate_scene()
         return
                 
+    def get_state_(self):
+        state = dict()  # robot scenarios keep their own nimble state instead of Scenario.nimble_states
+        state["nimble_state"] = self.nimble_state.clone()
+        state["num_sim_steps"] = self.num_sim_steps
+        return state
+
+    def set_state_(self, state):
+        self.nimble_state = state["nimble_state"].clone()
+        self.num_sim_steps = state["num_sim_steps"]
+        self.nimble_loaded = True
+
     def get_action(self):
         """ Default action, can be specified by scenario"""
         return torch.zeros(self.nimble_world.getActionSize())
@@ -1,23 +1,39 @@
 """
 Abstract class for defining scenarios
 """
-import random
+from __future__ import annotations
+
 from typing import Tuple
 import numpy as np
 from copy import deepcopy
 import torch
-import stillleben as sl
-import nimblephysics as nimble
 
 from sl_cutscenes.room_models import RoomAssembler
+from sl_cutscenes.room_library import get_library
 from sl_cutscenes.objects.mesh_loader import MeshLoader
 from sl_cutscenes.objects.object_loader import ObjectLoader
+from sl_cutscenes.objects.object_registry import ObjectRegistry
 from sl_cutscenes.objects.decorator_loader import DecoratorLoader
 from sl_cutscenes.lighting import get_lightmap
-from sl_cutscenes.camera import Camera
+from sl_cutscenes.camera import sample_camera_rig
 import sl_cutscenes.utils.utils as utils
 import sl_cutscenes.constants as CONSTANTS
 from sl_cutscenes import object_info
+from sl_cutscenes import resting_poses
+from sl_cutscenes.backends import sl, nimble
+from sl_cutscenes import tracing
+
+REST_PREP_TIME = 0.05  # preparation time (in s) of scenarios whose objects have all been spawned in resting poses
+
+
+class ScenarioSnapshot(object):
+    """ Simulation state of a scenario as captured by Scenario.snapshot() """
+    def __init__(self, sim_t, objects, state, num_loaded, camera_objs):
+        self.sim_t = sim_t
+        self.objects = objects  # (object, pose, linear velocity, angular velocity) of all scene objects
+        self.state = state  # scenario-specific state, see Scenario.get_state_()
+        self.num_loaded = num_loaded  # last assigned instance id
+        self.camera_objs = camera_objs
 
 
 class Scenario(object):
@@ -26,7 +42,11 @@ class Scenario(object):
     config = dict()
     name = 'scenario'
 
-    def __init__(self, cfg, scene: sl.Scene, randomize=True):
+    def __init__(self, cfg, scene: sl.Scene, randomize=True, room: RoomAssembler = None):
+        """
+        :param room: The room of a previous scenario in the same scene, which is reused instead of building a new one.
+            All other objects must have been removed from the scene (see generation.SceneRecycler).
+        """
         self.device = cfg.device
         self.viewer_mode = cfg.viewer
         self.scene = scene
@@ -34,8 +54,13 @@ class Scenario(object):
             utils.randomize()
 
         self.mesh_loader = MeshLoader()
-        self.object_loader = ObjectLoader(scenario_reset=True)
-        self.room_assembler = RoomAssembler(scene=self.scene)
+        self.object_registry = ObjectRegistry()  # all objects of this scenario's scene
+        self.object_loader = ObjectLoader(self.object_registry)
+        if room is None:
+            library = get_library(cfg.room_library) if cfg.room_library is not None else None
+            self.room_assembler = RoomAssembler(scene=self.scene, object_loader=self.object_loader, library=library)
+        else:
+            self.room_assembler = room.adopt(self.object_loader)
         self.decorator_loader = DecoratorLoader(scene=self.scene)
 
         self.meshes_loaded, self.objects_loaded = False, False
@@ -55,6 +80,7 @@ class Scenario(object):
         self.cam_dt = cfg.cam_dt
         self.physics_engine = cfg.physics_engine
         self.nimble_debug = cfg.nimble_debug
+        self.spawn_at_rest = cfg.spawn_at_rest
         self.reset_sim()
         return
 
@@ -82,26 +108,34 @@ class Scenario(object):
     def dynamic_objects(self):
         return self.object_loader.dynamic_objects
 
+    def get_object(self, instance_id):
+        """ :return: The object with the given instance id, or None """
+        return self.object_registry.get(instance_id)
+
     def set_camera_look_at(self, pos, lookat):
         self.scene.set_camera_look_at(position=pos, look_at=lookat)
 
     def can_render(self):
         raise NotImplementedError
 
+    @tracing.traced("decorate_scene")
     def decorate_scene(self):
         self.room_assembler.add_wall_furniture()
         self.decorator_loader.decorate_scene(object_loader=self.object_loader)
         return
 
+    @tracing.traced("finalize_scene")
     def finalize_scene(self):
         """ Scene setup stuff that has to be done after everything else """
         for obj in self.static_objects:
             obj.casts_shadows = False
 
+    @tracing.traced("setup_scene")
     def setup_scene(self):
         """ Default setup_scene. Can be overriden from specific scenes """
         _ = self.room_assembler.make_room()
 
+    @tracing.traced("setup_lighting")
     def setup_lighting(self):
         """ Default setup lighting. """
         self.scene.ambient_light = torch.tensor([0.2, 0.2, 0.2])
@@ -126,6 +160,7 @@ class Scenario(object):
 
             self.scene.manual_exposure = 3.0
 
+    @tracing.traced("collision_check")
     def get_separations(self):
         # assert len(self.dynamic_objects) > 0, "Objects must be added to dynamic_objects before computing collisions"
         self.scene.check_collisions()
@@ -151,6 +186,7 @@ class Scenario(object):
         """
         raise NotImplementedError
 
+    @tracing.traced("setup_objects")
     def setup_objects(self):
         """ """
         if self.objects_loaded:
@@ -168,29 +204,16 @@ class Scenario(object):
         """
         raise NotImplementedError
 
+    @tracing.traced("setup_cameras")
     def setup_cameras(self):
         if self.cameras_loaded:
             return
         print("camera setup...")
-        self.cameras = []
         self.camera_objs = []
-        cam_config = self.config["camera"]
-        base_lookat = cam_config["base_lookat"]
-
-        # pick default ori. angle and (n_cameras-1) other angles from a linspace of angles that are 5 degrees apart
-        default_ori_angle = cam_config["orientation_angle_default"]
-        cam_ori_angles = [0] + random.sample(np.linspace(0, 360, 72+1).tolist()[1:-1], k=self.n_cameras-1)
-        cam_ori_angles = [(angle + default_ori_angle) % 360 for angle in cam_ori_angles]
-        # TODO parameters 'orientation_angle_min/max' are not yet used!
-
-        for i, cam_ori_angle in enumerate(cam_ori_angles):
-            cam_elev_angle = random.uniform(cam_config["elevation_angle_min"], cam_config["elevation_angle_max"])
-            cam_dist = random.uniform(cam_config["distance_min"], cam_config["distance_max"])
-            cam_lookat = deepcopy(base_lookat)
-            cam_name = f"cam_{str(i).zfill(2)}"
-            cam_stereo_positions = ["left", "right"] if self.coplanar_stereo else ["mono"]
-            self.cameras.append(Camera(cam_name, self.cam_dt, cam_elev_angle, cam_ori_angle, cam_dist, cam_lookat,
-                                       self.coplanar_stereo_dist, cam_stereo_positions, self.cam_movement_complexity))
+        self.cameras = sample_camera_rig(self.config["camera"], self.n_cameras, self.cam_dt,
+                                         coplanar_stereo=self.coplanar_stereo,
+                                         coplanar_stereo_dist=self.coplanar_stereo_dist,
+                                         movement_complexity=self.cam_movement_complexity)
         self.setup_cameras_()  # e.g. scenario-specific height adjustment
         self.setup_camera_objs()
         self.cameras_loaded = True
@@ -247,6 +270,88 @@ class Scenario(object):
         else:
             raise ValueError(f"invalid physics_engine parameter: {self.physics_engine}")
 
+    @tracing.traced("settle")
+    def settle(self):
+        """
+        Simulates the preparation phase, in which the objects drop and settle, up to the last step before the
+        scenario's event starts (e.g. before the gripper or the bowling ball is added).
+        """
+        while self.sim_t + self.sim_dt <= getattr(self, "prep_time", 0.0):
+            self.simulate()
+
+    def snapshot(self) -> ScenarioSnapshot:
+        """ Captures the poses and velocities of all objects, the nimble state and the scenario-specific state """
+        objects = [(obj, obj.pose().clone(), obj.linear_velocity.clone(), obj.angular_velocity.clone())
+                   for obj in self.scene.objects]
+        return ScenarioSnapshot(self.sim_t, objects, self.get_state_(), self.object_registry.num_loaded,
+                                list(self.camera_objs))
+
+    @tracing.traced("restore")
+    def restore(self, snapshot: ScenarioSnapshot):
+        """
+        Resets the scenario to a snapshot taken earlier: objects added since are removed, objects removed since
+        (e.g. the camera dummies of rerolled cameras) are added again with their instance ids, and all objects of
+        the snapshot get their poses and velocities back. The counter of assigned instance ids is reset as well,
+        so objects added after restoring get the same instance ids as after taking the snapshot.
+        The cameras start their trajectories anew.
+        """
+        snapshot_ids = {id(obj) for obj, _, _, _ in snapshot.objects}
+        scene_ids = {id(obj) for obj in self.scene.objects}
+        for obj in reversed(list(self.scene.objects)):
+            if id(obj) not in snapshot_ids:
+                if self.object_registry.get(getattr(obj, "instance_index", None)) is obj:
+                    self.remove_obj_from_scene(obj, decrement_ins_idx=False)
+                else:
+                    self.scene.remove_object(obj)
+        for obj, pose, linear_velocity, angular_velocity in snapshot.objects:
+            if id(obj) not in scene_ids:
+                self.scene.add_object(obj)
+                if hasattr(obj, "instance_index"):
+                    self.object_registry.add(obj, instance_id=obj.instance_index)
+            obj.set_pose(pose.clone())
+            obj.linear_velocity = linear_velocity.clone()
+            obj.angular_velocity = angular_velocity.clone()
+        self.object_registry.num_loaded = snapshot.num_loaded
+        self.camera_objs = list(snapshot.camera_objs)
+        self.sim_t = snapshot.sim_t
+        self.set_state_(snapshot.state)
+        for cam in self.cameras:
+            cam.reset_cam()
+
+    def get_state_(self):
+        """
+        Scenario-specific state that is not covered by the object poses and velocities, e.g. whether an object
+        has been added yet. Can be extended by scenarios.
+        """
+        state = dict()
+        if self.physics_engine == "nimble" and self.nimble_loaded:
+            state["nimble_states"] = list(self.nimble_states)
+        return state
+
+    def set_state_(self, state):
+        if self.physics_engine == "nimble":
+            self.nimble_loaded = "nimble_states" in state
+            if self.nimble_loaded:
+                self.nimble_states = list(state["nimble_states"])
+                self.nimble_world.setState(self.nimble_states[-1])
+
+    def reroll_cameras(self):
+        """
+        Replaces the cameras by newly sampled ones. The new camera dummies take over the instance ids of the old
+        ones, so that objects added afterwards (e.g. the bowling ball) get the same instance ids in every variant.
+        """
+        old_ids = [obj.instance_index for obj in self.camera_objs]
+        num_loaded = self.object_registry.num_loaded
+        for obj in self.camera_objs:
+            self.remove_obj_from_scene(obj, decrement_ins_idx=False)
+        self.cameras_loaded = False
+        self.setup_cameras()
+        for obj, instance_id in zip(self.camera_objs, old_ids):
+            self.object_registry.remove(obj.instance_index, decrement_ins_idx=False)
+            self.object_registry.add(obj, instance_id=instance_id)
+        self.object_registry.num_loaded = num_loaded
+
+    @tracing.traced("setup_nimble")
     def setup_nimble_(self):
         '''
         Creates a clone of the current stillleben scene for nimblephysics, enabling physics simulation there.
@@ -295,6 +400,26 @@ class Scenario(object):
         self.scene.add_object(obj)
         return obj
 
+    def add_object_at_rest(self, obj_info_mesh: Tuple[object_info.ObjectInfo, sl.Mesh], support: sl.Object,
+                           **obj_mod):
+        """
+        Adds a dynamic object standing on the support object in one of its stable resting poses (see
+        resting_poses.py), at the x/y position of 'mod_t'. If resting poses are not enabled or not known for
+        the object, it is placed on the support in its default orientation and left to settle, as before.
+        :return: The object and whether it has been placed in a resting pose
+        """
+        obj_info, _ = obj_info_mesh
+        resting_pose = resting_poses.sample_resting_pose(obj_info.name) if self.spawn_at_rest else None
+        if resting_pose is None:
+            obj = self.add_object_to_scene(obj_info_mesh, False, **obj_mod)
+            return self.update_object_height(cur_obj=obj, objs=[support]), False
+        rotation, height = resting_pose
+        pose = torch.eye(4)
+        pose[:3, :3] = rotation
+        pose[:2, 3] = obj_mod.pop("mod_t")[:2]
+        pose[2, 3] = self.get_obj_z_offset(support) + height
+        return self.add_object_to_scene(obj_info_mesh, False, mod_pose=pose, **obj_mod), True
+
     def remove_obj_from_scene(self, obj: sl.Object, decrement_ins_idx: bool=True):
         self.scene.remove_object(obj)
         self.object_loader.remove_object(obj.instance_index, decrement_ins_idx=decrement_ins_idx)
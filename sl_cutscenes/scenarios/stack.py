@@ -11,11 +11,11 @@ from sl_cutscenes.scenarios.scenario import Scenario
 
 
 class StackScenario(Scenario):
-    def __init__(self, cfg, scene):
+    def __init__(self, cfg, scene, room=None):
         self.name = "Stack"
         self.prep_time = 0.002  # during this time (in s), the scene will not be rendered
         self.config = SCENARIO_DEFAULTS["scenes"]["stack"]
-        super(StackScenario, self).__init__(cfg, scene)   # also calls reset_sim()
+        super(StackScenario, self).__init__(cfg, scene, room=room)   # also calls reset_sim()
 
     def can_render(self):
         """
@@ -10,11 +10,11 @@ from sl_cutscenes.scenarios.scenario import Scenario
 
 
 class TabletopScenario(Scenario):
-    def __init__(self, cfg, scene):
+    def __init__(self, cfg, scene, room=None):
         self.name = "Tabletop"
         self.config = SCENARIO_DEFAULTS["scenes"]["tabletop"]
         self.prep_time = 0.000  # during this time (in s), the scene will not be rendered
-        super(TabletopScenario, self).__init__(cfg, scene)   # also calls reset_sim()
+        super(TabletopScenario, self).__init__(cfg, scene, room=room)   # also calls reset_sim()
 
     def can_render(self):
         """
@@ -12,13 +12,13 @@ from sl_cutscenes.scenarios.scenario import Scenario
 
 
 class ThrowScenario(Scenario):
-    def __init__(self, cfg, scene):
+    def __init__(self, cfg, scene, room=None):
         self.name = "Throw"
         self.config = SCENARIO_DEFAULTS["scenes"]["throw"]
         self.prep_time = 0  # during this time (in s), the scene will not be rendered
         self.meshes_loaded = False
         self.bowling_ball_loaded = False
-        super(ThrowScenario, self).__init__(cfg, scene)   # also calls reset_sim()
+        super(ThrowScenario, self).__init__(cfg, scene, room=room)   # also calls reset_sim()
 
     def can_render(self):
         """
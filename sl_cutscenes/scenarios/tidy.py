@@ -4,15 +4,15 @@ EE = 'End Effector', which is the gripper / suction cup
 """
 import torch
 import random
-import stillleben as sl
+from sl_cutscenes.backends import sl
 
 from sl_cutscenes.constants import SCENARIO_DEFAULTS
 import sl_cutscenes.constants as CONSTANTS
-from sl_cutscenes.scenarios.scenario import Scenario
+from sl_cutscenes.scenarios.scenario import Scenario, REST_PREP_TIME
 
 
 class TidyScenario(Scenario):
-    def __init__(self, cfg, scene):
+    def __init__(self, cfg, scene, room=None):
         self.name = "Tidy"
         self.config = SCENARIO_DEFAULTS["scenes"]["tidy"]
         self.prep_time = 1.000  # during this time (in s), the scene will not be rendered
@@ -23,7 +23,7 @@ class TidyScenario(Scenario):
         self.acceleration = 1.0  # in m/s²
         self.ee = None
         self.robot_sim = None
-        super(TidyScenario, self).__init__(cfg, scene)   # also calls reset_sim()
+        super(TidyScenario, self).__init__(cfg, scene, room=room)   # also calls reset_sim()
 
     @property
     def ee_pose(self):
@@ -60,6 +60,7 @@ class TidyScenario(Scenario):
         self.z_offset = self.table.pose()[2, -1]
 
         # drop 10 random YCB-Video objects onto the table
+        all_at_rest = True
         for obj_info_mesh in random.choices(ycbv_info_meshes, k=3):
             print(" >>> trying to add object")
             mod_t = torch.tensor([
@@ -68,14 +69,18 @@ class TidyScenario(Scenario):
                 random.uniform(self.config["pos"]["z_min"], self.config["pos"]["z_max"])
             ])
             obj_mod = {"mod_t": mod_t}
-            obj = self.add_object_to_scene(obj_info_mesh, False, **obj_mod)
-            obj = self.update_object_height(cur_obj=obj, objs=[self.table])
+            obj, at_rest = self.add_object_at_rest(obj_info_mesh, support=self.table, **obj_mod)
+            all_at_rest = all_at_rest and at_rest
 
             # removing last object if colliding with anything else
             if self.is_there_collision():
                 print(" >>> object colliding!")
                 self.remove_obj_from_scene(obj)
 
+        # objects spawned in resting poses don't need to settle before the gripper starts
+        if all_at_rest:
+            self.prep_time = min(self.prep_time, REST_PREP_TIME)
+
     def setup_robot_sim(self):
         if not self.objects_loaded:
             self.setup_objects()
@@ -126,6 +131,23 @@ class TidyScenario(Scenario):
             self.update_camera_height(camera=cam, objs=[self.table]) for cam in self.cameras
         ]
 
+    def get_state_(self):
+        state = super(TidyScenario, self).get_state_()
+        if self.ee is not None:
+            state["robot"] = (self.ee, self.robot_sim, self.start_ee_pose_.clone(), self.ee_velocity,
+                              [waypoint.clone() for waypoint in self.waypoints])
+        state["remaining_pause"] = self.remaining_pause
+        return state
+
+    def set_state_(self, state):
+        super(TidyScenario, self).set_state_(state)
+        self.ee, self.robot_sim = None, None  # set up again after the preparation time
+        if "robot" in state:
+            self.ee, self.robot_sim, start_ee_pose, self.ee_velocity, waypoints = state["robot"]
+            self.start_ee_pose_ = start_ee_pose.clone()
+            self.waypoints = [waypoint.clone() for waypoint in waypoints]
+        self.remaining_pause = state["remaining_pause"]
+
     def simulate(self):
 
         self.sim_t += self.sim_dt
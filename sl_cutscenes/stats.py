@@ -0,0 +1,190 @@
+"""
+Streaming statistics of the generated annotations.
+
+The BOPWriter feeds the per-object numbers it writes to scene_gt_info.json (pixel counts, bounding boxes,
+visibility) into an AnnotationStats accumulator while generating. The accumulators of all cameras of an
+episode are saved next to its data, and they are merged per scenario and for the whole run into
+'annotation_stats.json' in the output directory, so that no post-hoc pass over the dataset is needed.
+Accumulators can be merged in any order; all statistics are exact except for the histogram binning.
+"""
+import json
+from collections import Counter
+
+import numpy as np
+
+PIXEL_BINS = [0, 1, 10, 100, 1000, 10000, 100000, 1000000, 10000000]  # larger values go to the last bin
+FRACTION_BINS = np.linspace(0.0, 1.0, 21).tolist()
+INSTANCE_BINS = [0, 1, 2, 5, 10, 20, 50, 100, 1000]
+
+QUANTITY_BINS = {
+    "px_count_all": PIXEL_BINS,
+    "px_count_visib": PIXEL_BINS,
+    "bbox_obj_area": PIXEL_BINS,
+    "bbox_visib_area": PIXEL_BINS,
+    "visib_fract": FRACTION_BINS,
+    "bbox_visib_fract": FRACTION_BINS,
+    "instances_per_frame": INSTANCE_BINS,
+}  #: per-object quantities (and the number of instances per frame) with their histogram bin edges
+
+
+class RunningStat(object):
+    """
+    Count, mean, variance, min, max and a fixed-bin histogram of a stream of values.
+    """
+    def __init__(self, bin_edges):
+        self.bin_edges = np.asarray(bin_edges, dtype=np.float64)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared deviations from the mean
+        self.min = np.inf
+        self.max = -np.inf
+        self.hist = np.zeros(len(self.bin_edges) - 1, dtype=np.int64)
+
+    @property
+    def var(self):
+        return self.m2 / self.count if self.count > 0 else 0.0
+
+    def update(self, values):
+        """ Adds a batch of values """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return self
+        batch = RunningStat(self.bin_edges)
+        batch.count = values.size
+        batch.mean = float(values.mean())
+        batch.m2 = float(((values - batch.mean) ** 2).sum())
+        batch.min, batch.max = float(values.min()), float(values.max())
+        clipped = np.clip(values, self.bin_edges[0], self.bin_edges[-1])
+        batch.hist = np.histogram(clipped, bins=self.bin_edges)[0]
+        return self.merge(batch)
+
+    def merge(self, other):
+        """ Merges 'other' into this accumulator (Chan et al.'s parallel variance) """
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.hist = self.hist + other.hist
+        self.count = count
+        return self
+
+    def to_dict(self):
+        empty = self.count == 0
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "std": float(np.sqrt(self.var)),
+            "var": self.var,
+            "min": None if empty else self.min,
+            "max": None if empty else self.max,
+            "hist": {"edges": self.bin_edges.tolist(), "counts": self.hist.tolist()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stat = cls(data["hist"]["edges"])
+        stat.count = data["count"]
+        stat.mean = data["mean"]
+        stat.m2 = data["var"] * data["count"]
+        if stat.count > 0:
+            stat.min, stat.max = data["min"], data["max"]
+        stat.hist = np.asarray(data["hist"]["counts"], dtype=np.int64)
+        return stat
+
+
+class AnnotationStats(object):
+    """
+    Accumulates the annotation statistics of any number of frames.
+    """
+    def __init__(self):
+        self.num_frames = 0
+        self.stats = {quantity: RunningStat(bins) for quantity, bins in QUANTITY_BINS.items()}
+        self.class_freqs = Counter()  # class id -> number of annotated object instances over all frames
+
+    def add_frame(self, px_count_all, px_count_visib, bbox_obj, bbox_visib, class_ids):
+        """
+        Adds the annotations of all objects of a frame.
+        :param px_count_all: Number of pixels of each object's silhouette
+        :param px_count_visib: Number of visible pixels of each object
+        :param bbox_obj: Silhouette bounding box (x, y, w, h) of each object
+        :param bbox_visib: Bounding box (x, y, w, h) of the visible part of each object
+        :param class_ids: Class id of each object
+        """
+        px_count_all = np.asarray(px_count_all, dtype=np.float64)
+        px_count_visib = np.asarray(px_count_visib, dtype=np.float64)
+        bbox_obj = np.asarray(bbox_obj, dtype=np.float64).reshape(-1, 4)
+        bbox_visib = np.asarray(bbox_visib, dtype=np.float64).reshape(-1, 4)
+        bbox_obj_area = bbox_obj[:, 2] * bbox_obj[:, 3]
+        bbox_visib_area = bbox_visib[:, 2] * bbox_visib[:, 3]
+
+        # same definitions as for scene_gt_info.json and scripts/compute_data_stats.py
+        with np.errstate(divide="ignore", invalid="ignore"):
+            visib_fract = np.where(px_count_all > 0, px_count_visib / px_count_all, 0.0)
+            bbox_visib_fract = np.where(bbox_obj_area > 0, bbox_visib_area / bbox_obj_area, 0.0)
+
+        self.num_frames += 1
+        self.stats["px_count_all"].update(px_count_all)
+        self.stats["px_count_visib"].update(px_count_visib)
+        self.stats["bbox_obj_area"].update(bbox_obj_area)
+        self.stats["bbox_visib_area"].update(bbox_visib_area)
+        self.stats["visib_fract"].update(visib_fract)
+        self.stats["bbox_visib_fract"].update(bbox_visib_fract)
+        self.stats["instances_per_frame"].update([len(class_ids)])
+        self.class_freqs.update(int(class_id) for class_id in class_ids)
+
+    def merge(self, other):
+        self.num_frames += other.num_frames
+        for quantity, stat in self.stats.items():
+            stat.merge(other.stats[quantity])
+        self.class_freqs.update(other.class_freqs)
+        return self
+
+    def to_dict(self):
+        total = sum(self.class_freqs.values())
+        return {
+            "num_frames": self.num_frames,
+            "stats": {quantity: stat.to_dict() for quantity, stat in self.stats.items()},
+            "class_freqs": {str(class_id): freq for class_id, freq in sorted(self.class_freqs.items())},
+            "norm_class_freqs": {str(class_id): freq / total for class_id, freq in sorted(self.class_freqs.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.num_frames = data["num_frames"]
+        stats.stats = {quantity: RunningStat.from_dict(stat) for quantity, stat in data["stats"].items()}
+        stats.class_freqs = Counter({int(class_id): freq for class_id, freq in data["class_freqs"].items()})
+        return stats
+
+    def save(self, fp):
+        with open(fp, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, fp):
+        with open(fp, "r") as f:
+            return cls.from_dict(json.load(f))
+
+
+def save_run_stats(fp, stats_per_scenario):
+    """ Saves the stats of a generation run: merged over all scenarios and for each scenario """
+    total = AnnotationStats()
+    for stats in stats_per_scenario.values():
+        total.merge(stats)
+    run_stats = {
+        "all": total.to_dict(),
+        "scenarios": {name: stats.to_dict() for name, stats in stats_per_scenario.items()},
+    }
+    with open(fp, "w") as f:
+        json.dump(run_stats, f, indent=2)
+
+
+def load_run_stats(fp):
+    """ :return: The per-scenario stats (scenario name -> AnnotationStats) of a file written by save_run_stats() """
+    with open(fp, "r") as f:
+        run_stats = json.load(f)
+    return {name: AnnotationStats.from_dict(stats) for name, stats in run_stats["scenarios"].items()}
@@ -0,0 +1,167 @@
+"""
+Lightweight tracing of the generation hot paths.
+
+Code is instrumented with nestable spans and counters:
+
+    from sl_cutscenes import tracing
+
+    with tracing.span("render", cam=cam.name):
+        ...
+    tracing.counter("collision_retries", n=n_errors)
+
+While tracing is disabled (the default), span() returns a shared no-op context manager and counter() returns
+immediately, so the instrumentation does not cost anything noticeable. If enabled (e.g. with '--trace'),
+the events are collected and can be saved as a Chrome trace / Perfetto JSON file (chrome://tracing, ui.perfetto.dev).
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class _NullSpan(object):
+    """ No-op span that is handed out while tracing is disabled """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.tracer.add_complete_event(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+
+class Tracer(object):
+    """
+    Collects trace events in the Chrome trace event format.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self._local = threading.local()  # 'captured': list of the current thread's events while in capture()
+
+    def reset(self):
+        """ Drops all collected events, e.g. when a new episode starts """
+        self.events = []
+        self.origin = time.perf_counter()
+
+    def _us(self, t):
+        if getattr(self._local, "captured", None) is not None:
+            return t * 1e6  # captured events are re-based when they are added with add_captured()
+        return (t - self.origin) * 1e6
+
+    def _append(self, event):
+        captured = getattr(self._local, "captured", None)
+        (self.events if captured is None else captured).append(event)  # list.append is atomic
+
+    @contextmanager
+    def capture(self, events):
+        """
+        Collects the events of the current thread in the given list instead of the tracer's, e.g. for work done
+        in a background thread on behalf of an episode that has not started yet (see add_captured()).
+        """
+        self._local.captured = events
+        try:
+            yield events
+        finally:
+            self._local.captured = None
+
+    def add_captured(self, events):
+        """ Adds events collected by capture() relative to the current origin (earlier events get negative times) """
+        self.events.extend(dict(event, ts=event["ts"] - self.origin * 1e6) for event in events)
+
+    def add_complete_event(self, name, start, end, args=None):
+        event = {"name": name, "ph": "X", "ts": self._us(start), "dur": (end - start) * 1e6,
+                 "pid": self.pid, "tid": threading.get_ident()}
+        if args:
+            event["args"] = args
+        self._append(event)
+
+    def add_counter_event(self, name, values):
+        self._append({"name": name, "ph": "C", "ts": self._us(time.perf_counter()),
+                      "pid": self.pid, "tid": threading.get_ident(), "args": values})
+
+    def durations(self):
+        """ :return: A dict mapping span names to lists of their durations in seconds """
+        durations = defaultdict(list)
+        for event in self.events:
+            if event["ph"] == "X":
+                durations[event["name"]].append(event["dur"] / 1e6)
+        return dict(durations)
+
+    def counters(self):
+        """ :return: A dict mapping counter names to the sum of each of their values """
+        counters = defaultdict(lambda: defaultdict(float))
+        for event in self.events:
+            if event["ph"] == "C":
+                for key, value in event["args"].items():
+                    counters[event["name"]][key] += value
+        return {name: dict(values) for name, values in counters.items()}
+
+    def save(self, fp):
+        """ Writes the collected events to a Chrome trace / Perfetto JSON file """
+        with open(fp, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+TRACER = Tracer()
+
+
+def enable():
+    TRACER.enabled = True
+
+
+def disable():
+    TRACER.enabled = False
+
+
+def is_enabled():
+    return TRACER.enabled
+
+
+def span(name, **args):
+    """ Context manager measuring the enclosed code block as a (nestable) span """
+    if not TRACER.enabled:
+        return _NULL_SPAN
+    return _Span(TRACER, name, args)
+
+
+def counter(name, **values):
+    """ Records the given numeric values under the counter 'name' """
+    if TRACER.enabled:
+        TRACER.add_counter_event(name, values)
+
+
+def traced(name=None):
+    """ Decorator that measures every call of the decorated function as a span """
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapped(*args, **kwargs):
+            if not TRACER.enabled:
+                return fn(*args, **kwargs)
+            with _Span(TRACER, span_name, None):
+                return fn(*args, **kwargs)
+        return wrapped
+    return decorator
@@ -0,0 +1,134 @@
+"""
+Sim-only trajectory logs: with main.py's '--record-trajectories', an episode is only simulated, and the poses of
+all scene objects and the camera positions at every frame are written to '<episode>.traj.npz' instead of rendered
+frames. The logs are rendered afterwards by replay.py (scripts/replay_trajectories.py), as often as needed, with the
+recorded or with new camera rigs and at any resolution, and in parallel worker processes.
+
+A log is a compressed .npz file with the arrays
+ - 'poses': (F, N, 3, 4) float32 object-to-world poses of the N objects at each of the F frames
+ - 'present': (F, N) bool, whether the object is part of the scene at that frame
+ - 'annotated': (F, N) bool, whether the object is annotated at that frame (the scenario's dynamic objects)
+ - 'cam_positions', 'cam_lookats': (F, C, S, 3) float32 positions and look-at points of the C cameras
+   with S stereo positions each
+ - 'meta': a JSON string with the objects' meshes and materials, the lighting, the camera rig and the frame rate
+Meshes and light maps are referenced by the file they have been loaded from (see resource_cache.get_source()).
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from sl_cutscenes import resource_cache
+
+TRAJECTORY_VERSION = 2
+
+
+def tolist(value):
+    return value.tolist() if isinstance(value, torch.Tensor) else value
+
+
+def mesh_source(mesh):
+    source = resource_cache.get_source(mesh)
+    if source is None:
+        raise ValueError("can't record an object whose mesh has not been loaded through the resource cache")
+    path, flags, scale, class_id = source
+    return {"path": path, "flags": None if flags is None else int(flags), "scale": scale, "class_id": class_id}
+
+
+class TrajectoryRecorder(object):
+    """ Records the state of a scenario at every frame of an episode, see the module docstring """
+    def __init__(self, scenario, sim_fps):
+        self.scenario = scenario
+        self.sim_fps = sim_fps
+        self.objects = []  # all objects that have been part of the scene, in order of appearance
+        self.indices = dict()  # id(object) -> index in self.objects
+        self.frames = []  # per frame: (poses, present and annotated object indices, camera positions and lookats)
+        self.lighting = self.get_lighting(scenario.scene)
+
+    @staticmethod
+    def get_lighting(scene):
+        lightmap = None if scene.light_map is None else resource_cache.get_source(scene.light_map)
+        return {"ambient_light": tolist(scene.ambient_light), "light_map": lightmap,
+                "light_directions": tolist(scene.light_directions), "light_colors": tolist(scene.light_colors),
+                "manual_exposure": float(scene.manual_exposure)}
+
+    def record(self):
+        """ Records the current frame. The cameras are not advanced (see generation.record_trajectory()) """
+        scene_objects = self.scenario.scene.objects
+        for obj in scene_objects:
+            if id(obj) not in self.indices:
+                self.indices[id(obj)] = len(self.objects)
+                self.objects.append(obj)
+        present = [self.indices[id(obj)] for obj in scene_objects]
+        annotated = [self.indices[id(obj)] for obj in self.scenario.dynamic_objects if id(obj) in self.indices]
+        poses = {idx: self.objects[idx].pose()[:3].cpu().numpy().astype(np.float32) for idx in present}
+        cam_positions = [[cam.get_pos(pos).tolist() for pos in cam.stereo_positions] for cam in self.scenario.cameras]
+        cam_lookats = [[cam.get_lookat(pos).tolist() for pos in cam.stereo_positions] for cam in self.scenario.cameras]
+        self.frames.append((poses, present, annotated, cam_positions, cam_lookats))
+
+    def get_meta(self):
+        scenario = self.scenario
+        objects = [{
+            "mesh": mesh_source(obj.mesh),
+            "instance_index": getattr(obj, "instance_index", None),
+            "static": bool(obj.static),
+            "metallic": float(obj.metallic),
+            "roughness": float(obj.roughness),
+            "casts_shadows": bool(getattr(obj, "casts_shadows", True)),
+        } for obj in self.objects]
+        cameras = scenario.cameras
+        rig = {
+            "config": {key: tolist(value) for key, value in scenario.config["camera"].items()},
+            "base_lookat": tolist(cameras[0].start_base_lookat),
+            "n_cameras": len(cameras),
+            "cam_dt": scenario.cam_dt,
+            "coplanar_stereo": scenario.coplanar_stereo,
+            "coplanar_stereo_dist": scenario.coplanar_stereo_dist,
+            "movement_complexity": scenario.cam_movement_complexity,
+            "names": [cam.name for cam in cameras],
+            "stereo_positions": cameras[0].stereo_positions,
+        }
+        return {"version": TRAJECTORY_VERSION, "scenario": scenario.name, "sim_fps": self.sim_fps,
+                "objects": objects, "lighting": self.lighting, "camera_rig": rig}
+
+    def save(self, fp):
+        num_frames, num_objects = len(self.frames), len(self.objects)
+        poses = np.zeros((num_frames, num_objects, 3, 4), dtype=np.float32)
+        present = np.zeros((num_frames, num_objects), dtype=bool)
+        annotated = np.zeros((num_frames, num_objects), dtype=bool)
+        for f, (frame_poses, frame_present, frame_annotated, _, _) in enumerate(self.frames):
+            for idx, pose in frame_poses.items():
+                poses[f, idx] = pose
+            present[f, frame_present] = True
+            annotated[f, frame_annotated] = True
+        cam_positions = np.array([frame[3] for frame in self.frames], dtype=np.float32)
+        cam_lookats = np.array([frame[4] for frame in self.frames], dtype=np.float32)
+        Path(fp).parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(fp, poses=poses, present=present, annotated=annotated, cam_positions=cam_positions,
+                            cam_lookats=cam_lookats, meta=np.array(json.dumps(self.get_meta())))
+
+
+class Trajectory(object):
+    """ A trajectory log as written by TrajectoryRecorder.save() """
+    def __init__(self, fp):
+        self.path = Path(fp)
+        with np.load(fp) as data:
+            self.meta = json.loads(str(data["meta"]))
+            if self.meta.get("version") != TRAJECTORY_VERSION:
+                raise ValueError(f"trajectory '{fp}' has version {self.meta.get('version')}, "
+                                 f"expected {TRAJECTORY_VERSION}")
+            self.poses = data["poses"]
+            self.present = data["present"]
+            self.annotated = data["annotated"]
+            self.cam_positions = data["cam_positions"]
+            self.cam_lookats = data["cam_lookats"]
+
+    @property
+    def name(self):
+        """ The episode name, e.g. '000003_tidy' """
+        return self.path.name[:-len(".traj.npz")]
+
+    @property
+    def num_frames(self):
+        return len(self.poses)
@@ -1,6 +1,8 @@
 """
 Utils methods
 """
+from __future__ import annotations
+
 import sys
 
 sys.path.append(".")
@@ -13,19 +15,16 @@ import tempfile
 
 import torch
 import argparse
-import stillleben as sl
 
 import sl_cutscenes.constants as CONSTANTS
 from sl_cutscenes import object_info
-import nimblephysics as nimble
+from sl_cutscenes.backends import sl, nimble, scipy_transform
 from pathlib import Path
 
 import subprocess
 import pathlib
 import shlex
 
-from scipy.spatial.transform import Rotation as R
-
 PI = torch.acos(torch.tensor(-1))
 TAB = "    "
 # z -> x, y -> z, x->y
@@ -115,11 +114,11 @@ def get_mat_from_rpy(rpy : torch.Tensor):
 
 
 def nimble_to_sl_rot(nimble_rot):
-    return P @ torch.from_numpy(R.from_rotvec(nimble_rot.numpy()).as_matrix())
+    return P @ torch.from_numpy(scipy_transform.Rotation.from_rotvec(nimble_rot.numpy()).as_matrix())
 
 
 def sl_to_nimble_rot(sl_rot):
-    return torch.from_numpy(R.from_matrix((P.T @ sl_rot.double()).numpy()).as_rotvec())
+    return torch.from_numpy(scipy_transform.Rotation.from_matrix((P.T @ sl_rot.double()).numpy()).as_rotvec())
 
 
 def get_rand_num(N=1, low=0, high=1):
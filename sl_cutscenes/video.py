@@ -0,0 +1,103 @@
+"""
+Incremental video encoding: RGB frames are piped into an ffmpeg subprocess as they are produced,
+so that an episode's video is finished when its last frame has been written.
+"""
+import queue
+import shutil
+import subprocess
+import threading
+
+import numpy as np
+
+QUEUE_SIZE = 8  # frames buffered between the writer and the encoder before write() blocks
+
+
+def get_ffmpeg_exe():
+    """ The ffmpeg binary bundled with imageio-ffmpeg (a moviepy dependency), or the one on the PATH """
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        exe = shutil.which("ffmpeg")
+        if exe is None:
+            raise RuntimeError("Streaming videos requires ffmpeg (pip install imageio-ffmpeg)")
+        return exe
+
+
+class VideoSink(object):
+    """
+    Encodes a stream of RGB frames into an H.264 mp4 file. The encoder is started with the first frame,
+    whose size determines the video size. Frames are handed to a feeder thread, so that writing a frame
+    only blocks if the encoder falls behind by more than QUEUE_SIZE frames.
+    """
+    def __init__(self, path, fps, codec="libx264", crf=18, preset="veryfast"):
+        self.path = path
+        self.fps = fps  # every frame is kept; the playback rate is set at encode time
+        self.codec = codec
+        self.crf = crf
+        self.preset = preset
+        self.size = None
+        self.process = None
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.feeder = None
+        self.error = None
+
+    def _start(self, width, height):
+        cmd = [
+            get_ffmpeg_exe(), "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-framerate", str(self.fps), "-i", "-",
+            "-an", "-c:v", self.codec, "-preset", self.preset, "-crf", str(self.crf),
+            "-pix_fmt", "yuv420p", "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",  # yuv420p needs even sizes
+            str(self.path)
+        ]
+        self.size = (width, height)
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.feeder = threading.Thread(target=self._feed, daemon=True)
+        self.feeder.start()
+
+    def _feed(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            try:
+                self.process.stdin.write(frame)
+            except (BrokenPipeError, OSError) as e:
+                self.error = e  # keep draining the queue so that write() never blocks forever
+        try:
+            self.process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+
+    def write(self, rgb):
+        """ :param rgb: HxWx3 uint8 image (torch tensor or numpy array) """
+        rgb = np.ascontiguousarray(rgb.numpy() if hasattr(rgb, "numpy") else rgb, dtype=np.uint8)
+        height, width = rgb.shape[:2]
+        if self.process is None:
+            self._start(width, height)
+        elif (width, height) != self.size:
+            raise ValueError(f"frame size {width}x{height} differs from video size {self.size[0]}x{self.size[1]}")
+        if self.error is not None:
+            raise RuntimeError(f"video encoder for {self.path} failed: {self.error}")
+        self.queue.put(rgb.tobytes())
+
+    def close(self, discard=False):
+        """ Waits for the encoder to finish the video. If 'discard' is set, the encoder is stopped right away. """
+        if self.process is None:
+            return
+        if discard:
+            self.process.kill()
+        self.queue.put(None)
+        self.feeder.join()
+        stderr = self.process.stderr.read().decode(errors="replace")
+        self.process.stderr.close()
+        returncode = self.process.wait()
+        self.process = None
+        if not discard and (returncode != 0 or self.error is not None):
+            raise RuntimeError(f"video encoder for {self.path} failed ({returncode}): {stderr.strip()}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close(discard=type is not None)
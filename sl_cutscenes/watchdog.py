@@ -0,0 +1,131 @@
+"""
+Watchdog that detects broken episodes (physics blow-ups, objects leaving the room or tunneling
+through the table, exceeded time budget) while they are simulated, so that they can be discarded
+before the remaining frames are rendered.
+"""
+import time
+from contextlib import contextmanager
+
+import torch
+
+from sl_cutscenes.constants import SCENARIO_DEFAULTS
+
+
+class EpisodeAbortedError(RuntimeError):
+    """ Raised by the watchdog if the current episode has to be discarded """
+    pass
+
+
+class EpisodeWatchdog:
+    """
+    Checks pose and velocity sanity of all dynamic objects of a scenario.
+    All checks are vectorized over the objects, so calling check() once per frame is cheap.
+    """
+
+    def __init__(self, timeout=None):
+        """
+        :param timeout: wall-clock time budget (in s) of an episode. None or 0 disables the timeout.
+        """
+        self.config = SCENARIO_DEFAULTS["watchdog"]
+        bounds = SCENARIO_DEFAULTS["decorator"]["bounds"]
+        margin = self.config["margin"]
+        self.pos_min = torch.tensor([bounds["min_x"] - margin, bounds["min_y"] - margin, self.config["z_min"]])
+        self.pos_max = torch.tensor([bounds["max_x"] + margin, bounds["max_y"] + margin, self.config["z_max"]])
+        self.timeout = timeout if timeout else None
+        self.reset()
+
+    def reset(self):
+        """ Resets the time budget and the per-object tunneling state. Call this when starting a new episode. """
+        self.start_time = time.time()
+        self.paused_time = 0.0  # time spent in paused(), which does not count against the budget
+        self.tracked_ids = None
+        self.was_on_table = None
+
+    @property
+    def elapsed(self):
+        return time.time() - self.start_time - self.paused_time
+
+    @contextmanager
+    def paused(self):
+        """ Stops the clock of the time budget, e.g. while a consumer processes a frame of the episode """
+        pause_start = time.time()
+        try:
+            yield
+        finally:
+            self.paused_time += time.time() - pause_start
+
+    def abort(self, reason):
+        raise EpisodeAbortedError(f"episode aborted after {self.elapsed:.1f}s: {reason}")
+
+    def check(self, scenario):
+        """
+        Runs all sanity checks on the given scenario and raises an EpisodeAbortedError if any of them fails.
+        """
+        if self.timeout is not None and self.elapsed > self.timeout:
+            self.abort(f"time budget of {self.timeout}s exceeded")
+
+        nimble_state = self.get_nimble_state(scenario)
+        if nimble_state is not None and not torch.isfinite(nimble_state).all():
+            self.abort("nimblephysics state contains NaN/inf values")
+
+        objs = [obj for obj in scenario.dynamic_objects if hasattr(obj, "instance_index")]
+        if len(objs) == 0:
+            return
+        poses = torch.stack([obj.pose() for obj in objs]).float()  # [N, 4, 4]
+        lin_vel = torch.stack([obj.linear_velocity for obj in objs]).float()  # [N, 3]
+        ang_vel = torch.stack([obj.angular_velocity for obj in objs]).float()  # [N, 3]
+        pos = poses[:, :3, 3]
+
+        finite = torch.isfinite(poses).flatten(1).all(dim=1) & torch.isfinite(lin_vel).all(dim=1) \
+            & torch.isfinite(ang_vel).all(dim=1)
+        if not finite.all():
+            self.abort(f"non-finite state for objects {self.failing_ids(objs, ~finite)}")
+
+        out_of_bounds = ((pos < self.pos_min) | (pos > self.pos_max)).any(dim=1)
+        if out_of_bounds.any():
+            self.abort(f"objects {self.failing_ids(objs, out_of_bounds)} left the room bounds")
+
+        too_fast = (torch.linalg.norm(lin_vel, dim=1) > self.config["max_lin_velocity"]) \
+            | (torch.linalg.norm(ang_vel, dim=1) > self.config["max_ang_velocity"])
+        if too_fast.any():
+            self.abort(f"objects {self.failing_ids(objs, too_fast)} exceed the velocity limits")
+
+        tunneled = self.check_table(scenario, objs, pos)
+        if tunneled is not None and tunneled.any():
+            self.abort(f"objects {self.failing_ids(objs, tunneled)} tunneled through the table")
+
+    def check_table(self, scenario, objs, pos):
+        """
+        An object that was on top of the table and is now below the table top while still inside
+        the table footprint can only have gotten there by tunneling through it.
+        Returns a boolean mask over the given objects, or None if the scenario has no table.
+        """
+        table = getattr(scenario, "table", None)
+        if table is None:
+            return None
+        table_t = table.pose()[:3, 3].float()
+        bbox_min = table_t + table.mesh.bbox.min.float()  # tables are placed axis-aligned
+        bbox_max = table_t + table.mesh.bbox.max.float()
+        in_footprint = ((pos[:, :2] >= bbox_min[:2]) & (pos[:, :2] <= bbox_max[:2])).all(dim=1)
+        on_table = in_footprint & (pos[:, 2] > bbox_max[2])
+
+        # objects can be added or removed between checks -> only compare against known instances
+        ids = [obj.instance_index for obj in objs]
+        tunneled = torch.zeros(len(objs), dtype=torch.bool)
+        if self.tracked_ids == ids:
+            below_top = pos[:, 2] < bbox_max[2] - self.config["table_margin"]
+            tunneled = self.was_on_table & in_footprint & below_top
+        self.tracked_ids, self.was_on_table = ids, on_table
+        return tunneled
+
+    @staticmethod
+    def get_nimble_state(scenario):
+        if getattr(scenario, "physics_engine", None) != "nimble" or not getattr(scenario, "nimble_loaded", False):
+            return None
+        if hasattr(scenario, "nimble_state"):  # robot scenarios keep only the latest state
+            return scenario.nimble_state
+        return scenario.nimble_states[-1]
+
+    @staticmethod
+    def failing_ids(objs, mask):
+        return [obj.instance_index for obj, failing in zip(objs, mask.tolist()) if failing]
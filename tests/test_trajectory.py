@@ -0,0 +1,82 @@
+"""
+Records a short sim-only episode on the fake backend and replays it (see sl_cutscenes/trajectory.py and replay.py).
+Run from the repository root with 'python -m pytest tests'.
+"""
+import json
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from main import get_parser, prepare_cfg
+from sl_cutscenes.depth_encoding import DepthEncoder
+from sl_cutscenes.generation import generate_episodes, init_populate_scene, init_renderer, simulate_frames
+from sl_cutscenes.replay import ReplayScenario, replay_trajectory
+from sl_cutscenes.trajectory import Trajectory, TrajectoryRecorder
+
+FRAMES = 3
+RESOLUTION = (64, 48)
+
+
+def make_cfg(tmp_path, *args):
+    # default lighting ('--lights 0'), i.e. with a light map
+    cfg = prepare_cfg(get_parser().parse_args([
+        "--scenario", "bowl", "--iterations", "1", "--frames", str(FRAMES), "--cameras", "2",
+        "--resolution", *[str(r) for r in RESOLUTION], "--no-cuda", "--fake-backend", "--record-trajectories", *args
+    ]))
+    cfg.out_path = str(tmp_path / "trajectories")
+    return cfg
+
+
+def test_record_and_replay(tmp_path):
+    cfg = make_cfg(tmp_path)
+    renderer = init_renderer(cfg)
+    generate_episodes(cfg, renderer)
+
+    trajectory_fps = sorted((tmp_path / "trajectories").glob("*.traj.npz"))
+    assert len(trajectory_fps) == 1
+    trajectory = Trajectory(trajectory_fps[0])
+    assert trajectory.num_frames == FRAMES
+    assert trajectory.meta["lighting"]["light_map"] is not None
+    assert trajectory.present.all(axis=0).any() and trajectory.annotated.any()
+    assert trajectory.cam_positions.shape == (FRAMES, 2, 1, 3)
+
+    for resample in [False, True]:
+        paths = replay_trajectory(trajectory, renderer, tmp_path / "replay", RESOLUTION, resample=resample, seed=0,
+                                  name_suffix="_rig00" if resample else "", depth_encoder=DepthEncoder())
+        assert len(paths) == 2
+        for path in paths:
+            with open(path / "scene_gt.json") as f:
+                scene_gt = json.load(f)
+            assert len(scene_gt) == FRAMES
+            assert all(len(frame_gt) > 0 for frame_gt in scene_gt.values())
+
+
+def test_replay_matches_direct_rendering(tmp_path):
+    """ A replayed frame has the recorded lighting and looks like the frame rendered during the simulation """
+    cfg = make_cfg(tmp_path)
+    renderer = init_renderer(cfg)
+    scenario = init_populate_scene(cfg, scenario_id="bowl")["scenario"]
+    recorder = TrajectoryRecorder(scenario, sim_fps=cfg.sim_fps)
+    direct_frames = []
+    for _ in simulate_frames(cfg, scenario):
+        recorder.record()
+        cam = scenario.cameras[0]
+        scenario.set_camera_look_at(pos=cam.get_pos(), lookat=cam.get_lookat())
+        direct_frames.append(renderer.render(scenario.scene).rgb().clone())
+        for cam in scenario.cameras:
+            cam.step()
+    recorder.save(tmp_path / "000000_bowl.traj.npz")
+
+    trajectory = Trajectory(tmp_path / "000000_bowl.traj.npz")
+    replay = ReplayScenario(trajectory, RESOLUTION)
+    assert replay.scene.manual_exposure == scenario.scene.manual_exposure
+    assert torch.allclose(replay.scene.ambient_light, scenario.scene.ambient_light)
+    for frame, direct_rgb in enumerate(direct_frames):
+        replay.set_frame(frame)
+        replay.scene.set_camera_look_at(position=torch.from_numpy(trajectory.cam_positions[frame, 0, 0]),
+                                        look_at=torch.from_numpy(trajectory.cam_lookats[frame, 0, 0]))
+        replayed_rgb = renderer.render(replay.scene).rgb()
+        # poses and cameras are stored as float32, so allow for a few pixels on the box edges to differ
+        differing = (replayed_rgb.int() - direct_rgb.int()).abs().amax(dim=-1) > 2
+        assert differing.float().mean() < 0.01